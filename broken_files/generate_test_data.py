@@ -1,49 +1,205 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 
-# Set random seed for reproducibility
-np.random.seed(42)
-
-# Generate synthetic test data for customer churn prediction
-n_samples = 200
-
-# Create synthetic features
-data = {
-    'age': np.random.randint(18, 80, n_samples),
-    'tenure_months': np.random.randint(1, 120, n_samples),
-    'monthly_charges': np.random.uniform(20, 120, n_samples),
-    'total_charges': np.random.uniform(100, 8000, n_samples),
-    'contract_length': np.random.choice(['month-to-month', 'one_year', 'two_year'], n_samples),
-    'payment_method': np.random.choice(['credit_card', 'bank_transfer', 'electronic_check', 'mailed_check'], n_samples),
-    'internet_service': np.random.choice(['dsl', 'fiber_optic', 'no'], n_samples),
-    'tech_support': np.random.choice(['yes', 'no'], n_samples),
-    'online_security': np.random.choice(['yes', 'no'], n_samples),
-    'paperless_billing': np.random.choice(['yes', 'no'], n_samples)
+CATEGORICAL_LEVELS = {
+    'contract_length': ['month-to-month', 'one_year', 'two_year'],
+    'payment_method': ['credit_card', 'bank_transfer', 'electronic_check', 'mailed_check'],
+    'internet_service': ['dsl', 'fiber_optic', 'no'],
+    'tech_support': ['yes', 'no'],
+    'online_security': ['yes', 'no'],
+    'paperless_billing': ['yes', 'no']
 }
+NUMERICAL_COLUMNS = ['age', 'tenure_months', 'monthly_charges', 'total_charges']
+
+
+def generate_test_csv(n_samples=200, output_path='test_data.csv'):
+    """Generate the small in-memory test set used by the pipeline"""
+    # Set random seed for reproducibility
+    np.random.seed(42)
+
+    # Create synthetic features
+    data = {
+        'age': np.random.randint(18, 80, n_samples),
+        'tenure_months': np.random.randint(1, 120, n_samples),
+        'monthly_charges': np.random.uniform(20, 120, n_samples),
+        'total_charges': np.random.uniform(100, 8000, n_samples),
+        **{column: np.random.choice(levels, n_samples) for column, levels in CATEGORICAL_LEVELS.items()}
+    }
+
+    # Create target variable (churn) with some logical correlations
+    churn_probability = (
+        0.1 +  # base probability
+        0.3 * (data['contract_length'] == 'month-to-month').astype(int) +
+        0.2 * (data['monthly_charges'] > 80).astype(int) +
+        0.15 * (data['tenure_months'] < 12).astype(int) +
+        0.1 * (data['tech_support'] == 'no').astype(int)
+    )
+
+    # Add some randomness
+    churn_probability = np.clip(churn_probability + np.random.normal(0, 0.1, n_samples), 0, 1)
+    data['target'] = (np.random.random(n_samples) < churn_probability).astype(int)
+
+    # Convert to DataFrame
+    df = pd.DataFrame(data)
+
+    # One-hot encode categorical variables for model compatibility
+    df_encoded = pd.get_dummies(df, columns=list(CATEGORICAL_LEVELS))
+
+    # Save the test data
+    df_encoded.to_csv(output_path, index=False)
+
+    print(f"Generated {output_path} with {n_samples} samples")
+    print(f"Features: {list(df_encoded.columns)}")
+    print(f"Churn rate: {df_encoded['target'].mean():.2%}")
+    print(f"Shape: {df_encoded.shape}")
+
+
+def parse_drift(shifts, new_categories):
+    """Parse --drift-shift FEATURE=DELTA and --drift-new-category FEATURE=LEVEL:RATE options"""
+    drift = {'shift': {}, 'new_category': {}}
+    for spec in shifts or []:
+        feature, delta = spec.split('=', 1)
+        if feature not in NUMERICAL_COLUMNS:
+            raise ValueError(f"Cannot shift non-numerical feature {feature}")
+        drift['shift'][feature] = float(delta)
+    for spec in new_categories or []:
+        feature, level_rate = spec.split('=', 1)
+        level, _, rate = level_rate.partition(':')
+        if feature not in CATEGORICAL_LEVELS:
+            raise ValueError(f"Cannot add a category to non-categorical feature {feature}")
+        drift['new_category'][feature] = (level, float(rate or 0.2))
+    return drift
+
+
+def _chunk_columns(chunk_index, start, n_rows, seed, drift, drift_start):
+    """Generate one chunk as a dict of column arrays, one-hot columns as uint8"""
+    # Each chunk has its own seed, so chunks are reproducible and independent of worker count
+    rng = np.random.default_rng([seed, chunk_index])
+    drifted = np.arange(start, start + n_rows) >= drift_start if drift_start is not None else None
+
+    columns = {
+        'age': rng.integers(18, 80, n_rows),
+        'tenure_months': rng.integers(1, 120, n_rows),
+        'monthly_charges': rng.uniform(20, 120, n_rows),
+        'total_charges': rng.uniform(100, 8000, n_rows),
+    }
+    for feature, delta in drift['shift'].items():
+        if drifted is not None:
+            shifted = np.where(drifted, columns[feature] + delta, columns[feature])
+            if np.issubdtype(columns[feature].dtype, np.integer):
+                # Round rather than let astype truncate fractional shifts towards zero
+                shifted = np.rint(shifted)
+            # Keep the column dtype so every Parquet file shares one schema
+            columns[feature] = shifted.astype(columns[feature].dtype)
+
+    codes = {}
+    for feature, levels in CATEGORICAL_LEVELS.items():
+        codes[feature] = rng.integers(0, len(levels), n_rows, dtype=np.int8)
+        if feature in drift['new_category'] and drifted is not None:
+            _, rate = drift['new_category'][feature]
+            # Code len(levels) marks the injected, unseen level
+            codes[feature][drifted & (rng.random(n_rows) < rate)] = len(levels)
+
+    churn_probability = (
+        0.1 +
+        0.3 * (codes['contract_length'] == 0) +
+        0.2 * (columns['monthly_charges'] > 80) +
+        0.15 * (columns['tenure_months'] < 12) +
+        0.1 * (codes['tech_support'] == CATEGORICAL_LEVELS['tech_support'].index('no'))
+    )
+    churn_probability = np.clip(churn_probability + rng.normal(0, 0.1, n_rows), 0, 1)
+    target = (rng.random(n_rows) < churn_probability).astype(np.int64)
+
+    # One-hot columns in pd.get_dummies order (levels sorted within each feature)
+    columns['target'] = target
+    for feature, levels in CATEGORICAL_LEVELS.items():
+        all_levels = list(levels)
+        if feature in drift['new_category']:
+            all_levels.append(drift['new_category'][feature][0])
+        for code, level in sorted(enumerate(all_levels), key=lambda item: item[1]):
+            columns[f"{feature}_{level}"] = (codes[feature] == code).view(np.uint8)
+    return columns
+
+
+def write_chunk(args):
+    """Generate one chunk and write it as a Parquet file; returns (rows, churners)"""
+    chunk_index, start, n_rows, seed, drift, drift_start, output_dir, row_id = args
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = _chunk_columns(chunk_index, start, n_rows, seed, drift, drift_start)
+    if row_id:
+        # Opt-in: consumers that only drop the target would train on it
+        columns['row_id'] = np.arange(start, start + n_rows, dtype=np.int64)
+    table = pa.table(columns)
+    pq.write_table(table, os.path.join(output_dir, f"part-{chunk_index:06d}.parquet"))
+    return n_rows, int(columns['target'].sum())
+
+
+def generate_parquet(n_rows, output_dir, chunk_rows=1_000_000, workers=None, seed=42,
+                     drift=None, drift_start=None, row_id=False):
+    """Generate n_rows in independently seeded chunks across a process pool"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("pyarrow is required for Parquet output: pip install pyarrow")
+
+    drift = drift or {'shift': {}, 'new_category': {}}
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [
+        (i, start, min(chunk_rows, n_rows - start), seed, drift, drift_start, output_dir, row_id)
+        for i, start in enumerate(range(0, n_rows, chunk_rows))
+    ]
+
+    total_rows = churners = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rows, chunk_churners in pool.map(write_chunk, tasks):
+            total_rows += rows
+            churners += chunk_churners
+
+    print(f"Generated {total_rows} rows in {len(tasks)} Parquet files under {output_dir}")
+    print(f"Churn rate: {churners / max(total_rows, 1):.2%}")
+    if drift_start is not None:
+        print(f"Drift injected from row {drift_start}: {drift}")
+    return total_rows
 
-# Create target variable (churn) with some logical correlations
-churn_probability = (
-    0.1 +  # base probability
-    0.3 * (data['contract_length'] == 'month-to-month').astype(int) +
-    0.2 * (data['monthly_charges'] > 80).astype(int) +
-    0.15 * (data['tenure_months'] < 12).astype(int) +
-    0.1 * (data['tech_support'] == 'no').astype(int)
-)
 
-# Add some randomness
-churn_probability = np.clip(churn_probability + np.random.normal(0, 0.1, n_samples), 0, 1)
-data['target'] = (np.random.random(n_samples) < churn_probability).astype(int)
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic churn data")
+    parser.add_argument('--rows', type=int, default=None,
+                        help="Rows to generate as chunked Parquet (default: the 200-row test_data.csv)")
+    parser.add_argument('--output-dir', default='synthetic_data', help="Parquet output directory")
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000, help="Rows per Parquet file")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drift-start', type=int, default=None, help="Row offset where drift begins")
+    parser.add_argument('--drift-shift', action='append', metavar='FEATURE=DELTA',
+                        help="Add DELTA to a numerical feature after --drift-start")
+    parser.add_argument('--drift-new-category', action='append', metavar='FEATURE=LEVEL[:RATE]',
+                        help="Introduce an unseen level at RATE (default 0.2) after --drift-start")
+    parser.add_argument('--row-id', action='store_true',
+                        help="Add a row_id column (drop it before training or evaluation)")
+    args = parser.parse_args()
 
-# Convert to DataFrame
-df = pd.DataFrame(data)
+    if args.rows is None:
+        generate_test_csv()
+        return
 
-# One-hot encode categorical variables for model compatibility
-df_encoded = pd.get_dummies(df, columns=['contract_length', 'payment_method', 'internet_service', 'tech_support', 'online_security', 'paperless_billing'])
+    generate_parquet(
+        args.rows,
+        args.output_dir,
+        chunk_rows=args.chunk_rows,
+        workers=args.workers,
+        seed=args.seed,
+        drift=parse_drift(args.drift_shift, args.drift_new_category),
+        drift_start=args.drift_start,
+        row_id=args.row_id
+    )
 
-# Save the test data
-df_encoded.to_csv('test_data.csv', index=False)
 
-print(f"Generated test_data.csv with {n_samples} samples")
-print(f"Features: {list(df_encoded.columns)}")
-print(f"Churn rate: {df_encoded['target'].mean():.2%}")
-print(f"Shape: {df_encoded.shape}")
+if __name__ == "__main__":
+    main()
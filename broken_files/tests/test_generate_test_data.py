@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the chunked synthetic data generator
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from generate_test_data import generate_parquet, parse_drift
+
+pytest.importorskip("pyarrow")
+
+
+def read_rows(output_dir):
+    return pd.read_parquet(str(output_dir)).reset_index(drop=True)
+
+
+def test_seeded_output_is_deterministic(tmp_path):
+    """Test that a seed fixes the data regardless of worker count"""
+    generate_parquet(5000, str(tmp_path / "a"), chunk_rows=1000, workers=1, seed=7)
+    generate_parquet(5000, str(tmp_path / "b"), chunk_rows=1000, workers=2, seed=7)
+    generate_parquet(5000, str(tmp_path / "c"), chunk_rows=1000, workers=1, seed=8)
+    a, b, c = read_rows(tmp_path / "a"), read_rows(tmp_path / "b"), read_rows(tmp_path / "c")
+
+    pd.testing.assert_frame_equal(a, b)
+    assert not a.equals(c)
+    assert a['target'].dtype == np.int64
+    assert 'row_id' not in a.columns
+
+
+def test_row_id_is_opt_in(tmp_path):
+    """Test that row_id is only written when asked for"""
+    generate_parquet(2500, str(tmp_path), chunk_rows=1000, workers=1, row_id=True)
+    rows = read_rows(tmp_path)
+    assert rows['row_id'].tolist() == list(range(2500))
+
+
+def test_drift_shift_applies_from_drift_start(tmp_path):
+    """Test that shifts start at drift_start and are rounded, not truncated, on integer columns"""
+    drift = parse_drift(['age=10', 'tenure_months=2.5', 'monthly_charges=-5'], [])
+    generate_parquet(40000, str(tmp_path / "drift"), chunk_rows=10000, workers=1, seed=3,
+                     drift=drift, drift_start=20000)
+    generate_parquet(40000, str(tmp_path / "clean"), chunk_rows=10000, workers=1, seed=3)
+    drifted, clean = read_rows(tmp_path / "drift"), read_rows(tmp_path / "clean")
+
+    before, after = slice(0, 20000), slice(20000, 40000)
+    pd.testing.assert_frame_equal(drifted[before], clean[before])
+    assert (drifted['age'][after] - clean['age'][after]).eq(10).all()
+    tenure_shift = drifted['tenure_months'][after] - clean['tenure_months'][after]
+    assert set(tenure_shift.unique()) == {2, 3}
+    assert tenure_shift.mean() == pytest.approx(2.5, abs=0.05)
+    assert (drifted['monthly_charges'][after] - clean['monthly_charges'][after]).mean() == pytest.approx(-5)
+    assert drifted['age'].dtype == clean['age'].dtype
+
+
+def test_drift_new_category_appears_at_rate(tmp_path):
+    """Test that an injected level only appears after drift_start, at its rate"""
+    drift = parse_drift([], ['payment_method=crypto:0.3'])
+    generate_parquet(40000, str(tmp_path), chunk_rows=10000, workers=1, seed=3,
+                     drift=drift, drift_start=20000)
+    rows = read_rows(tmp_path)
+    levels = [column for column in rows.columns if column.startswith('payment_method_')]
+
+    assert rows['payment_method_crypto'][:20000].sum() == 0
+    assert rows['payment_method_crypto'][20000:].mean() == pytest.approx(0.3, abs=0.02)
+    assert rows[levels].sum(axis=1).eq(1).all()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for checkpointed streaming training
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import train_incremental
+from train_incremental import (DEFAULT_STREAMING, evaluate_fold, fit_scaler, fold_mask, to_logistic_regression,
+                               train_streaming)
+
+COLUMNS = ['x1', 'x2', 'x3']
+
+
+def write_data(path, seed, n_rows=600):
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n_rows, len(COLUMNS))
+    data = pd.DataFrame(X, columns=COLUMNS)
+    data['target'] = (X[:, 0] + 0.5 * X[:, 1] > 0).astype(int)
+    data.to_csv(path, index=False)
+    return str(path)
+
+
+def make_settings(tmp_path, **overrides):
+    settings = dict(DEFAULT_STREAMING, chunk_rows=100, epochs=2, checkpoint_every_chunks=1,
+                    checkpoint_dir=str(tmp_path / "checkpoints"))
+    settings.update(overrides)
+    return settings
+
+
+def train(data_path, settings, checkpoint_path):
+    scaler = fit_scaler(data_path, COLUMNS, 'target', settings)
+    return train_streaming(data_path, COLUMNS, 'target', scaler, settings, checkpoint_path)
+
+
+def test_interrupted_run_resumes_to_the_same_model(tmp_path, monkeypatch):
+    """Test that resuming a checkpoint reproduces the uninterrupted model"""
+    data_path = write_data(tmp_path / "train.csv", seed=0)
+    settings = make_settings(tmp_path)
+    expected = train(data_path, settings, str(tmp_path / "full.pkl"))
+
+    checkpoint_path = str(tmp_path / "interrupted.pkl")
+    scaler = fit_scaler(data_path, COLUMNS, 'target', settings)
+    iter_chunks = train_incremental.iter_chunks
+    yielded = []
+
+    def interrupted(path, chunk_rows):
+        for chunk in iter_chunks(path, chunk_rows):
+            yielded.append(1)
+            if len(yielded) == 9:
+                raise KeyboardInterrupt
+            yield chunk
+
+    monkeypatch.setattr(train_incremental, 'iter_chunks', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        train_streaming(data_path, COLUMNS, 'target', scaler, settings, checkpoint_path)
+    monkeypatch.setattr(train_incremental, 'iter_chunks', iter_chunks)
+
+    state = train_incremental.load_checkpoint(checkpoint_path)
+    assert (state['epoch'], state['chunk']) == (1, 2)
+    resumed = train_streaming(data_path, COLUMNS, 'target', scaler, settings, checkpoint_path)
+    np.testing.assert_allclose(resumed.coef_, expected.coef_)
+    np.testing.assert_allclose(resumed.intercept_, expected.intercept_)
+
+
+def test_regenerated_data_discards_checkpoint(tmp_path):
+    """Test that new data at the same path retrains instead of reusing the old model"""
+    data_path = str(tmp_path / "train.csv")
+    settings = make_settings(tmp_path)
+    checkpoint_path = str(tmp_path / "final.pkl")
+    write_data(data_path, seed=0)
+    old = train(data_path, settings, checkpoint_path)
+
+    write_data(data_path, seed=1)
+    stat = os.stat(data_path)
+    # Same size is possible; make sure the mtime moves even on coarse filesystem clocks
+    os.utime(data_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    retrained = train(data_path, settings, checkpoint_path)
+    fresh = train(data_path, settings, str(tmp_path / "fresh.pkl"))
+
+    assert not np.allclose(retrained.coef_, old.coef_)
+    np.testing.assert_allclose(retrained.coef_, fresh.coef_)
+
+
+def test_changed_settings_discard_checkpoint(tmp_path):
+    """Test that a different chunk size or hyperparameter retrains from scratch"""
+    data_path = write_data(tmp_path / "train.csv", seed=0)
+    checkpoint_path = str(tmp_path / "final.pkl")
+    train(data_path, make_settings(tmp_path), checkpoint_path)
+
+    for i, overrides in enumerate(({'chunk_rows': 150}, {'alpha': 0.01})):
+        settings = make_settings(tmp_path, **overrides)
+        retrained = train(data_path, settings, checkpoint_path)
+        fresh = train(data_path, settings, str(tmp_path / f"fresh-{i}.pkl"))
+        np.testing.assert_allclose(retrained.coef_, fresh.coef_)
+
+
+def test_exported_model_folds_in_the_scaler(tmp_path):
+    """Test that the exported LogisticRegression scores raw features like SGD on scaled ones"""
+    data_path = write_data(tmp_path / "train.csv", seed=0)
+    settings = make_settings(tmp_path)
+    scaler = fit_scaler(data_path, COLUMNS, 'target', settings)
+    sgd = train_streaming(data_path, COLUMNS, 'target', scaler, settings, str(tmp_path / "final.pkl"))
+    exported = to_logistic_regression(sgd, scaler, COLUMNS)
+
+    X_raw = pd.read_csv(data_path)[COLUMNS].values * 3 + 1
+    np.testing.assert_allclose(exported.predict_proba(X_raw), sgd.predict_proba(scaler.transform(X_raw)))
+    assert not hasattr(exported, 'feature_names_in_')
+
+
+def test_cross_validation_folds(tmp_path):
+    """Test that every fold trains and scores with statistics from its training rows only"""
+    data_path = write_data(tmp_path / "train.csv", seed=0)
+    settings = make_settings(tmp_path)
+    X = pd.read_csv(data_path)[COLUMNS].values
+
+    results = [evaluate_fold((data_path, COLUMNS, 'target', settings, 3, fold)) for fold in range(3)]
+    assert [result['fold'] for result in results] == [0, 1, 2]
+    assert all(result['accuracy'] > 0.8 for result in results)
+
+    scaler = fit_scaler(data_path, COLUMNS, 'target', settings, n_folds=3, fold=1)
+    np.testing.assert_allclose(scaler.mean_, X[fold_mask(len(X), 0, 3, 1)].mean(axis=0))
+    assert fold_mask(len(X), 0, 3, 1).sum() == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Streaming incremental training for the churn model.
+
+Trains a logistic-loss SGD model chunk by chunk, so the dataset never has
+to fit in memory, and exports an equivalent LogisticRegression (scaling
+folded into the weights) that the deployment and serving code load as-is.
+"""
+import os
+import glob
+import pickle
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import yaml
+from sklearn import __version__ as sklearn_version
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+DEFAULT_STREAMING = {
+    'chunk_rows': 100000,
+    'epochs': 3,
+    'alpha': 0.0001,
+    'seed': 42,
+    'checkpoint_dir': 'checkpoints',
+    'checkpoint_every_chunks': 10
+}
+CLASSES = np.array([0, 1])
+
+# 'log_loss' replaced 'log' in scikit-learn 1.1
+LOG_LOSS = 'log_loss' if tuple(int(p) for p in sklearn_version.split('.')[:2]) >= (1, 1) else 'log'
+
+
+def load_config(path):
+    """Read streaming settings, CV fold count and target column from config.yml"""
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    training = config.get('training') or {}
+    streaming = dict(DEFAULT_STREAMING)
+    streaming.update(training.get('streaming') or {})
+    target = (config.get('data') or {}).get('target_column', 'target')
+    return streaming, training.get('cross_validation_folds', 0), target
+
+
+def load_schema(schema_path, target):
+    """Pin the feature column order to the test data header"""
+    header = pd.read_csv(schema_path, nrows=0).columns
+    return [column for column in header if column != target]
+
+
+def data_files(data_path):
+    """The files behind a CSV file or a Parquet file/directory, in read order"""
+    if os.path.isdir(data_path):
+        return sorted(glob.glob(os.path.join(data_path, '*.parquet')))
+    return [data_path]
+
+
+def iter_chunks(data_path, chunk_rows):
+    """Yield DataFrames of at most chunk_rows from a CSV file or a Parquet file/directory"""
+    if data_path.endswith('.csv'):
+        yield from pd.read_csv(data_path, chunksize=chunk_rows)
+        return
+
+    import pyarrow.parquet as pq
+    for file in data_files(data_path):
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+
+
+def align_chunk(chunk, columns, target):
+    """Return (X, y) with columns in schema order; missing one-hot columns are zero"""
+    X = chunk.reindex(columns=columns, fill_value=0).to_numpy(dtype=np.float64)
+    y = chunk[target].to_numpy(dtype=np.int64)
+    return X, y
+
+
+def _new_sgd(settings):
+    return SGDClassifier(loss=LOG_LOSS, alpha=settings['alpha'], random_state=settings['seed'])
+
+
+def save_checkpoint(path, state):
+    """Write a checkpoint atomically so an interrupted write never corrupts it"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def fit_scaler(data_path, columns, target, settings, n_folds=None, fold=None):
+    """First pass: feature means and variances, accumulated chunk by chunk (held-out fold rows excluded)"""
+    scaler = StandardScaler()
+    offset = 0
+    for chunk in iter_chunks(data_path, settings['chunk_rows']):
+        X, _ = align_chunk(chunk, columns, target)
+        mask = fold_mask(len(chunk), offset, n_folds, fold)
+        offset += len(chunk)
+        if mask.any():
+            scaler.partial_fit(X[mask])
+    return scaler
+
+
+def fold_mask(n_rows, offset, n_folds, fold):
+    """Deterministic fold assignment by global row position"""
+    if fold is None:
+        return np.ones(n_rows, dtype=bool)
+    return (np.arange(offset, offset + n_rows) % n_folds) != fold
+
+
+def checkpoint_fingerprint(data_path, columns, scaler, settings, n_folds=None, fold=None):
+    """
+    Identity of a training run: every input file's size and mtime, the schema,
+    the fitted scaler, the fold and the chunk size and hyperparameters
+    """
+    files = tuple((os.path.abspath(file), stat.st_size, stat.st_mtime_ns)
+                  for file, stat in ((file, os.stat(file)) for file in data_files(data_path)))
+    scaler_digest = hashlib.sha256(scaler.mean_.tobytes() + scaler.scale_.tobytes()).hexdigest()
+    return (files, tuple(columns), scaler_digest, n_folds, fold,
+            tuple(sorted((k, v) for k, v in settings.items() if k != 'checkpoint_every_chunks')))
+
+
+def train_streaming(data_path, columns, target, scaler, settings, checkpoint_path,
+                    n_folds=None, fold=None, resume=True):
+    """Fit SGD over all epochs, checkpointing every few chunks; skips held-out fold rows"""
+    # Only resume a checkpoint written for the same data files, schema, scaler and settings
+    fingerprint = checkpoint_fingerprint(data_path, columns, scaler, settings, n_folds, fold)
+    state = load_checkpoint(checkpoint_path) if resume else None
+    if state is not None and state.get('fingerprint') == fingerprint:
+        model, start_epoch, start_chunk = state['model'], state['epoch'], state['chunk']
+        print(f"Resuming {checkpoint_path} at epoch {start_epoch}, chunk {start_chunk}")
+    else:
+        if state is not None:
+            print(f"Discarding {checkpoint_path}: written for different data or settings")
+        model, start_epoch, start_chunk = _new_sgd(settings), 0, 0
+
+    for epoch in range(start_epoch, settings['epochs']):
+        offset = 0
+        for chunk_index, chunk in enumerate(iter_chunks(data_path, settings['chunk_rows'])):
+            n_rows = len(chunk)
+            if epoch == start_epoch and chunk_index < start_chunk:
+                offset += n_rows
+                continue
+
+            X, y = align_chunk(chunk, columns, target)
+            mask = fold_mask(n_rows, offset, n_folds, fold)
+            offset += n_rows
+            X, y = scaler.transform(X[mask]), y[mask]
+
+            # Shuffle within the chunk; seeded so a resumed run replays the same order
+            order = np.random.default_rng([settings['seed'], epoch, chunk_index]).permutation(len(y))
+            model.partial_fit(X[order], y[order], classes=CLASSES)
+
+            if (chunk_index + 1) % settings['checkpoint_every_chunks'] == 0:
+                save_checkpoint(checkpoint_path, {
+                    'model': model, 'epoch': epoch, 'chunk': chunk_index + 1, 'fingerprint': fingerprint
+                })
+        start_chunk = 0
+        save_checkpoint(checkpoint_path, {'model': model, 'epoch': epoch + 1, 'chunk': 0, 'fingerprint': fingerprint})
+    return model
+
+
+def to_logistic_regression(model, scaler, columns):
+    """Fold standardization into the weights, giving a LogisticRegression over raw features"""
+    scale = np.where(scaler.scale_ == 0, 1.0, scaler.scale_)
+    coef = model.coef_[0] / scale
+    intercept = model.intercept_[0] - np.dot(coef, scaler.mean_)
+
+    exported = LogisticRegression()
+    exported.coef_ = coef.reshape(1, -1)
+    exported.intercept_ = np.array([intercept])
+    exported.classes_ = CLASSES
+    # No feature_names_in_: serving scores plain arrays in schema order
+    exported.n_features_in_ = len(columns)
+    exported.n_iter_ = np.array([model.n_iter_])
+    return exported
+
+
+def evaluate_fold(args):
+    """Train on every fold but one and score the held-out fold; runs in a worker process"""
+    data_path, columns, target, settings, n_folds, fold = args
+    # Standardize with training-fold statistics only, so the held-out fold does not leak in
+    scaler = fit_scaler(data_path, columns, target, settings, n_folds, fold)
+    checkpoint_path = os.path.join(settings['checkpoint_dir'], f"fold-{fold}.pkl")
+    model = train_streaming(data_path, columns, target, scaler, settings, checkpoint_path,
+                            n_folds=n_folds, fold=fold)
+
+    tp = fp = tn = fn = 0
+    offset = 0
+    for chunk in iter_chunks(data_path, settings['chunk_rows']):
+        X, y = align_chunk(chunk, columns, target)
+        held_out = ~fold_mask(len(chunk), offset, n_folds, fold)
+        offset += len(chunk)
+        predictions = model.predict(scaler.transform(X[held_out]))
+        y = y[held_out]
+        tp += int(np.sum((predictions == 1) & (y == 1)))
+        fp += int(np.sum((predictions == 1) & (y == 0)))
+        tn += int(np.sum((predictions == 0) & (y == 0)))
+        fn += int(np.sum((predictions == 0) & (y == 1)))
+
+    total = tp + fp + tn + fn
+    return {
+        'fold': fold,
+        'accuracy': (tp + tn) / total if total else 0.0,
+        'precision': tp / (tp + fp) if tp + fp else 0.0,
+        'recall': tp / (tp + fn) if tp + fn else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming incremental training for the churn model")
+    parser.add_argument('--config', default='config.yml')
+    parser.add_argument('--data', required=True, help="Training data: CSV file or Parquet file/directory")
+    parser.add_argument('--schema', default='test_data.csv', help="CSV whose header pins the feature order")
+    parser.add_argument('--output', default='model.pkl')
+    parser.add_argument('--folds', type=int, default=None,
+                        help="Cross-validation folds (default: training.cross_validation_folds)")
+    parser.add_argument('--workers', type=int, default=None, help="Processes for cross-validation folds")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore existing checkpoints")
+    args = parser.parse_args()
+
+    settings, n_folds, target = load_config(args.config)
+    if args.folds is not None:
+        n_folds = args.folds
+    columns = load_schema(args.schema, target)
+    print(f"Training on {args.data} with {len(columns)} features in schema order")
+
+    if n_folds and n_folds > 1:
+        tasks = [(args.data, columns, target, settings, n_folds, fold) for fold in range(n_folds)]
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(evaluate_fold, tasks))
+        for result in results:
+            print(f"Fold {result['fold']}: Accuracy={result['accuracy']:.3f}, "
+                  f"Precision={result['precision']:.3f}, Recall={result['recall']:.3f}")
+        print(f"Mean CV accuracy: {np.mean([r['accuracy'] for r in results]):.3f}")
+
+    scaler = fit_scaler(args.data, columns, target, settings)
+    model = train_streaming(args.data, columns, target, scaler, settings,
+                            os.path.join(settings['checkpoint_dir'], 'final.pkl'),
+                            resume=not args.no_resume)
+    exported = to_logistic_regression(model, scaler, columns)
+
+    with open(args.output, 'wb') as f:
+        pickle.dump(exported, f)
+    print(f"Model saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
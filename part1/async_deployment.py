@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Concurrent multi-environment deployment using asyncio and a pooled HTTP client
+"""
+import os
+import sys
+import uuid
+import random
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from fixed_deployment import (
+    evaluate_model,
+    meets_quality_threshold,
+    deployment_api_url,
+    build_deployment_payload,
+    build_slack_message,
+    update_deployment_database,
+)
+from deployment_store import close_stores
+
+logger = logging.getLogger('model_deployment.async')
+
+# Retry and connection pool settings
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '3'))
+HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', '0.5'))
+HTTP_BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', '8.0'))
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '20'))
+
+DEPLOY_TIMEOUT = 30
+NOTIFY_TIMEOUT = 10
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+# A non-idempotent request may have been processed unless it was refused outright:
+# it is only retried when the connection never opened or the server rate-limited it
+UNSAFE_RETRYABLE_STATUS_CODES = {429}
+UNSAFE_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]"""
+    base = HTTP_BACKOFF_BASE if base is None else base
+    cap = HTTP_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def post_with_retries(client: httpx.AsyncClient, url, json_body, headers=None,
+                            timeout=DEPLOY_TIMEOUT, max_retries=None, idempotent=True) -> httpx.Response:
+    """
+    POST with bounded retries on connection errors and retryable status codes.
+
+    Non-idempotent requests (``idempotent=False``) are only retried when they
+    cannot have been processed: connection failures and 429 responses.
+    """
+    max_retries = HTTP_MAX_RETRIES if max_retries is None else max_retries
+    retryable_codes = RETRYABLE_STATUS_CODES if idempotent else UNSAFE_RETRYABLE_STATUS_CODES
+    retryable_errors = httpx.TransportError if idempotent else UNSAFE_RETRYABLE_ERRORS
+    attempt = 0
+    while True:
+        try:
+            response = await client.post(url, json=json_body, headers=headers, timeout=timeout)
+            if response.status_code not in retryable_codes or attempt >= max_retries:
+                return response
+            logger.warning(f"POST {url} returned {response.status_code} (attempt {attempt + 1})")
+        except retryable_errors as e:
+            if attempt >= max_retries:
+                raise
+            logger.warning(f"POST {url} failed: {str(e)} (attempt {attempt + 1})")
+        await asyncio.sleep(backoff_delay(attempt))
+        attempt += 1
+
+
+async def deploy_to_api_async(client, env, evaluation) -> Optional[str]:
+    """Deploy model to the ML API for one environment"""
+    try:
+        api_key = os.environ.get('API_KEY')
+        if not api_key:
+            raise ValueError("API_KEY environment variable is required")
+
+        model_path = os.environ.get('MODEL_PATH')
+        if not model_path:
+            raise ValueError("MODEL_PATH environment variable is required")
+
+        api_url = deployment_api_url(env)
+        logger.info(f"Deploying model to {api_url}")
+        # Deploying is not idempotent: the same key on every attempt lets the API
+        # deduplicate, and retries are limited to requests that never got through
+        response = await post_with_retries(
+            client,
+            api_url,
+            build_deployment_payload(env, evaluation, model_path),
+            headers={'Authorization': f'Bearer {api_key}', 'Idempotency-Key': str(uuid.uuid4())},
+            timeout=DEPLOY_TIMEOUT,
+            idempotent=False
+        )
+
+        if response.status_code != 200:
+            logger.error(f"Deployment to {env} failed: {response.text}")
+            return None
+
+        deployment_id = response.json().get('deployment_id')
+        if not deployment_id:
+            logger.error(f"No deployment ID returned from API for {env}")
+            return None
+
+        logger.info(f"Successfully deployed model to {env} with ID: {deployment_id}")
+        return deployment_id
+    except httpx.HTTPError as e:
+        logger.error(f"API request failed for {env}: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"Deployment error for {env}: {str(e)}")
+        return None
+
+
+async def send_slack_notification_async(client, deployment_id, env, evaluation) -> bool:
+    """Send the deployment notification to Slack"""
+    webhook_url = os.environ.get('SLACK_WEBHOOK')
+    if not webhook_url:
+        logger.info("No Slack webhook URL provided, skipping notification")
+        return False
+
+    try:
+        response = await post_with_retries(
+            client,
+            webhook_url,
+            build_slack_message(deployment_id, env, evaluation),
+            timeout=NOTIFY_TIMEOUT
+        )
+        if response.status_code == 200:
+            logger.info(f"Slack notification sent successfully for {env}")
+            return True
+        logger.warning(f"Failed to send Slack notification: {response.text}")
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to send Slack notification: {str(e)}")
+    return False
+
+
+async def rollout_environment(client, env, evaluation) -> Dict[str, Any]:
+    """Deploy one environment, then record and announce it concurrently"""
+    deployment_id = await deploy_to_api_async(client, env, evaluation)
+    result = {'environment': env, 'deployment_id': deployment_id,
+              'database_updated': False, 'notified': False}
+    if not deployment_id:
+        return result
+
+    # The registry write is blocking (pooled DB-API driver), so it runs in a
+    # worker thread while the notification goes out on the event loop
+    loop = asyncio.get_running_loop()
+    db_success, notified = await asyncio.gather(
+        loop.run_in_executor(None, update_deployment_database, deployment_id, env, evaluation),
+        send_slack_notification_async(client, deployment_id, env, evaluation)
+    )
+    if not db_success:
+        logger.error(f"Database update failed for {env}")
+    result['database_updated'] = db_success
+    result['notified'] = notified
+    return result
+
+
+async def rollout(envs: List[str], evaluation) -> List[Dict[str, Any]]:
+    """Deploy to every environment concurrently over one pooled HTTP client"""
+    if not meets_quality_threshold(evaluation):
+        return [{'environment': env, 'deployment_id': None,
+                 'database_updated': False, 'notified': False} for env in envs]
+
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                          max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+    async with httpx.AsyncClient(limits=limits) as client:
+        return await asyncio.gather(*(rollout_environment(client, env, evaluation) for env in envs))
+
+
+def main():
+    """Deploy the model to several environments concurrently"""
+    try:
+        import argparse
+        parser = argparse.ArgumentParser(description="Deploy ML model to several environments concurrently")
+        parser.add_argument('--env', dest='envs', action='append', choices=['staging', 'production'],
+                           help="Deployment environment (repeat for several)")
+        parser.add_argument('--record-breakdown', action='store_true',
+                           help="Also record per-slice metrics and probability histograms")
+        args = parser.parse_args()
+        envs = list(dict.fromkeys(args.envs or ['production']))
+
+        logger.info(f"Starting concurrent deployment to {', '.join(envs)}...")
+
+        evaluation = evaluate_model(include_breakdown=args.record_breakdown)
+        results = asyncio.run(rollout(envs, evaluation))
+
+        failed = [r['environment'] for r in results if not r['deployment_id']]
+        if failed:
+            logger.error(f"Deployment failed for: {', '.join(failed)}")
+            return 1
+
+        logger.info("Deployment completed successfully!")
+        return 0
+    except Exception as e:
+        logger.critical(f"Deployment failed with error: {str(e)}")
+        return 1
+    finally:
+        close_stores()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
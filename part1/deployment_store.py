@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Pooled persistence layer for model deployment records
+"""
+import os
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import psycopg2
+    from psycopg2 import pool as pg_pool
+    from psycopg2.extras import execute_values
+except ImportError:  # pragma: no cover - only needed for PostgreSQL URLs
+    psycopg2 = None
+
+logger = logging.getLogger('model_deployment.store')
+
+# Pool sizing, overridable per environment
+DB_POOL_MIN_CONN = int(os.environ.get('DB_POOL_MIN_CONN', '1'))
+DB_POOL_MAX_CONN = int(os.environ.get('DB_POOL_MAX_CONN', '5'))
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '10'))
+
+# Auxiliary tables used by the bulk path. The base tables (model_deployments,
+# model_registry) are owned by the registry migrations; they are only listed
+# here so a local SQLite stand-in can be created for testing. The breakdown
+# tables (BULK_SCHEMA) are owned by this module and created on first use.
+BASE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS model_deployments (
+        deployment_id TEXT PRIMARY KEY,
+        model_version TEXT,
+        environment TEXT,
+        accuracy DOUBLE PRECISION,
+        precision DOUBLE PRECISION,
+        recall DOUBLE PRECISION,
+        deployed_at TIMESTAMP,
+        status TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS model_registry (
+        environment TEXT PRIMARY KEY,
+        current_deployment_id TEXT,
+        last_updated TIMESTAMP
+    )
+    """,
+]
+
+BULK_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS model_deployment_slice_metrics (
+        deployment_id TEXT,
+        slice_name TEXT,
+        slice_value TEXT,
+        metric TEXT,
+        value DOUBLE PRECISION,
+        sample_count INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS model_deployment_histograms (
+        deployment_id TEXT,
+        histogram TEXT,
+        bin_index INTEGER,
+        bin_lower DOUBLE PRECISION,
+        bin_upper DOUBLE PRECISION,
+        count INTEGER
+    )
+    """,
+]
+
+DEPLOYMENT_COLUMNS = (
+    'deployment_id', 'model_version', 'environment', 'accuracy',
+    'precision', 'recall', 'deployed_at', 'status'
+)
+SLICE_METRIC_COLUMNS = (
+    'deployment_id', 'slice_name', 'slice_value', 'metric', 'value', 'sample_count'
+)
+HISTOGRAM_COLUMNS = (
+    'deployment_id', 'histogram', 'bin_index', 'bin_lower', 'bin_upper', 'count'
+)
+
+
+class _SQLitePool:
+    """Minimal fixed-size connection pool for SQLite stand-in databases"""
+
+    def __init__(self, path, maxconn):
+        self._path = path
+        self._connections = queue.LifoQueue(maxsize=maxconn)
+        self._created = 0
+        self._maxconn = maxconn
+        self._lock = threading.Lock()
+
+    def getconn(self):
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self._maxconn:
+                self._created += 1
+                return sqlite3.connect(self._path, check_same_thread=False)
+        return self._connections.get()
+
+    def putconn(self, conn, close=False):
+        if close:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._connections.put(conn)
+
+    def closeall(self):
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+class DeploymentStore:
+    """
+    Connection-pooled writer for deployment records.
+
+    Accepts either a PostgreSQL URL (pooled with psycopg2 and written with
+    ``execute_values``) or a ``sqlite:///path`` URL for local testing.
+    In-memory SQLite URLs are rejected: every pooled connection would open
+    its own empty database.
+    """
+
+    def __init__(self, db_url, minconn=DB_POOL_MIN_CONN, maxconn=DB_POOL_MAX_CONN):
+        self.db_url = db_url
+        self._bulk_schema_ready = False
+        self._schema_lock = threading.Lock()
+        if db_url.startswith('sqlite://'):
+            self.dialect = 'sqlite'
+            path = db_url[len('sqlite://'):]
+            if path.startswith('/'):
+                path = path[1:]
+            if not path or path == ':memory:' or 'mode=memory' in path:
+                raise ValueError(f"In-memory SQLite is not supported by the pooled store: {db_url}")
+            self._pool = _SQLitePool(path, maxconn)
+        else:
+            if psycopg2 is None:
+                raise ImportError("psycopg2 is required for PostgreSQL deployment stores")
+            self.dialect = 'postgresql'
+            self._pool = pg_pool.ThreadedConnectionPool(
+                minconn, maxconn, db_url, connect_timeout=DB_CONNECT_TIMEOUT
+            )
+        logger.info(f"Initialized {self.dialect} deployment store pool (max {maxconn} connections)")
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, committing on success and rolling back on error"""
+        conn = self._pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self._pool.putconn(conn, close=broken)
+
+    def close(self):
+        """Close every pooled connection"""
+        self._pool.closeall()
+
+    def create_schema(self, include_base=False):
+        """Create the bulk-path tables (and optionally the base tables)"""
+        statements = (BASE_SCHEMA if include_base else []) + BULK_SCHEMA
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.close()
+
+    def ensure_bulk_schema(self):
+        """Create the breakdown tables once per store (idempotent DDL)"""
+        with self._schema_lock:
+            if not self._bulk_schema_ready:
+                self.create_schema()
+                self._bulk_schema_ready = True
+
+    def _insert_many(self, cursor, table, columns, rows):
+        """Insert rows in one round trip per batch"""
+        if not rows:
+            return
+        column_list = ', '.join(columns)
+        if self.dialect == 'postgresql':
+            execute_values(cursor, f"INSERT INTO {table} ({column_list}) VALUES %s", rows)
+        else:
+            placeholders = ', '.join('?' for _ in columns)
+            cursor.executemany(f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})", rows)
+
+    def _update_registry(self, cursor, rows):
+        """Point each environment at its newest deployment in one statement"""
+        if not rows:
+            return
+        if self.dialect == 'postgresql':
+            execute_values(
+                cursor,
+                """
+                UPDATE model_registry AS r
+                SET current_deployment_id = v.deployment_id, last_updated = v.last_updated
+                FROM (VALUES %s) AS v(deployment_id, last_updated, environment)
+                WHERE r.environment = v.environment
+                """,
+                rows,
+                template="(%s, %s::timestamp, %s)"
+            )
+        else:
+            cursor.executemany(
+                """
+                UPDATE model_registry
+                SET current_deployment_id = ?, last_updated = ?
+                WHERE environment = ?
+                """,
+                rows
+            )
+
+    def record_deployments(self, deployments: List[Dict[str, Any]],
+                           slice_metrics: Optional[List[Dict[str, Any]]] = None,
+                           histograms: Optional[List[Dict[str, Any]]] = None):
+        """
+        Write deployment rows and registry updates in a single transaction,
+        then the optional evaluation breakdowns in a separate one.
+
+        A failed breakdown write is logged and never rolls back the
+        deployment records; returns whether the breakdown was written.
+        """
+        now = datetime.now()
+        deployment_rows = []
+        latest_per_env = {}
+        for deployment in deployments:
+            row = dict(deployment)
+            row.setdefault('deployed_at', now)
+            row.setdefault('status', 'active')
+            deployment_rows.append(tuple(row.get(column) for column in DEPLOYMENT_COLUMNS))
+            latest_per_env[row['environment']] = (row['deployment_id'], row['deployed_at'])
+
+        registry_rows = [
+            (deployment_id, deployed_at, env)
+            for env, (deployment_id, deployed_at) in latest_per_env.items()
+        ]
+        slice_rows = [tuple(m.get(c) for c in SLICE_METRIC_COLUMNS) for m in (slice_metrics or [])]
+        histogram_rows = [tuple(h.get(c) for c in HISTOGRAM_COLUMNS) for h in (histograms or [])]
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self._insert_many(cursor, 'model_deployments', DEPLOYMENT_COLUMNS, deployment_rows)
+            self._update_registry(cursor, registry_rows)
+            cursor.close()
+        logger.info(f"Recorded {len(deployment_rows)} deployment(s)")
+
+        if not slice_rows and not histogram_rows:
+            return True
+        try:
+            self.ensure_bulk_schema()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                self._insert_many(cursor, 'model_deployment_slice_metrics', SLICE_METRIC_COLUMNS, slice_rows)
+                self._insert_many(cursor, 'model_deployment_histograms', HISTOGRAM_COLUMNS, histogram_rows)
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Error recording evaluation breakdown: {str(e)}")
+            return False
+        logger.info(f"Recorded {len(slice_rows)} slice metric(s) and {len(histogram_rows)} histogram bin(s)")
+        return True
+
+
+# One pool per database URL for the lifetime of the process
+_stores: Dict[str, DeploymentStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_url) -> DeploymentStore:
+    """Return the shared store for a database URL, creating its pool on first use"""
+    with _stores_lock:
+        store = _stores.get(db_url)
+        if store is None:
+            store = DeploymentStore(db_url)
+            _stores[db_url] = store
+        return store
+
+
+def close_stores():
+    """Close every pooled store (call once at process exit)"""
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
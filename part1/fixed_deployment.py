@@ -10,9 +10,12 @@ import requests
 import pandas as pd
 import psycopg2
 import json
+import numpy as np
 from datetime import datetime
 from sklearn.metrics import accuracy_score, precision_score, recall_score
 
+from deployment_store import get_store, close_stores
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,6 +23,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger('model_deployment')
 
+# One-hot encoded categorical groups in test_data.csv used for per-slice metrics
+SLICE_FEATURES = [
+    'contract_length', 'payment_method', 'internet_service',
+    'tech_support', 'online_security', 'paperless_billing'
+]
+HISTOGRAM_BINS = 10
+
+# Deployment target and quality gate
+ML_API_BASE_URL = os.environ.get('ML_API_BASE_URL', 'http://ml-api.company.com')
+DEPLOY_ACCURACY_THRESHOLD = 0.75  # Could be loaded from config
+
 def load_model():
     """Load the trained model from the specified path"""
     try:
@@ -35,8 +49,8 @@ def load_model():
         logger.error(f"Failed to load model: {str(e)}")
         raise
 
-def validate_model_performance():
-    """Validate model performance using test data"""
+def evaluate_model(include_breakdown=False):
+    """Evaluate the model on test data, optionally with per-slice metrics and histograms"""
     try:
         model = load_model()
         
@@ -58,12 +72,115 @@ def validate_model_performance():
         
         logger.info(f"Model Performance: Accuracy={accuracy:.3f}, Precision={precision:.3f}, Recall={recall:.3f}")
         
-        return accuracy, precision, recall, probabilities
+        evaluation = {
+            'accuracy': accuracy,
+            'precision': precision,
+            'recall': recall,
+            'probabilities': probabilities
+        }
+        if include_breakdown:
+            evaluation['slice_metrics'] = compute_slice_metrics(X_test, y_test.values, predictions)
+            evaluation['histograms'] = compute_probability_histograms(y_test.values, probabilities)
+        return evaluation
     except Exception as e:
         logger.error(f"Error validating model performance: {str(e)}")
         raise
 
-def deploy_to_api(env='production'):
+def validate_model_performance():
+    """Validate model performance using test data"""
+    evaluation = evaluate_model()
+    return (evaluation['accuracy'], evaluation['precision'],
+            evaluation['recall'], evaluation['probabilities'])
+
+def compute_slice_metrics(X_test, y_true, predictions):
+    """Compute accuracy/precision/recall for every one-hot categorical slice"""
+    slice_metrics = []
+    for feature in SLICE_FEATURES:
+        prefix = f"{feature}_"
+        for column in X_test.columns:
+            if not column.startswith(prefix):
+                continue
+            mask = X_test[column].values.astype(bool)
+            sample_count = int(mask.sum())
+            if sample_count == 0:
+                continue
+            y_slice, pred_slice = y_true[mask], predictions[mask]
+            values = {
+                'accuracy': accuracy_score(y_slice, pred_slice),
+                'precision': precision_score(y_slice, pred_slice, zero_division=0),
+                'recall': recall_score(y_slice, pred_slice, zero_division=0)
+            }
+            for metric, value in values.items():
+                slice_metrics.append({
+                    'slice_name': feature,
+                    'slice_value': column[len(prefix):],
+                    'metric': metric,
+                    'value': float(value),
+                    'sample_count': sample_count
+                })
+    return slice_metrics
+
+def compute_probability_histograms(y_true, probabilities, bins=HISTOGRAM_BINS):
+    """Bin predicted churn probabilities separately for each true label"""
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    histograms = []
+    for label, name in ((1, 'probability_positive'), (0, 'probability_negative')):
+        counts = np.histogram(probabilities[y_true == label], bins=edges)[0]
+        for i, count in enumerate(counts):
+            histograms.append({
+                'histogram': name,
+                'bin_index': i,
+                'bin_lower': float(edges[i]),
+                'bin_upper': float(edges[i + 1]),
+                'count': int(count)
+            })
+    return histograms
+
+def meets_quality_threshold(evaluation):
+    """Check the evaluated accuracy against the deployment threshold"""
+    accuracy = evaluation['accuracy']
+    if accuracy < DEPLOY_ACCURACY_THRESHOLD:
+        logger.error(f"Model accuracy ({accuracy:.3f}) below threshold ({DEPLOY_ACCURACY_THRESHOLD})")
+        return False
+    return True
+
+def deployment_api_url(env):
+    """URL of the ML API deploy endpoint for an environment"""
+    return f"{ML_API_BASE_URL}/{env}/deploy"
+
+def build_deployment_payload(env, evaluation, model_path):
+    """Build the JSON body sent to the ML API deploy endpoint"""
+    return {
+        'model_path': model_path,
+        'accuracy': float(evaluation['accuracy']),
+        'precision': float(evaluation['precision']),
+        'recall': float(evaluation['recall']),
+        'version': os.environ.get('GITHUB_SHA', 'unknown')[:8],
+        'environment': env,
+        'deployed_at': datetime.now().isoformat()
+    }
+
+def build_slack_message(deployment_id, env, evaluation):
+    """Build the Slack message announcing a successful deployment"""
+    return {
+        "text": f"🚀 Model deployed successfully!",
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*Model Deployment Successful*\n"
+                           f"Environment: {env}\n"
+                           f"Deployment ID: {deployment_id}\n"
+                           f"Accuracy: {evaluation['accuracy']:.3f}\n"
+                           f"Precision: {evaluation['precision']:.3f}\n"
+                           f"Recall: {evaluation['recall']:.3f}"
+                }
+            }
+        ]
+    }
+
+def deploy_to_api(env='production', evaluation=None):
     """Deploy model to API endpoint"""
     try:
         # Validate required environment variables
@@ -76,27 +193,18 @@ def deploy_to_api(env='production'):
             raise ValueError("MODEL_PATH environment variable is required")
         
         # Get model metadata
-        accuracy, precision, recall, _ = validate_model_performance()
+        if evaluation is None:
+            evaluation = evaluate_model()
         
         # Check if model meets quality threshold
-        config_threshold = 0.75  # Could be loaded from config
-        if accuracy < config_threshold:
-            logger.error(f"Model accuracy ({accuracy:.3f}) below threshold ({config_threshold})")
+        if not meets_quality_threshold(evaluation):
             return None
         
         # Prepare deployment payload
-        deployment_data = {
-            'model_path': model_path,
-            'accuracy': float(accuracy),
-            'precision': float(precision),
-            'recall': float(recall),
-            'version': os.environ.get('GITHUB_SHA', 'unknown')[:8],
-            'environment': env,
-            'deployed_at': datetime.now().isoformat()
-        }
+        deployment_data = build_deployment_payload(env, evaluation, model_path)
         
         # Deploy to ML API
-        api_url = f"http://ml-api.company.com/{env}/deploy"
+        api_url = deployment_api_url(env)
         
         logger.info(f"Deploying model to {api_url}")
         response = requests.post(
@@ -127,7 +235,7 @@ def deploy_to_api(env='production'):
         logger.error(f"Deployment error: {str(e)}")
         return None
 
-def update_deployment_database(deployment_id, env='production'):
+def update_deployment_database(deployment_id, env='production', evaluation=None):
     """Update deployment records in database"""
     if not deployment_id:
         logger.error("Cannot update database: No deployment ID provided")
@@ -138,41 +246,36 @@ def update_deployment_database(deployment_id, env='production'):
         if not db_url:
             raise ValueError("DATABASE_URL environment variable is required")
         
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-        
-        # Insert deployment record
-        accuracy, precision, recall, _ = validate_model_performance()
+        if evaluation is None:
+            evaluation = evaluate_model()
         
-        insert_query = """
-            INSERT INTO model_deployments 
-            (deployment_id, model_version, environment, accuracy, precision, recall, deployed_at, status) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        cursor.execute(insert_query, (
-            deployment_id,
-            os.environ.get('GITHUB_SHA', 'unknown')[:8],
-            env,
-            accuracy,
-            precision,
-            recall,
-            datetime.now(),
-            'active'
-        ))
+        deployment = {
+            'deployment_id': deployment_id,
+            'model_version': os.environ.get('GITHUB_SHA', 'unknown')[:8],
+            'environment': env,
+            'accuracy': float(evaluation['accuracy']),
+            'precision': float(evaluation['precision']),
+            'recall': float(evaluation['recall']),
+            'deployed_at': datetime.now(),
+            'status': 'active'
+        }
         
-        # Update model registry
-        update_query = """
-            UPDATE model_registry 
-            SET current_deployment_id = %s, last_updated = %s 
-            WHERE environment = %s
-        """
+        # Per-slice metrics and histograms are only present when the
+        # evaluation was run with include_breakdown=True
+        slice_metrics = [
+            {**metric, 'deployment_id': deployment_id}
+            for metric in evaluation.get('slice_metrics', [])
+        ]
+        histograms = [
+            {**bin_row, 'deployment_id': deployment_id}
+            for bin_row in evaluation.get('histograms', [])
+        ]
         
-        cursor.execute(update_query, (deployment_id, datetime.now(), env))
+        # Insert deployment record and update model registry in one pooled transaction;
+        # the breakdown follows in its own transaction and cannot undo the deployment
+        if not get_store(db_url).record_deployments([deployment], slice_metrics, histograms):
+            logger.warning(f"Evaluation breakdown not recorded for deployment {deployment_id}")
         
-        conn.commit()
-        cursor.close()
-        conn.close()
         logger.info(f"Database updated successfully for deployment {deployment_id}")
         return True
     except psycopg2.Error as e:
@@ -182,7 +285,7 @@ def update_deployment_database(deployment_id, env='production'):
         logger.error(f"Error updating deployment database: {str(e)}")
         return False
 
-def send_slack_notification(deployment_id, env='production'):
+def send_slack_notification(deployment_id, env='production', evaluation=None):
     """Send notification to Slack"""
     if not deployment_id:
         logger.warning("Skipping notification: No deployment ID provided")
@@ -194,25 +297,10 @@ def send_slack_notification(deployment_id, env='production'):
             logger.info("No Slack webhook URL provided, skipping notification")
             return
             
-        accuracy, precision, recall, _ = validate_model_performance()
+        if evaluation is None:
+            evaluation = evaluate_model()
         
-        message = {
-            "text": f"🚀 Model deployed successfully!",
-            "blocks": [
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"*Model Deployment Successful*\n"
-                               f"Environment: {env}\n"
-                               f"Deployment ID: {deployment_id}\n"
-                               f"Accuracy: {accuracy:.3f}\n"
-                               f"Precision: {precision:.3f}\n"
-                               f"Recall: {recall:.3f}"
-                    }
-                }
-            ]
-        }
+        message = build_slack_message(deployment_id, env, evaluation)
         
         response = requests.post(webhook_url, json=message, timeout=10)
         if response.status_code == 200:
@@ -231,30 +319,37 @@ def main():
         parser = argparse.ArgumentParser(description="Deploy ML model to specified environment")
         parser.add_argument('--env', default='production', choices=['staging', 'production'],
                            help="Deployment environment (staging or production)")
+        parser.add_argument('--record-breakdown', action='store_true',
+                           help="Also record per-slice metrics and probability histograms")
         args = parser.parse_args()
         
         logger.info(f"Starting deployment to {args.env} environment...")
         
+        # Evaluate once and share the metrics across every step
+        evaluation = evaluate_model(include_breakdown=args.record_breakdown)
+        
         # Deploy model
-        deployment_id = deploy_to_api(args.env)
+        deployment_id = deploy_to_api(args.env, evaluation)
         if not deployment_id:
             logger.error("Deployment failed, exiting")
             sys.exit(1)
         
         # Update database
-        db_success = update_deployment_database(deployment_id, args.env)
+        db_success = update_deployment_database(deployment_id, args.env, evaluation)
         if not db_success:
             logger.error("Database update failed")
             # Continue execution but log the error
         
         # Send notification
-        send_slack_notification(deployment_id, args.env)
+        send_slack_notification(deployment_id, args.env, evaluation)
         
         logger.info("Deployment completed successfully!")
         return 0
     except Exception as e:
         logger.critical(f"Deployment failed with error: {str(e)}")
         return 1
+    finally:
+        close_stores()
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
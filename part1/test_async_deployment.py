@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Tests for concurrent deployment against a local stub server
+"""
+import json
+import asyncio
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import async_deployment
+import fixed_deployment
+from deployment_store import DeploymentStore
+
+EVALUATION = {'accuracy': 0.9, 'precision': 0.8, 'recall': 0.7, 'probabilities': None}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Stub ML API and Slack webhook; fails the first requests per path when asked"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, body))
+            server.headers.append((self.path, dict(self.headers)))
+            failures_left = server.failures.get(self.path, 0)
+            if failures_left:
+                server.failures[self.path] = failures_left - 1
+
+        if failures_left:
+            self.send_response(server.failure_status)
+            self.end_headers()
+            return
+
+        payload = {}
+        if self.path.endswith('/deploy'):
+            payload = {'deployment_id': f"dep-{body['environment']}"}
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.failures = {}
+    server.failure_status = 503
+    server.headers = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def deploy_env(stub_server, tmp_path, monkeypatch):
+    db_path = tmp_path / "deployments.db"
+    store = DeploymentStore(f"sqlite:///{db_path}")
+    store.create_schema(include_base=True)
+    store.close()
+
+    base_url = f"http://127.0.0.1:{stub_server.server_address[1]}"
+    monkeypatch.setattr(fixed_deployment, 'ML_API_BASE_URL', base_url)
+    monkeypatch.setattr(async_deployment, 'HTTP_BACKOFF_BASE', 0.01)
+    monkeypatch.setenv('API_KEY', 'test-key')
+    monkeypatch.setenv('MODEL_PATH', './model.pkl')
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{db_path}")
+    monkeypatch.setenv('SLACK_WEBHOOK', f"{base_url}/slack")
+    yield db_path
+    fixed_deployment.close_stores()
+
+
+def test_rollout_deploys_all_environments(stub_server, deploy_env):
+    """Test that every environment is deployed, recorded and announced"""
+    results = asyncio.run(async_deployment.rollout(['staging', 'production'], EVALUATION))
+
+    assert [r['deployment_id'] for r in results] == ['dep-staging', 'dep-production']
+    assert all(r['database_updated'] and r['notified'] for r in results)
+    paths = sorted(path for path, _ in stub_server.requests)
+    assert paths == ['/production/deploy', '/slack', '/slack', '/staging/deploy']
+
+    conn = sqlite3.connect(deploy_env)
+    assert conn.execute("SELECT COUNT(*) FROM model_deployments").fetchone()[0] == 2
+
+
+def test_rollout_retries_rate_limited_deploys(stub_server, deploy_env):
+    """Test that a rate-limited deploy is retried with the same idempotency key"""
+    stub_server.failure_status = 429
+    stub_server.failures['/staging/deploy'] = 2
+
+    results = asyncio.run(async_deployment.rollout(['staging'], EVALUATION))
+
+    assert results[0]['deployment_id'] == 'dep-staging'
+    keys = [headers['Idempotency-Key'] for path, headers in stub_server.headers if path == '/staging/deploy']
+    assert len(keys) == 3 and len(set(keys)) == 1
+
+
+def test_deploy_is_not_retried_after_server_errors(stub_server, deploy_env):
+    """Test that a 503 from the non-idempotent deploy endpoint is not retried"""
+    stub_server.failures['/staging/deploy'] = 1
+
+    results = asyncio.run(async_deployment.rollout(['staging'], EVALUATION))
+
+    assert results[0]['deployment_id'] is None
+    deploy_calls = [path for path, _ in stub_server.requests if path == '/staging/deploy']
+    assert len(deploy_calls) == 1
+
+
+def test_notification_retries_transient_failures(stub_server, deploy_env):
+    """Test that a 503 from the Slack webhook is retried"""
+    stub_server.failures['/slack'] = 2
+
+    results = asyncio.run(async_deployment.rollout(['staging'], EVALUATION))
+
+    assert results[0]['notified']
+    assert len([path for path, _ in stub_server.requests if path == '/slack']) == 3
+
+
+def test_deploy_read_timeouts_are_not_retried(monkeypatch):
+    """Test that only connection failures are retried for non-idempotent requests"""
+    monkeypatch.setattr(async_deployment, 'HTTP_BACKOFF_BASE', 0.01)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await async_deployment.post_with_retries(client, "http://api/deploy", {}, idempotent=False)
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_rollout_gives_up_after_max_retries(stub_server, deploy_env, monkeypatch):
+    """Test that retries are bounded"""
+    monkeypatch.setattr(async_deployment, 'HTTP_MAX_RETRIES', 1)
+    stub_server.failure_status = 429
+    stub_server.failures['/staging/deploy'] = 5
+
+    results = asyncio.run(async_deployment.rollout(['staging'], EVALUATION))
+
+    assert results[0]['deployment_id'] is None
+    assert not results[0]['notified']
+    deploy_calls = [path for path, _ in stub_server.requests if path == '/staging/deploy']
+    assert len(deploy_calls) == 2
+
+
+def test_backoff_delay_is_capped():
+    """Test that jittered backoff stays within the exponential cap"""
+    for attempt in range(10):
+        assert 0 <= async_deployment.backoff_delay(attempt, base=0.5, cap=4.0) <= 4.0
+
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
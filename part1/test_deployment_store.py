@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pooled deployment store (SQLite stand-in)
+"""
+import sqlite3
+import pytest
+
+from deployment_store import BASE_SCHEMA, DeploymentStore
+import fixed_deployment
+
+EVALUATION = {
+    'accuracy': 0.81,
+    'precision': 0.77,
+    'recall': 0.7,
+    'probabilities': None,
+    'slice_metrics': [
+        {'slice_name': 'contract_length', 'slice_value': 'one_year',
+         'metric': 'accuracy', 'value': 0.9, 'sample_count': 40}
+    ],
+    'histograms': [
+        {'histogram': 'probability_positive', 'bin_index': 0,
+         'bin_lower': 0.0, 'bin_upper': 0.1, 'count': 3}
+    ]
+}
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "deployments.db"
+    store = DeploymentStore(f"sqlite:///{path}")
+    store.create_schema(include_base=True)
+    with store.connection() as conn:
+        conn.executemany(
+            "INSERT INTO model_registry (environment) VALUES (?)",
+            [("staging",), ("production",)]
+        )
+    store.close()
+    return path
+
+def test_record_deployments_batches_rows(db_path):
+    """Test that several deployments are written and the registry points at the newest"""
+    store = DeploymentStore(f"sqlite:///{db_path}", maxconn=2)
+    store.record_deployments([
+        {'deployment_id': 'dep-1', 'model_version': 'aaa', 'environment': 'staging',
+         'accuracy': 0.8, 'precision': 0.7, 'recall': 0.6},
+        {'deployment_id': 'dep-2', 'model_version': 'bbb', 'environment': 'staging',
+         'accuracy': 0.85, 'precision': 0.75, 'recall': 0.65},
+        {'deployment_id': 'dep-3', 'model_version': 'ccc', 'environment': 'production',
+         'accuracy': 0.9, 'precision': 0.8, 'recall': 0.7},
+    ])
+    store.close()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM model_deployments").fetchone()[0] == 3
+    registry = dict(conn.execute("SELECT environment, current_deployment_id FROM model_registry"))
+    assert registry == {'staging': 'dep-2', 'production': 'dep-3'}
+
+def test_record_deployments_rolls_back_on_error(db_path):
+    """Test that a failed batch leaves no partial rows behind"""
+    store = DeploymentStore(f"sqlite:///{db_path}")
+    store.record_deployments([{'deployment_id': 'dep-1', 'environment': 'staging'}])
+    with pytest.raises(sqlite3.IntegrityError):
+        store.record_deployments(
+            [{'deployment_id': 'dep-2', 'environment': 'staging'},
+             {'deployment_id': 'dep-1', 'environment': 'staging'}]
+        )
+    store.close()
+
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute("SELECT deployment_id FROM model_deployments")]
+    assert ids == ['dep-1']
+
+def test_update_deployment_database_bulk_path(db_path, monkeypatch):
+    """Test that precomputed metrics are written without re-running evaluation"""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{db_path}")
+    monkeypatch.setattr(fixed_deployment, 'evaluate_model',
+                        lambda *args, **kwargs: pytest.fail("evaluation should be reused"))
+
+    assert fixed_deployment.update_deployment_database('dep-9', 'production', EVALUATION)
+    fixed_deployment.close_stores()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute(
+        "SELECT accuracy FROM model_deployments WHERE deployment_id = 'dep-9'"
+    ).fetchone()[0] == pytest.approx(0.81)
+    assert conn.execute(
+        "SELECT COUNT(*) FROM model_deployment_slice_metrics WHERE deployment_id = 'dep-9'"
+    ).fetchone()[0] == 1
+    assert conn.execute(
+        "SELECT count FROM model_deployment_histograms WHERE deployment_id = 'dep-9'"
+    ).fetchone()[0] == 3
+
+def test_breakdown_tables_created_on_deploy_path(tmp_path, monkeypatch):
+    """Test that the breakdown tables are created when only the base schema exists"""
+    path = tmp_path / "registry.db"
+    conn = sqlite3.connect(path)
+    for statement in BASE_SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO model_registry (environment) VALUES ('production')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{path}")
+
+    assert fixed_deployment.update_deployment_database('dep-1', 'production', EVALUATION)
+    fixed_deployment.close_stores()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM model_deployment_slice_metrics").fetchone()[0] == 1
+    assert conn.execute("SELECT current_deployment_id FROM model_registry").fetchone()[0] == 'dep-1'
+
+def test_breakdown_failure_keeps_deployment(db_path):
+    """Test that a failed breakdown write does not roll back the deployment row"""
+    store = DeploymentStore(f"sqlite:///{db_path}")
+    written = store.record_deployments(
+        [{'deployment_id': 'dep-1', 'environment': 'staging'}],
+        slice_metrics=[{'deployment_id': 'dep-1', 'unknown': object()}, {'slice_name': object()}]
+    )
+    store.close()
+    assert written is False
+
+    conn = sqlite3.connect(db_path)
+    assert [row[0] for row in conn.execute("SELECT deployment_id FROM model_deployments")] == ['dep-1']
+    assert conn.execute("SELECT current_deployment_id FROM model_registry "
+                        "WHERE environment = 'staging'").fetchone()[0] == 'dep-1'
+
+def test_in_memory_sqlite_is_rejected():
+    """Test that URLs giving every pooled connection its own empty database are refused"""
+    for url in ("sqlite://", "sqlite:///:memory:", "sqlite:///file:db?mode=memory"):
+        with pytest.raises(ValueError):
+            DeploymentStore(url)
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
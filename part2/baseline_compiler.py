@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Precompiled baselines for fast service start.
+
+At image build time the baseline JSON is compiled into an ``.npz`` file
+holding the PSI bin edges and expected bin proportions for every numerical
+feature, plus the source JSON itself. At startup the service loads that file
+instead of re-deriving the histograms, and falls back to the JSON when the
+compiled copy is missing or was built from different baseline contents
+(e.g. a baseline mounted from a ConfigMap).
+
+Usage (build time):
+    python baseline_compiler.py --baseline baseline_data.json --output baseline_data.npz \
+        [--model model.pkl --model-output model_compiled.npz]
+"""
+import json
+import hashlib
+import argparse
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('drift_detector.baseline_compiler')
+
+PSI_BINS = 10
+COMPILED_FORMAT_VERSION = 2
+
+
+def source_hash(raw: bytes) -> str:
+    """Content hash tying a compiled baseline to its source JSON"""
+    return hashlib.sha256(raw).hexdigest()
+
+
+def build_cache(baseline: Dict[str, Any], bins=PSI_BINS) -> Dict[str, Dict[str, np.ndarray]]:
+    """Precompute PSI bin edges, expected proportions and valid ranges for numerical features"""
+    cache = {}
+    for feature_name, baseline_feature in baseline.get("features", {}).items():
+        if "values" not in baseline_feature:
+            continue
+        expected = np.asarray(baseline_feature["values"], dtype=float).ravel()
+        if expected.size == 0:
+            continue
+        edges = np.histogram_bin_edges(expected, bins=bins)
+        expected_percents = np.histogram(expected, bins=edges)[0] / len(expected)
+        cache[feature_name] = {
+            "edges": edges,
+            "expected_percents": np.where(expected_percents == 0, 0.0001, expected_percents),
+            "bounds": np.array([baseline_feature.get("min", expected.min()),
+                                baseline_feature.get("max", expected.max())], dtype=float)
+        }
+    return cache
+
+
+def build_slice_cache(baseline: Dict[str, Any], cache: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, Dict[str, Dict[str, np.ndarray]]]:
+    """Expected proportions of per-slice baseline overrides, binned on the global edges"""
+    slice_cache = {}
+    for dimension, slices in baseline.get("slices", {}).get("baselines", {}).items():
+        for value, features in slices.items():
+            for feature_name, baseline_feature in features.items():
+                expected = np.asarray(baseline_feature.get("values", []), dtype=float).ravel()
+                if feature_name not in cache or expected.size == 0:
+                    continue
+                expected_percents = np.histogram(expected, bins=cache[feature_name]["edges"])[0] / len(expected)
+                slice_cache.setdefault(dimension, {}).setdefault(value, {})[feature_name] = np.where(
+                    expected_percents == 0, 0.0001, expected_percents)
+    return slice_cache
+
+
+def save_compiled(path, raw_json: bytes):
+    """Compile a baseline JSON document into an .npz file"""
+    baseline = json.loads(raw_json)
+    arrays = {
+        "__format__": np.array(COMPILED_FORMAT_VERSION),
+        "__source_hash__": np.array(source_hash(raw_json)),
+        "__json__": np.frombuffer(raw_json, dtype=np.uint8),
+    }
+    for feature_name, entry in build_cache(baseline).items():
+        for field, array in entry.items():
+            arrays[f"{feature_name}/{field}"] = array
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+    return baseline
+
+
+def load_compiled(path, expected_hash: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], Dict[str, Dict[str, np.ndarray]]]]:
+    """Load (baseline, cache) from a compiled file, or None if it is stale or unreadable"""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["__format__"]) != COMPILED_FORMAT_VERSION:
+                return None
+            if expected_hash is not None and str(data["__source_hash__"]) != expected_hash:
+                return None
+            baseline = json.loads(data["__json__"].tobytes())
+            cache = {}
+            for key in data.files:
+                if key.startswith("__"):
+                    continue
+                feature_name, field = key.rsplit("/", 1)
+                cache.setdefault(feature_name, {})[field] = data[key]
+        return baseline, cache
+    except Exception as e:
+        logger.warning(f"Ignoring compiled baseline {path}: {str(e)}")
+        return None
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Precompile baseline data (and optionally the model)")
+    parser.add_argument('--baseline', default='baseline_data.json')
+    parser.add_argument('--output', default='baseline_data.npz')
+    parser.add_argument('--model', default=None, help="Pickled linear model to precompile")
+    parser.add_argument('--model-output', default='model_compiled.npz')
+    args = parser.parse_args()
+
+    with open(args.baseline, 'rb') as f:
+        raw_json = f.read()
+    baseline = save_compiled(args.output, raw_json)
+    logger.info(f"Compiled {len(baseline.get('features', {}))} baseline features into {args.output}")
+
+    if args.model:
+        import pickle
+        from linear_scorer import compile_model, model_hash, save_compiled_model
+        with open(args.model, 'rb') as f:
+            model = pickle.load(f)
+        save_compiled_model(args.model_output, compile_model(model), model_hash(args.model))
+        logger.info(f"Compiled model {args.model} into {args.model_output}")
+
+
+if __name__ == "__main__":
+    main()
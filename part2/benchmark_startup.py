@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the drift detector service.
+
+Starts the service in a subprocess for each startup configuration and
+measures wall time from process launch until /monitor/live and
+/monitor/ready first answer 200.
+
+Usage:
+    python benchmark_startup.py [--model model.pkl] [--runs 5]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+POLL_INTERVAL = 0.005
+TIMEOUT = 60.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def is_ok(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+
+def measure(env_overrides):
+    """Return (seconds to live, seconds to ready) for one service start"""
+    port = free_port()
+    env = {**os.environ, **env_overrides}
+    base = f"http://127.0.0.1:{port}/monitor"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'drift_detector:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    live = ready = None
+    try:
+        while time.perf_counter() - start < TIMEOUT:
+            if live is None and is_ok(f"{base}/live"):
+                live = time.perf_counter() - start
+            if live is not None and is_ok(f"{base}/ready"):
+                ready = time.perf_counter() - start
+                break
+            time.sleep(POLL_INTERVAL)
+    finally:
+        process.terminate()
+        process.wait()
+    return live, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure drift detector startup time")
+    parser.add_argument('--baseline', default=os.path.join(HERE, 'baseline_data.json'))
+    parser.add_argument('--model', default=None, help="Pickled model to load (optional)")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        compiled_baseline = os.path.join(tmp, 'baseline_data.npz')
+        compiled_model = os.path.join(tmp, 'model_compiled.npz')
+        command = [sys.executable, 'baseline_compiler.py', '--baseline', args.baseline, '--output', compiled_baseline]
+        if args.model:
+            command += ['--model', args.model, '--model-output', compiled_model]
+        subprocess.run(command, cwd=HERE, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        common = {'BASELINE_DATA_PATH': args.baseline, 'MODEL_PATH': args.model or os.path.join(tmp, 'missing.pkl')}
+        scenarios = {
+            'json baseline + pickled model (eager)': {
+                **common, 'FAST_STARTUP': 'false',
+                'BASELINE_COMPILED_PATH': os.path.join(tmp, 'none.npz'),
+                # Empty disables the compiled model, so eager runs never write one for later runs
+                'MODEL_COMPILED_PATH': ''
+            },
+            'compiled baseline + model (fast startup)': {
+                **common, 'FAST_STARTUP': 'true',
+                'BASELINE_COMPILED_PATH': compiled_baseline,
+                'MODEL_COMPILED_PATH': compiled_model
+            },
+        }
+
+        print(f"{'scenario':45s} {'live (s)':>10s} {'ready (s)':>10s}")
+        for name, env in scenarios.items():
+            results = [measure(env) for _ in range(args.runs)]
+            live = statistics.median(r[0] for r in results if r[0] is not None)
+            ready = statistics.median(r[1] for r in results if r[1] is not None)
+            print(f"{name:45s} {live:10.3f} {ready:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Fast request/response codecs for the monitor endpoints.
+
+Request bodies decode in one pass straight into msgspec Structs, and
+responses are encoded directly to bytes, bypassing FastAPI's response_model
+re-validation and ``jsonable_encoder``. Clients may send and accept
+MessagePack (``application/msgpack``) instead of JSON. The Pydantic models
+stay the single source of truth: ``wire_struct`` derives each Struct (field
+types, defaults and numeric/length constraints) from its model, and routes
+document the model through ``openapi_body``.
+
+Lax decoding coerces numeric strings ("35") like Pydantic v1. Pydantic v1 also
+turns numbers and booleans into strings for ``str`` fields (5 -> "5"), which
+msgspec does not do, so ``str`` fields are decoded as a lax union and converted
+after decoding. An int field rejects floats with a fractional part (35.5) and
+booleans, which Pydantic v1 would truncate or convert to 35 and 1.
+"""
+import re
+import copy
+from typing import Any, Dict, List, Optional, Tuple, Type, Union, get_args, get_origin, get_type_hints
+
+import msgspec
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+from typing_extensions import Annotated
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+_json_encoder = msgspec.json.Encoder()
+_msgpack_encoder = msgspec.msgpack.Encoder()
+
+
+def _media_types(header):
+    return [part.split(";", 1)[0].strip().lower() for part in header.split(",")]
+
+
+def is_msgpack(content_type) -> bool:
+    """Whether a Content-Type header names MessagePack"""
+    return bool(content_type) and _media_types(content_type)[0] in MSGPACK_CONTENT_TYPES
+
+
+def prefers_msgpack(request: Request) -> bool:
+    """Answer in MessagePack if the client accepts it, or sent it and accepts anything"""
+    accept = request.headers.get("accept")
+    if accept:
+        media_types = _media_types(accept)
+        if any(media_type in MSGPACK_CONTENT_TYPES for media_type in media_types):
+            return True
+        if JSON_CONTENT_TYPE in media_types:
+            return False
+    return is_msgpack(request.headers.get("content-type"))
+
+
+# Pydantic v1 FieldInfo constraints with a msgspec.Meta equivalent
+_CONSTRAINTS = ("gt", "ge", "lt", "le", "multiple_of", "min_length", "max_length")
+_GENERIC_ORIGINS = {list: List, dict: Dict, tuple: Tuple, Union: Union}
+# Values Pydantic v1 accepts (and stringifies) for a str field
+_STR_COERCIBLE = Union[str, bool, int, float]
+_wire_structs: Dict[Type[BaseModel], Type[msgspec.Struct]] = {}
+
+
+def _wire_type(annotation):
+    """The annotation with every nested Pydantic model replaced by its Struct"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return wire_struct(annotation)
+    origin = get_origin(annotation)
+    if origin in _GENERIC_ORIGINS:
+        args = tuple(_wire_type(arg) for arg in get_args(annotation))
+        return _GENERIC_ORIGINS[origin][args if len(args) > 1 else args[0]]
+    return annotation
+
+
+def _is_str_field(annotation) -> bool:
+    """Whether a field is declared as str or Optional[str]"""
+    if annotation is str:
+        return True
+    return get_origin(annotation) is Union and set(get_args(annotation)) == {str, type(None)}
+
+
+def _stringify_fields(names):
+    """__post_init__ converting numbers decoded into lax str fields to str, as Pydantic v1 does"""
+    def __post_init__(self):
+        for name in names:
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, str):
+                setattr(self, name, str(value))
+    return __post_init__
+
+
+def wire_struct(model: Type[BaseModel]) -> Type[msgspec.Struct]:
+    """msgspec Struct decoding the same fields, types, defaults and constraints as a Pydantic model"""
+    struct = _wire_structs.get(model)
+    if struct is None:
+        fields = []
+        str_fields = []
+        # Declared annotations: Pydantic rewrites constrained fields into its own types
+        hints = get_type_hints(model)
+        for name, field in model.__fields__.items():
+            annotation = _wire_type(hints[name])
+            constraints = {key: getattr(field.field_info, key) for key in _CONSTRAINTS
+                           if getattr(field.field_info, key, None) is not None}
+            if constraints:
+                annotation = Annotated[annotation, msgspec.Meta(**constraints)]
+            elif _is_str_field(annotation):
+                annotation = Optional[_STR_COERCIBLE] if annotation is not str else _STR_COERCIBLE
+                str_fields.append(name)
+            fields.append((name, annotation) if field.required else (name, annotation, field.default))
+        namespace = {"__doc__": f"Wire struct generated from {model.__name__}"}
+        if str_fields:
+            namespace["__post_init__"] = _stringify_fields(tuple(str_fields))
+        struct = _wire_structs[model] = msgspec.defstruct(
+            f"{model.__name__}Struct", fields, kw_only=True, module=model.__module__, namespace=namespace
+        )
+    return struct
+
+
+_ERROR_PATH = re.compile(r" - at `\$(.*)`$")
+_PATH_PART = re.compile(r"\.([^.\[]+)|\[(\d+)\]")
+_TYPE_ERROR = re.compile(r"^Expected `[^`]*`, got `[^`]*`")
+
+
+def error_detail(error: Exception) -> List[Dict[str, Any]]:
+    """FastAPI-shaped 422 detail for a msgspec error, e.g. loc ["body", "features", "age"]"""
+    message = str(error)
+    loc: List[Union[str, int]] = ["body"]
+    match = _ERROR_PATH.search(message)
+    if match:
+        loc += [int(index) if index else key for key, index in _PATH_PART.findall(match.group(1))]
+    kind = "type_error" if _TYPE_ERROR.match(message) else "value_error"
+    return [{"loc": loc, "msg": message, "type": kind}]
+
+
+class BodyDecoder:
+    """JSON and MessagePack decoders for one request Struct type"""
+
+    def __init__(self, struct_type):
+        # Lax mode accepts the same coercions as Pydantic (e.g. "35" for an int)
+        self.json = msgspec.json.Decoder(struct_type, strict=False)
+        self.msgpack = msgspec.msgpack.Decoder(struct_type, strict=False)
+
+    async def decode(self, request: Request):
+        """Decode the request body, raising a 422 in FastAPI's error shape if it is invalid"""
+        decoder = self.msgpack if is_msgpack(request.headers.get("content-type")) else self.json
+        try:
+            return decoder.decode(await request.body())
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            raise HTTPException(status_code=422, detail=error_detail(e))
+
+    async def decode_untyped(self, request: Request) -> Any:
+        """Best-effort decode of the body without a schema (None if it is malformed)"""
+        decode = msgspec.msgpack.decode if is_msgpack(request.headers.get("content-type")) else msgspec.json.decode
+        try:
+            return decode(await request.body())
+        except msgspec.DecodeError:
+            return None
+
+
+def encode_response(content: Any, request: Request, status_code: int = 200) -> Response:
+    """Serialize content without response model validation, honouring the Accept header"""
+    if prefers_msgpack(request):
+        return Response(_msgpack_encoder.encode(content), status_code, media_type=MSGPACK_CONTENT_TYPE)
+    return Response(_json_encoder.encode(content), status_code, media_type=JSON_CONTENT_TYPE)
+
+
+def _inline_refs(node, definitions):
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if ref is not None:
+            return _inline_refs(copy.deepcopy(definitions[ref.rsplit("/", 1)[-1]]), definitions)
+        return {key: _inline_refs(value, definitions) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_inline_refs(item, definitions) for item in node]
+    return node
+
+
+def openapi_body(model: Type[BaseModel]) -> Dict[str, Any]:
+    """``openapi_extra`` documenting a raw-body route's JSON and MessagePack body from its Pydantic model"""
+    schema = model.schema()
+    schema = _inline_refs(schema, schema.pop("definitions", {}))
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                JSON_CONTENT_TYPE: {"schema": schema},
+                MSGPACK_CONTENT_TYPE: {"schema": schema}
+            }
+        }
+    }
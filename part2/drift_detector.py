@@ -4,17 +4,33 @@ Data Drift Detection Service for ML Model Monitoring
 """
 import os
 import json
+import signal
+import asyncio
 import logging
 import numpy as np
+import msgspec
+from collections import Counter as CategoryCounter
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Union
 
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from prometheus_client import Counter, Gauge, generate_latest, CONTENT_TYPE_LATEST
 
+from baseline_compiler import build_cache, load_compiled, source_hash
+from drift_scoring import BaselineScorer, calculate_chi_square, calculate_psi_counts, summarize_drift
+from codec import BodyDecoder, encode_response, openapi_body, wire_struct
+from inference import InferenceService, build_inference_router
+from instrumentation import (INSTRUMENTATION_ENABLED, EventLoopLagMonitor, SamplingProfiler,
+                             build_admin_router, stage_timer, time_requests)
+from performance_monitor import PerformanceMonitor, build_feedback_router
+from sampling import IngestionSampler, LoadMonitor
+from window_state import AGGREGATOR_MODE, DriftWindow, SnapshotAggregator, build_window_router
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,17 +54,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if INSTRUMENTATION_ENABLED:
+    app.middleware("http")(time_requests)
+
 # Prometheus metrics
 PREDICTION_COUNTER = Counter('model_predictions_total', 'Total number of predictions', ['model_version'])
 DRIFT_SCORE_GAUGE = Gauge('model_drift_score', 'Current drift score', ['model_version', 'feature'])
+SLICE_DRIFT_SCORE_GAUGE = Gauge('model_slice_drift_score', 'Drift score of a segment over the window',
+                                ['model_version', 'dimension', 'slice', 'feature'])
+DATA_QUALITY_GAUGE = Gauge('model_data_quality_rate', 'Share of windowed observations failing a data quality check',
+                           ['model_version', 'feature', 'check'])
 DRIFT_ALERT_COUNTER = Counter('model_drift_alerts_total', 'Total number of drift alerts', ['model_version', 'severity'])
 
 # Load baseline data
 BASELINE_DATA_PATH = os.environ.get('BASELINE_DATA_PATH', 'baseline_data.json')
+BASELINE_COMPILED_PATH = os.environ.get('BASELINE_COMPILED_PATH', 'baseline_data.npz')
 
-# Drift thresholds
-WARNING_THRESHOLD = float(os.environ.get('DRIFT_WARNING_THRESHOLD', '0.2'))
-CRITICAL_THRESHOLD = float(os.environ.get('DRIFT_CRITICAL_THRESHOLD', '0.5'))
+# Serve liveness immediately and warm up in the background (readiness flips when warm)
+FAST_STARTUP = os.environ.get('FAST_STARTUP', 'false').lower() == 'true'
+# Warm start is retried with exponential backoff; the process exits once retries run out
+WARM_START_RETRIES = int(os.environ.get('WARM_START_RETRIES', '3'))
+WARM_START_RETRY_SECONDS = float(os.environ.get('WARM_START_RETRY_SECONDS', '2'))
 
 # Data models
 class FeatureData(BaseModel):
@@ -71,17 +97,42 @@ class DriftResponse(BaseModel):
     severity: str
     feature_scores: Dict[str, float]
     timestamp: str
+    sampled: bool = Field(True, description="False if ingestion sampling skipped or deferred scoring")
+    sample_weight: float = Field(1.0, description="Inverse keep probability of a scored observation")
+
+# Wire-format structs generated from the models above, decoded without Pydantic on the hot path
+PredictionStruct = wire_struct(PredictionRequest)
+FeatureStruct = wire_struct(FeatureData)
+
+prediction_decoder = BodyDecoder(PredictionStruct)
 
 # Global variables
 baseline_data = {}
+baseline_cache = {}
+_baseline_cache_source = None
+_scorer = None
+service_state = {"ready": False}
 
 def load_baseline_data():
-    """Load baseline data from JSON file"""
-    global baseline_data
+    """Load baseline data, preferring the precompiled copy when it matches the JSON"""
+    global baseline_data, baseline_cache, _baseline_cache_source
     try:
+        raw_json = None
         if os.path.exists(BASELINE_DATA_PATH):
-            with open(BASELINE_DATA_PATH, 'r') as f:
-                baseline_data = json.load(f)
+            with open(BASELINE_DATA_PATH, 'rb') as f:
+                raw_json = f.read()
+        
+        compiled = None
+        if os.path.exists(BASELINE_COMPILED_PATH):
+            expected_hash = source_hash(raw_json) if raw_json is not None else None
+            compiled = load_compiled(BASELINE_COMPILED_PATH, expected_hash)
+        
+        if compiled is not None:
+            baseline_data, baseline_cache = compiled
+            _baseline_cache_source = baseline_data
+            logger.info(f"Loaded compiled baseline data from {BASELINE_COMPILED_PATH}")
+        elif raw_json is not None:
+            baseline_data = json.loads(raw_json)
             logger.info(f"Loaded baseline data from {BASELINE_DATA_PATH}")
         else:
             logger.warning(f"Baseline data file not found at {BASELINE_DATA_PATH}")
@@ -90,6 +141,21 @@ def load_baseline_data():
         logger.error(f"Error loading baseline data: {str(e)}")
         baseline_data = {"features": {}}
 
+def get_baseline_cache() -> Dict[str, Dict[str, Any]]:
+    """PSI bins for the current baseline, rebuilt whenever baseline_data is replaced"""
+    global baseline_cache, _baseline_cache_source
+    if _baseline_cache_source is not baseline_data:
+        baseline_cache = build_cache(baseline_data)
+        _baseline_cache_source = baseline_data
+    return baseline_cache
+
+def baseline_scorer() -> BaselineScorer:
+    """Window scorer for the current baseline, rebuilt whenever baseline_data is replaced"""
+    global _scorer
+    if _scorer is None or _scorer.baseline is not baseline_data:
+        _scorer = BaselineScorer(baseline_data, get_baseline_cache())
+    return _scorer
+
 def calculate_psi(expected_array, actual_array, bins=10) -> float:
     """
     Calculate Population Stability Index (PSI) for numerical features
@@ -118,43 +184,29 @@ def calculate_psi(expected_array, actual_array, bins=10) -> float:
         logger.error(f"Error calculating PSI: {str(e)}")
         return 0.0
 
-def calculate_chi_square(expected_counts, actual_counts) -> float:
-    """Calculate Chi-square statistic for categorical features"""
-    if not expected_counts or not actual_counts:
+def calculate_psi_binned(edges, expected_percents, actual_array, weights=None) -> float:
+    """Calculate PSI against precomputed baseline bin edges and proportions (optionally weighted)"""
+    actual = np.asarray(actual_array, dtype=float).ravel()
+    if actual.size == 0:
         return 0.0
-        
+    
     try:
-        # Get all unique categories
-        all_categories = set(expected_counts.keys()) | set(actual_counts.keys())
-        
-        # Calculate chi-square statistic
-        chi_square = 0
-        total_expected = sum(expected_counts.values())
-        total_actual = sum(actual_counts.values())
-        
-        for category in all_categories:
-            e_count = expected_counts.get(category, 0)
-            a_count = actual_counts.get(category, 0)
-            
-            # Convert to proportions
-            e_prop = e_count / total_expected if total_expected > 0 else 0
-            a_prop = a_count / total_actual if total_actual > 0 else 0
-            
-            # Skip if both are zero
-            if e_prop == 0 and a_prop == 0:
-                continue
-                
-            # Use small epsilon to avoid division by zero
-            e_prop = max(e_prop, 0.0001)
-            
-            # Add to chi-square
-            chi_square += ((a_prop - e_prop) ** 2) / e_prop
-            
-        return float(chi_square)
+        if weights is None:
+            return calculate_psi_counts(expected_percents, np.histogram(actual, bins=edges)[0], actual.size)
+        weights = np.asarray(weights, dtype=float)
+        return calculate_psi_counts(expected_percents, np.histogram(actual, bins=edges, weights=weights)[0],
+                                    weights.sum())
     except Exception as e:
-        logger.error(f"Error calculating chi-square: {str(e)}")
+        logger.error(f"Error calculating PSI: {str(e)}")
         return 0.0
 
+def psi_against_baseline(feature_name: str, actual_array, weights=None) -> float:
+    """PSI of observed values against a numerical baseline feature"""
+    cached = get_baseline_cache().get(feature_name)
+    if cached is None:
+        return calculate_psi(baseline_data["features"][feature_name]["values"], actual_array)
+    return calculate_psi_binned(cached["edges"], cached["expected_percents"], actual_array, weights)
+
 def detect_drift(features: Dict[str, Any]) -> Dict[str, Any]:
     """Detect drift in features compared to baseline"""
     if not baseline_data or "features" not in baseline_data:
@@ -167,7 +219,6 @@ def detect_drift(features: Dict[str, Any]) -> Dict[str, Any]:
         }
     
     feature_scores = {}
-    max_score = 0.0
     
     # Process each feature
     for feature_name, feature_value in features.items():
@@ -180,70 +231,298 @@ def detect_drift(features: Dict[str, Any]) -> Dict[str, Any]:
         if isinstance(feature_value, (int, float)):
             # Numerical feature
             if "values" in baseline_feature:
-                baseline_values = baseline_feature["values"]
-                score = calculate_psi([baseline_values], [feature_value])
+                with stage_timer("psi"):
+                    score = psi_against_baseline(feature_name, [feature_value])
                 feature_scores[feature_name] = score
-                max_score = max(max_score, score)
         elif isinstance(feature_value, str):
             # Categorical feature
             if "distribution" in baseline_feature:
                 baseline_dist = baseline_feature["distribution"]
                 actual_dist = {feature_value: 1}
-                score = calculate_chi_square(baseline_dist, actual_dist)
+                with stage_timer("chi_square"):
+                    score = calculate_chi_square(baseline_dist, actual_dist)
                 feature_scores[feature_name] = score
-                max_score = max(max_score, score)
     
-    # Determine severity
-    severity = "none"
-    if max_score >= CRITICAL_THRESHOLD:
-        severity = "critical"
-    elif max_score >= WARNING_THRESHOLD:
-        severity = "warning"
+    return summarize_drift(feature_scores)
+
+def detect_drift_batch(features_batch: List[Dict[str, Any]], weights: Optional[List[float]] = None) -> Dict[str, Any]:
+    """Detect drift of a batch of observations (optionally with sampling weights) against baseline"""
+    if not baseline_data or "features" not in baseline_data:
+        logger.warning("No baseline data available for drift detection")
+        return {
+            "drift_detected": False,
+            "drift_score": 0.0,
+            "severity": "unknown",
+            "feature_scores": {}
+        }
     
+    feature_scores = {}
+    for feature_name, baseline_feature in baseline_data["features"].items():
+        values = [row.get(feature_name) for row in features_batch]
+        if "values" in baseline_feature:
+            # Numerical feature: PSI of the batch against the baseline sample
+            numerical = [i for i, v in enumerate(values) if isinstance(v, (int, float)) and not isinstance(v, bool)]
+            actual = np.array([values[i] for i in numerical], dtype=float)
+            actual_weights = None if weights is None else [weights[i] for i in numerical]
+            if actual.size:
+                with stage_timer("psi"):
+                    feature_scores[feature_name] = psi_against_baseline(feature_name, actual, actual_weights)
+        elif "distribution" in baseline_feature:
+            # Categorical feature: chi-square of the batch (weighted) category counts
+            actual_dist = CategoryCounter()
+            for v, w in zip(values, weights or [1] * len(values)):
+                if isinstance(v, str):
+                    actual_dist[v] += w
+            if actual_dist:
+                with stage_timer("chi_square"):
+                    feature_scores[feature_name] = calculate_chi_square(
+                        baseline_feature["distribution"], actual_dist
+                    )
+    
+    return summarize_drift(feature_scores)
+
+def record_drift_metrics(model_version: str, drift_result: Dict[str, Any], count: int = 1,
+                         alert_weight: float = 1.0):
+    """Update Prometheus metrics for an observation or batch (alerts weighted by sampling)"""
+    if count:
+        PREDICTION_COUNTER.labels(model_version).inc(count)
+    for feature, score in drift_result["feature_scores"].items():
+        DRIFT_SCORE_GAUGE.labels(model_version, feature).set(score)
+    if drift_result["drift_detected"]:
+        DRIFT_ALERT_COUNTER.labels(model_version, drift_result["severity"]).inc(alert_weight)
+
+def process_observations(model_version: str, features_batch: List[Dict[str, Any]],
+                         weights: Optional[List[float]] = None, count: int = 0) -> Dict[str, Any]:
+    """Score sampled observations, record drift metrics and add them to the window"""
+    with stage_timer("detect_drift_batch"):
+        drift_result = detect_drift_batch(features_batch, weights)
+    with stage_timer("metrics"):
+        # One alert per (weighted) observation, as on the single-observation path
+        alert_weight = float(sum(weights)) if weights is not None else float(len(features_batch))
+        record_drift_metrics(model_version, drift_result, count, alert_weight=alert_weight)
+    with stage_timer("window"):
+        drift_window.record(model_version, features_batch, weights=weights)
+    return drift_result
+
+def monitor_batch(model_version: str, features_batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Run drift detection over the sampled part of an inference batch and record its metrics"""
+    rows, weights = ingestion_sampler.sample_batch(model_version, features_batch)
+    if not rows:
+        PREDICTION_COUNTER.labels(model_version).inc(len(features_batch))
+        return skipped_result()
+    return process_observations(model_version, rows, weights, len(features_batch))
+
+def record_type_violations(model_version: str, errors: List[Dict[str, Any]]):
+    """Count feature values rejected with a 422 as type violations in the window"""
+    features = {str(error["loc"][2]) for error in errors
+                if tuple(error["loc"][:2]) == ("body", "features") and len(error["loc"]) == 3
+                and error["type"].startswith("type_error")}
+    if features:
+        drift_window.record_type_violations(model_version, sorted(features))
+
+def skipped_result() -> Dict[str, Any]:
+    """Drift result for observations that sampling skipped or deferred"""
     return {
-        "drift_detected": max_score >= WARNING_THRESHOLD,
-        "drift_score": max_score,
-        "severity": severity,
-        "feature_scores": feature_scores
+        "drift_detected": False,
+        "drift_score": 0.0,
+        "severity": "skipped",
+        "feature_scores": {},
+        "sampled": False,
+        "sample_weight": 0.0
     }
 
+def categorical_features() -> List[str]:
+    """Names of baseline features scored by category distribution"""
+    return baseline_scorer().categorical_features()
+
+def score_window(window) -> Dict[str, Any]:
+    """Detect drift (overall and per slice) and data quality from merged window counts against baseline"""
+    return baseline_scorer().score_window(window)
+
+def slicing_config() -> Dict[str, Any]:
+    """Slicing dimensions of the baseline, with their cardinality cap and minimum slice size"""
+    return baseline_scorer().slicing_config()
+
+def score_slices(window) -> Dict[str, Dict[str, Any]]:
+    """Detect drift per slice of every slicing dimension from merged window counts"""
+    return baseline_scorer().score_slices(window)
+
+def score_quality(window) -> Dict[str, Dict[str, Any]]:
+    """Data quality rates per feature from merged window counts"""
+    return baseline_scorer().score_quality(window)
+
+def record_quality_metrics(model_version: str, quality: Dict[str, Dict[str, Any]]):
+    """Update data quality gauges"""
+    for feature, result in quality.items():
+        for check, rate in result["rates"].items():
+            DATA_QUALITY_GAUGE.labels(model_version, feature, check).set(rate)
+
+def record_slice_metrics(model_version: str, slices: Dict[str, Dict[str, Any]]):
+    """Update per-slice drift gauges"""
+    for dimension, results in slices.items():
+        for label, result in results.items():
+            for feature, score in result["feature_scores"].items():
+                SLICE_DRIFT_SCORE_GAUGE.labels(model_version, dimension, label, feature).set(score)
+
+# Mergeable window counts of this pod; in aggregator mode the pod also merges its peers' windows
+drift_window = DriftWindow(get_baseline_cache, categorical_features, slicing_config)
+fleet_aggregator = SnapshotAggregator(drift_window) if AGGREGATOR_MODE else None
+
+# Only a (load-adaptive) sample of observations gets full drift processing; the queue signal
+# counts requests waiting to be scored and scored rows waiting for drift monitoring
+ingestion_sampler = IngestionSampler(load=LoadMonitor(
+    queue_depth=lambda: inference_service.batcher.queue_depth + inference_service.batcher.after_backlog))
+
+# Online inference shares the process and feeds every batch into drift monitoring once its
+# callers have their results; scored predictions wait in the performance monitor for their
+# delayed labels
+performance_monitor = PerformanceMonitor()
+inference_service = InferenceService(on_batch=monitor_batch,
+                                     on_predictions=performance_monitor.record_predictions)
+app.include_router(build_inference_router(inference_service))
+app.include_router(build_feedback_router(performance_monitor))
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """Count rejected inference features as type violations, then respond as FastAPI does"""
+    if request.url.path == "/model/predict":
+        record_type_violations(inference_service.model_version, exc.errors())
+    return await request_validation_exception_handler(request, exc)
+
+# Opt-in profiling and event loop lag (the admin endpoint 404s unless enabled)
+event_loop_lag_monitor = EventLoopLagMonitor()
+app.include_router(build_admin_router(SamplingProfiler()))
+app.include_router(build_window_router(drift_window, fleet_aggregator, score_window))
+
+def warm_up_drift():
+    """Score one representative observation so baseline caches are built before traffic"""
+    sample = {}
+    for feature_name, baseline_feature in baseline_data.get("features", {}).items():
+        if "mean" in baseline_feature:
+            sample[feature_name] = baseline_feature["mean"]
+        elif baseline_feature.get("values"):
+            sample[feature_name] = baseline_feature["values"][0]
+        elif baseline_feature.get("distribution"):
+            sample[feature_name] = next(iter(baseline_feature["distribution"]))
+    detect_drift(sample)
+    detect_drift_batch([sample])
+
+async def warm_start():
+    """Load baselines and the model off the event loop, then mark the service ready; raises once retries run out"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(WARM_START_RETRIES + 1):
+        try:
+            await loop.run_in_executor(None, load_baseline_data)
+            await loop.run_in_executor(None, warm_up_drift)
+            await inference_service.start()
+            service_state["ready"] = True
+            logger.info("Service warm and ready")
+            return
+        except Exception as e:
+            logger.error(f"Error during warm start (attempt {attempt + 1} of {WARM_START_RETRIES + 1}): {str(e)}")
+            if attempt == WARM_START_RETRIES:
+                raise
+            await asyncio.sleep(WARM_START_RETRY_SECONDS * 2 ** attempt)
+
+def exit_on_warm_start_failure(task: asyncio.Task):
+    """Stop the server when background warm start gives up, so the orchestrator restarts the pod"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.critical("Warm start failed, shutting down instead of staying unready")
+        os.kill(os.getpid(), signal.SIGTERM)
+
 @app.on_event("startup")
 async def startup_event():
-    """Load baseline data on startup"""
-    load_baseline_data()
+    """Load baseline data and the inference model on startup"""
+    service_state["ready"] = False
+    if INSTRUMENTATION_ENABLED:
+        event_loop_lag_monitor.start()
+    ingestion_sampler.start(process_observations)
+    if fleet_aggregator is not None:
+        service_state["aggregator_task"] = asyncio.get_running_loop().create_task(fleet_aggregator.run(score_window))
+    if FAST_STARTUP:
+        # Keep a reference so the background task is not garbage collected
+        service_state["warm_start_task"] = asyncio.get_running_loop().create_task(warm_start())
+        service_state["warm_start_task"].add_done_callback(exit_on_warm_start_failure)
+    else:
+        # A failed startup stops the server
+        await warm_start()
 
-@app.post("/monitor/predict", response_model=DriftResponse)
-async def monitor_prediction(request: PredictionRequest):
-    """Monitor prediction data for drift"""
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the inference batcher, sampling, the event loop lag monitor and fleet aggregation"""
+    await inference_service.stop()
+    await ingestion_sampler.stop(process_observations)
+    await event_loop_lag_monitor.stop()
+    if fleet_aggregator is not None:
+        service_state.pop("aggregator_task").cancel()
+        await fleet_aggregator.close()
+
+@app.post("/monitor/predict", response_model=DriftResponse, openapi_extra=openapi_body(PredictionRequest))
+async def monitor_prediction(http_request: Request):
+    """Monitor prediction data for drift (JSON or MessagePack)"""
+    with stage_timer("parse"):
+        try:
+            request = await prediction_decoder.decode(http_request)
+        except HTTPException as e:
+            body = await prediction_decoder.decode_untyped(http_request)
+            if isinstance(body, dict) and isinstance(body.get("model_version"), str):
+                record_type_violations(body["model_version"], e.detail)
+            raise
     try:
-        # Increment prediction counter
-        PREDICTION_COUNTER.labels(request.model_version).inc()
-        
         # Extract features
-        features = request.features.dict()
-        
-        # Detect drift
-        drift_result = detect_drift(features)
+        features = msgspec.structs.asdict(request.features)
         
-        # Update metrics
-        for feature, score in drift_result["feature_scores"].items():
-            DRIFT_SCORE_GAUGE.labels(request.model_version, feature).set(score)
+        # Shed load: skipped (or reservoir-deferred) observations are only counted
+        weight = ingestion_sampler.sample(request.model_version, features)
+        if not weight:
+            PREDICTION_COUNTER.labels(request.model_version).inc()
+            return encode_response({**skipped_result(), "timestamp": datetime.now()}, http_request)
         
-        # Record alert if drift detected
-        if drift_result["drift_detected"]:
-            DRIFT_ALERT_COUNTER.labels(request.model_version, drift_result["severity"]).inc()
+        # Detect drift
+        with stage_timer("detect_drift"):
+            drift_result = detect_drift(features)
         
-        # Prepare response
-        response = {
-            **drift_result,
-            "timestamp": datetime.now().isoformat()
-        }
+        # Update prediction counter, drift gauges and alerts
+        with stage_timer("metrics"):
+            record_drift_metrics(request.model_version, drift_result, alert_weight=weight)
+        with stage_timer("window"):
+            drift_window.record(request.model_version, [features], weights=[weight])
         
-        return response
+        # Encode directly; returning a Response skips response_model re-validation
+        with stage_timer("serialize"):
+            return encode_response({**drift_result, "sampled": True, "sample_weight": weight,
+                                    "timestamp": datetime.now()}, http_request)
     except Exception as e:
         logger.error(f"Error processing prediction request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/monitor/slices")
+async def slice_drift():
+    """Per-slice drift over this pod's window"""
+    try:
+        models = {}
+        for model_version, window in drift_window.merged().items():
+            models[model_version] = score_slices(window)
+            record_slice_metrics(model_version, models[model_version])
+        return {"dimensions": slicing_config()["dimensions"], "models": models,
+                "timestamp": datetime.now().isoformat()}
+    except Exception as e:
+        logger.error(f"Error scoring slices: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/monitor/quality")
+async def data_quality():
+    """Data quality rates over this pod's window"""
+    try:
+        models = {}
+        for model_version, window in drift_window.merged().items():
+            models[model_version] = score_quality(window)
+            record_quality_metrics(model_version, models[model_version])
+        return {"models": models, "timestamp": datetime.now().isoformat()}
+    except Exception as e:
+        logger.error(f"Error scoring data quality: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/monitor/health")
 async def health_check():
     """Health check endpoint"""
@@ -263,9 +542,31 @@ async def health_check():
             content={"status": "unhealthy", "error": str(e)}
         )
 
+@app.get("/monitor/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/monitor/ready")
+async def readiness_check():
+    """Readiness probe: baselines loaded and caches warm"""
+    if not service_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {
+        "status": "ready",
+        "baseline_data_loaded": bool(baseline_data.get("features")),
+        "model_loaded": inference_service.ready
+    }
+
 @app.get("/monitor/metrics")
 async def metrics():
     """Prometheus metrics endpoint"""
+    # Data quality gauges are derived from the window, so refresh them on every scrape
+    try:
+        for model_version, window in drift_window.merged().items():
+            record_quality_metrics(model_version, score_quality(window))
+    except Exception as e:
+        logger.error(f"Error refreshing data quality metrics: {str(e)}")
     return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 # Add Response import for metrics endpoint
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Drift and data quality scoring of merged window counts against a baseline.
+
+Kept free of the service (FastAPI app, metrics, inference) so offline tools
+such as ``replay.py`` can score windows exactly as the service does while
+importing only this module and ``window_state``.
+"""
+import os
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from baseline_compiler import build_cache, build_slice_cache
+from window_state import QUALITY_NULL, QUALITY_OUT_OF_RANGE, QUALITY_ROWS, QUALITY_TYPE_VIOLATION
+
+logger = logging.getLogger('drift_detector.scoring')
+
+# Drift thresholds
+WARNING_THRESHOLD = float(os.environ.get('DRIFT_WARNING_THRESHOLD', '0.2'))
+CRITICAL_THRESHOLD = float(os.environ.get('DRIFT_CRITICAL_THRESHOLD', '0.5'))
+
+# Segment slicing defaults, overridable per baseline under "slices"
+SLICE_MAX_VALUES = int(os.environ.get('DRIFT_SLICE_MAX_VALUES', '20'))
+SLICE_MIN_OBSERVATIONS = float(os.environ.get('DRIFT_SLICE_MIN_OBSERVATIONS', '30'))
+
+
+def calculate_psi_counts(expected_percents, actual_counts, total) -> float:
+    """Calculate PSI from observed counts per baseline bin (total includes out-of-range values)"""
+    if total <= 0:
+        return 0.0
+    actual_percents = np.asarray(actual_counts) / total
+    actual_percents = np.where(actual_percents == 0, 0.0001, actual_percents)
+    return float(np.sum((actual_percents - expected_percents) * np.log(actual_percents / expected_percents)))
+
+
+def calculate_psi_matrix(expected_percents, actual_counts, totals) -> np.ndarray:
+    """PSI of every row of a (slices x bins) count array in one vectorized pass"""
+    totals = np.asarray(totals, dtype=float)
+    actual_percents = actual_counts / np.where(totals > 0, totals, 1.0)[:, None]
+    actual_percents = np.where(actual_percents == 0, 0.0001, actual_percents)
+    psi = np.sum((actual_percents - expected_percents) * np.log(actual_percents / expected_percents), axis=1)
+    return np.where(totals > 0, psi, 0.0)
+
+
+def calculate_chi_square(expected_counts, actual_counts) -> float:
+    """Calculate Chi-square statistic for categorical features"""
+    if not expected_counts or not actual_counts:
+        return 0.0
+
+    try:
+        # Get all unique categories
+        all_categories = set(expected_counts.keys()) | set(actual_counts.keys())
+
+        # Calculate chi-square statistic
+        chi_square = 0
+        total_expected = sum(expected_counts.values())
+        total_actual = sum(actual_counts.values())
+
+        for category in all_categories:
+            e_count = expected_counts.get(category, 0)
+            a_count = actual_counts.get(category, 0)
+
+            # Convert to proportions
+            e_prop = e_count / total_expected if total_expected > 0 else 0
+            a_prop = a_count / total_actual if total_actual > 0 else 0
+
+            # Skip if both are zero
+            if e_prop == 0 and a_prop == 0:
+                continue
+
+            # Use small epsilon to avoid division by zero
+            e_prop = max(e_prop, 0.0001)
+
+            # Add to chi-square
+            chi_square += ((a_prop - e_prop) ** 2) / e_prop
+
+        return float(chi_square)
+    except Exception as e:
+        logger.error(f"Error calculating chi-square: {str(e)}")
+        return 0.0
+
+
+def summarize_drift(feature_scores: Dict[str, float]) -> Dict[str, Any]:
+    """Derive overall drift score and severity from per-feature scores"""
+    max_score = max(feature_scores.values(), default=0.0)
+
+    # Determine severity
+    severity = "none"
+    if max_score >= CRITICAL_THRESHOLD:
+        severity = "critical"
+    elif max_score >= WARNING_THRESHOLD:
+        severity = "warning"
+
+    return {
+        "drift_detected": max_score >= WARNING_THRESHOLD,
+        "drift_score": max_score,
+        "severity": severity,
+        "feature_scores": feature_scores
+    }
+
+
+class BaselineScorer:
+    """Scores merged window counts against one baseline (its PSI bins are built on first use)"""
+
+    def __init__(self, baseline: Dict[str, Any], cache: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.baseline = baseline
+        self._cache = cache
+        self._slice_cache = None
+
+    def cache(self) -> Dict[str, Dict[str, Any]]:
+        """PSI bins per numerical baseline feature"""
+        if self._cache is None:
+            self._cache = build_cache(self.baseline)
+        return self._cache
+
+    def slice_cache(self) -> Dict[str, Dict[str, Dict[str, np.ndarray]]]:
+        """Per-slice baseline proportions"""
+        if self._slice_cache is None:
+            self._slice_cache = build_slice_cache(self.baseline, self.cache())
+        return self._slice_cache
+
+    def categorical_features(self) -> List[str]:
+        """Names of baseline features scored by category distribution"""
+        return [name for name, feature in self.baseline.get("features", {}).items() if "distribution" in feature]
+
+    def slicing_config(self) -> Dict[str, Any]:
+        """Slicing dimensions of the baseline, with their cardinality cap and minimum slice size"""
+        slices = self.baseline.get("slices", {})
+        return {
+            "dimensions": list(slices.get("dimensions", [])),
+            "max_values": int(slices.get("max_values", SLICE_MAX_VALUES)),
+            "min_observations": float(slices.get("min_observations", SLICE_MIN_OBSERVATIONS))
+        }
+
+    def score_window(self, window) -> Dict[str, Any]:
+        """Detect drift (overall and per slice) and data quality from merged window counts"""
+        cache = self.cache()
+        feature_scores = {}
+        for feature_name, counts in window.counts.items():
+            if feature_name in cache:
+                feature_scores[feature_name] = calculate_psi_counts(
+                    cache[feature_name]["expected_percents"], counts, window.moments[feature_name][0]
+                )
+        for feature_name, categories in window.categories.items():
+            baseline_feature = self.baseline.get("features", {}).get(feature_name, {})
+            if "distribution" in baseline_feature:
+                feature_scores[feature_name] = calculate_chi_square(baseline_feature["distribution"], categories)
+        return {**summarize_drift(feature_scores), "slices": self.score_slices(window),
+                "quality": self.score_quality(window)}
+
+    def score_slices(self, window) -> Dict[str, Dict[str, Any]]:
+        """Detect drift per slice of every slicing dimension from merged window counts"""
+        cache = self.cache()
+        slice_cache = self.slice_cache()
+        min_observations = self.slicing_config()["min_observations"]
+        result = {}
+        for dimension, slices in window.slices.items():
+            labels = slices.labels
+            overrides = slice_cache.get(dimension, {})
+            feature_scores = [{} for _ in labels]
+            observations = np.zeros(len(labels))
+            for feature_name, entry in cache.items():
+                if feature_name not in slices.counts:
+                    continue
+                counts, totals = slices.view(feature_name)
+                expected = np.tile(entry["expected_percents"], (len(labels), 1))
+                for row, label in enumerate(labels):
+                    if feature_name in overrides.get(label, {}):
+                        expected[row] = overrides[label][feature_name]
+                psi = calculate_psi_matrix(expected, counts, totals)
+                for row in np.flatnonzero(totals >= min_observations):
+                    feature_scores[row][feature_name] = float(psi[row])
+                observations = np.maximum(observations, totals)
+            result[dimension] = {
+                label: {**summarize_drift(feature_scores[row]), "observations": int(round(observations[row]))}
+                for row, label in enumerate(labels) if feature_scores[row]
+            }
+        return result
+
+    def score_quality(self, window) -> Dict[str, Dict[str, Any]]:
+        """Data quality rates per feature from merged window counts"""
+        features = self.baseline.get("features", {})
+        result = {}
+        for feature_name, quality in window.quality.items():
+            rows = quality[QUALITY_ROWS]
+            if rows <= 0:
+                continue
+            # Unseen categories come straight from the category counts (the overflow bucket included)
+            distribution = features.get(feature_name, {}).get("distribution", {})
+            unseen = sum(count for value, count in window.categories.get(feature_name, {}).items()
+                         if value not in distribution) if distribution else 0.0
+            result[feature_name] = {
+                "rows": int(round(rows)),
+                "rates": {
+                    "null": quality[QUALITY_NULL] / rows,
+                    "out_of_range": quality[QUALITY_OUT_OF_RANGE] / rows,
+                    "unseen_category": unseen / rows,
+                    "type_violation": quality[QUALITY_TYPE_VIOLATION] / rows
+                }
+            }
+        return result
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Feature encoding for the churn model, matching the one-hot layout of
+broken_files/generate_test_data.py (``pd.get_dummies`` column order)
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Numerical columns, in test_data.csv order
+NUMERICAL_FEATURES = ['age', 'tenure_months', 'monthly_charges', 'total_charges']
+
+# Categorical columns and their levels; pd.get_dummies emits levels sorted
+CATEGORICAL_FEATURES = {
+    'contract_length': ['month-to-month', 'one_year', 'two_year'],
+    'payment_method': ['bank_transfer', 'credit_card', 'electronic_check', 'mailed_check'],
+    'internet_service': ['dsl', 'fiber_optic', 'no'],
+    'tech_support': ['no', 'yes'],
+    'online_security': ['no', 'yes'],
+    'paperless_billing': ['no', 'yes'],
+}
+
+FEATURE_COLUMNS = NUMERICAL_FEATURES + [
+    f"{feature}_{level}"
+    for feature, levels in CATEGORICAL_FEATURES.items()
+    for level in levels
+]
+N_FEATURES = len(FEATURE_COLUMNS)
+
+# Column index of every (feature, level) pair, for direct one-hot writes
+_CATEGORY_INDEX = {
+    feature: {level: FEATURE_COLUMNS.index(f"{feature}_{level}") for level in levels}
+    for feature, levels in CATEGORICAL_FEATURES.items()
+}
+
+
+def encode_rows(rows: List[Dict[str, Any]], out: Optional[np.ndarray] = None,
+                dtype=np.float64) -> np.ndarray:
+    """
+    Encode raw feature dicts into the model's column layout.
+
+    Missing numerical values encode as 0 and unseen or missing categories
+    as an all-zero one-hot group, as ``pd.get_dummies`` would.
+    """
+    n_rows = len(rows)
+    if out is None:
+        out = np.zeros((n_rows, N_FEATURES), dtype=dtype)
+    else:
+        out = out[:n_rows]
+        out.fill(0)
+
+    for j, feature in enumerate(NUMERICAL_FEATURES):
+        out[:, j] = [row.get(feature) or 0 for row in rows]
+
+    for feature, index in _CATEGORY_INDEX.items():
+        for i, row in enumerate(rows):
+            column = index.get(row.get(feature))
+            if column is not None:
+                out[i, column] = 1
+    return out
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Online churn model inference with dynamic micro-batching
+"""
+import os
+import uuid
+import pickle
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+
+from feature_encoding import encode_rows
+from instrumentation import stage_timer
+from linear_scorer import compile_model, load_compiled_model, model_hash, sample_rows, save_compiled_model
+
+logger = logging.getLogger('drift_detector.inference')
+
+# Model and batching configuration
+MODEL_PATH = os.environ.get('MODEL_PATH', 'model.pkl')
+# Scorer precompiled at build time (baseline_compiler.py --model) or written on first load of the
+# pickle; loading it avoids importing sklearn. It is ignored if model.pkl's hash no longer matches
+MODEL_COMPILED_PATH = os.environ.get('MODEL_COMPILED_PATH', 'model_compiled.npz')
+MODEL_VERSION = os.environ.get('MODEL_VERSION', 'unknown')
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', '64'))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', '2'))
+INFERENCE_COMPILED = os.environ.get('INFERENCE_COMPILED', 'true').lower() == 'true'
+INFERENCE_DTYPE = os.environ.get('INFERENCE_DTYPE', 'float64')
+# Scored batches waiting for drift monitoring; beyond this, batches skip monitoring
+INFERENCE_MONITOR_MAX_PENDING = int(os.environ.get('INFERENCE_MONITOR_MAX_PENDING', '64'))
+
+# Data models
+class ChurnFeatures(BaseModel):
+    """Raw (un-encoded) churn model features"""
+    age: Optional[int] = None
+    tenure_months: Optional[int] = None
+    monthly_charges: Optional[float] = None
+    total_charges: Optional[float] = None
+    contract_length: Optional[str] = None
+    payment_method: Optional[str] = None
+    internet_service: Optional[str] = None
+    tech_support: Optional[str] = None
+    online_security: Optional[str] = None
+    paperless_billing: Optional[str] = None
+
+class InferenceRequest(BaseModel):
+    """Model for inference request data"""
+    features: ChurnFeatures
+    prediction_id: Optional[str] = Field(None, description="Caller-supplied prediction identifier (generated if omitted)")
+
+class InferenceResponse(BaseModel):
+    """Model for inference response"""
+    prediction_id: str
+    churn_probability: float
+    prediction: int
+    model_version: str
+    batch_size: int
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent submissions into batches.
+
+    A batch is flushed when it reaches ``max_batch_size`` or ``max_wait_ms``
+    after its first item arrived, whichever comes first. ``process_batch``
+    receives the list of items and must return one result per item; it runs
+    in the default executor so scoring never blocks the event loop.
+
+    ``after_batch`` (optional) receives the same items once their callers
+    have their results. It runs on one dedicated thread, so it adds nothing
+    to request latency; at most ``max_pending_after`` batches wait for it
+    and later batches skip it until it catches up.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                 after_batch: Optional[Callable[[List[Any]], Any]] = None,
+                 max_pending_after=INFERENCE_MONITOR_MAX_PENDING):
+        self._process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._after_batch = after_batch
+        self.max_pending_after = max(1, int(max_pending_after))
+        self._after_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference-monitor')
+        self._after_pending = {}
+        self.after_skipped = 0
+        self._queue = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def after_backlog(self):
+        """Items scored but still waiting for after_batch"""
+        return sum(self._after_pending.values())
+
+    def start(self):
+        """Start the batching loop on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop, fail anything still queued and finish pending after_batch calls"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference batcher stopped"))
+        await asyncio.gather(*self._after_pending, return_exceptions=True)
+
+    async def submit(self, item):
+        """Queue one item and wait for its result"""
+        if not self.running:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self):
+        """Wait for the first item, then gather more until full or the deadline passes"""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                # Score off the event loop; batches still run one at a time
+                results = await asyncio.get_running_loop().run_in_executor(None, self._process_batch, items)
+            except Exception as e:
+                logger.error(f"Error processing inference batch: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._schedule_after(items)
+
+    def _schedule_after(self, items):
+        """Hand a scored batch to after_batch without waiting for it"""
+        if self._after_batch is None:
+            return
+        if len(self._after_pending) >= self.max_pending_after:
+            self.after_skipped += 1
+            logger.warning(f"Skipping after_batch for {len(items)} items: "
+                           f"{len(self._after_pending)} batches already pending")
+            return
+        pending = asyncio.get_running_loop().run_in_executor(self._after_executor, self._after_batch, items)
+        self._after_pending[pending] = len(items)
+        pending.add_done_callback(lambda done: self._after_pending.pop(done, None))
+
+
+class InferenceService:
+    """Loads the deployed model and scores micro-batches of requests"""
+
+    def __init__(self, model_path=MODEL_PATH, model_version=MODEL_VERSION,
+                 compiled_model_path=MODEL_COMPILED_PATH,
+                 on_batch: Optional[Callable[[str, List[Dict[str, Any]]], Any]] = None,
+                 on_predictions: Optional[Callable[[str, List[str], Any], Any]] = None,
+                 max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait_ms=INFERENCE_MAX_WAIT_MS):
+        self.model_path = model_path
+        self.compiled_model_path = compiled_model_path
+        self.model_version = model_version
+        self.on_batch = on_batch
+        self.on_predictions = on_predictions
+        self.model = None
+        self.scorer = None
+        self.batcher = MicroBatcher(self.score_batch, max_batch_size, max_wait_ms, after_batch=self.monitor_batch)
+
+    @property
+    def ready(self):
+        return self.model is not None or self.scorer is not None
+
+    def load_model(self):
+        """Load the precompiled scorer or the pickled model; returns False if neither is available"""
+        self.model = None
+        self.scorer = None
+        try:
+            # A compiled scorer without its pickle alongside is trusted as deployed
+            source_hash = model_hash(self.model_path) if os.path.exists(self.model_path) else None
+            if INFERENCE_COMPILED and self.compiled_model_path and os.path.exists(self.compiled_model_path):
+                try:
+                    self.scorer = load_compiled_model(self.compiled_model_path, dtype=INFERENCE_DTYPE,
+                                                      max_batch_size=self.batcher.max_batch_size,
+                                                      expected_hash=source_hash)
+                    logger.info(f"Loaded compiled model {self.model_version} from {self.compiled_model_path}")
+                    return True
+                except ValueError as e:
+                    logger.warning(f"Ignoring stale compiled model: {str(e)}")
+            if source_hash is None:
+                logger.warning(f"Model file not found at {self.model_path}, inference disabled")
+                return False
+            with open(self.model_path, 'rb') as f:
+                self.model = pickle.load(f)
+            logger.info(f"Loaded model {self.model_version} from {self.model_path}")
+            self.scorer = self._compile()
+            if self.scorer is not None and self.compiled_model_path:
+                self._save_compiled(source_hash)
+            return True
+        except Exception as e:
+            logger.error(f"Error loading model: {str(e)}")
+            self.model = None
+            self.scorer = None
+            return False
+
+    def _save_compiled(self, source_hash):
+        """Write the compiled scorer at deploy time so later starts skip unpickling and sklearn"""
+        try:
+            save_compiled_model(self.compiled_model_path, self.scorer, source_hash)
+            logger.info(f"Wrote compiled model {self.model_version} to {self.compiled_model_path}")
+        except OSError as e:
+            logger.warning(f"Could not write compiled model to {self.compiled_model_path}: {str(e)}")
+
+    def _compile(self):
+        """Compile the model to the NumPy scoring path, falling back to sklearn"""
+        if not INFERENCE_COMPILED:
+            return None
+        try:
+            return compile_model(self.model, dtype=INFERENCE_DTYPE,
+                                 max_batch_size=self.batcher.max_batch_size)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Using sklearn scoring path: {str(e)}")
+            return None
+
+    def score_batch(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Score a batch with one vectorized call"""
+        features = [row['features'] for row in rows]
+        with stage_timer("inference_score"):
+            if self.scorer is not None:
+                probabilities = self.scorer.score(features)
+            else:
+                probabilities = self.model.predict_proba(encode_rows(features))[:, 1]
+
+        # Keep predictions joinable to delayed ground-truth labels
+        if self.on_predictions is not None:
+            try:
+                self.on_predictions(self.model_version,
+                                    [row['prediction_id'] for row in rows], probabilities)
+            except Exception as e:
+                logger.error(f"Error recording predictions for label feedback: {str(e)}")
+
+        batch_size = len(rows)
+        return [
+            {
+                'prediction_id': row.get('prediction_id'),
+                'churn_probability': float(probability),
+                'prediction': int(probability >= 0.5),
+                'model_version': self.model_version,
+                'batch_size': batch_size
+            }
+            for row, probability in zip(rows, probabilities)
+        ]
+
+    def monitor_batch(self, rows: List[Dict[str, Any]]):
+        """Feed a scored batch into drift monitoring; runs after its callers have their results"""
+        if self.on_batch is None:
+            return
+        try:
+            self.on_batch(self.model_version, [row['features'] for row in rows])
+        except Exception as e:
+            logger.error(f"Error monitoring inference batch: {str(e)}")
+
+    async def predict(self, features: Dict[str, Any], prediction_id=None) -> Dict[str, Any]:
+        """Score one request through the micro-batcher"""
+        if prediction_id is None:
+            prediction_id = uuid.uuid4().hex
+        return await self.batcher.submit({'features': features, 'prediction_id': prediction_id})
+
+    def warm_up(self):
+        """Score one synthetic batch so the first real request takes the hot path"""
+        if self.ready:
+            rows = [{'features': features, 'prediction_id': None} for features in sample_rows(2)]
+            on_predictions, self.on_predictions = self.on_predictions, None
+            try:
+                self.score_batch(rows)
+            finally:
+                self.on_predictions = on_predictions
+
+    async def start(self):
+        """Load and warm the model off the event loop, then start batching"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.load_model)
+        await loop.run_in_executor(None, self.warm_up)
+        self.batcher.start()
+
+    async def stop(self):
+        await self.batcher.stop()
+
+
+def build_inference_router(service: InferenceService) -> APIRouter:
+    """Create the inference endpoints bound to a service instance"""
+    router = APIRouter()
+
+    @router.post("/model/predict", response_model=InferenceResponse)
+    async def predict(request: InferenceRequest):
+        """Score one customer with the deployed churn model"""
+        if not service.ready:
+            raise HTTPException(status_code=503, detail="Model not loaded")
+        try:
+            return await service.predict(request.features.dict(), request.prediction_id)
+        except Exception as e:
+            logger.error(f"Error processing inference request: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return router
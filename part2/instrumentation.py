@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Opt-in hot-path instrumentation for the drift detector service.
+
+Enabled with ``INSTRUMENTATION_ENABLED=true``. When disabled, ``stage_timer``
+returns a shared no-op context manager, so instrumented code pays only a
+function call.
+"""
+import os
+import sys
+import hmac
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter as StackCounter
+from contextlib import nullcontext
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from prometheus_client import Gauge, Histogram
+
+logger = logging.getLogger('drift_detector.instrumentation')
+
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'false').lower() == 'true'
+EVENT_LOOP_LAG_INTERVAL = float(os.environ.get('EVENT_LOOP_LAG_INTERVAL', '0.5'))
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '60'))
+# Admin endpoints need this key in X-Admin-Key; without one they only answer loopback clients
+ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', '')
+LOOPBACK_HOSTS = {'127.0.0.1', '::1', 'localhost'}
+
+# Stage latencies are microseconds to low milliseconds, so the default buckets are too coarse
+STAGE_LATENCY_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0
+)
+
+# Prometheus metrics
+STAGE_LATENCY_HISTOGRAM = Histogram('drift_stage_latency_seconds', 'Latency of drift detector pipeline stages',
+                                    ['stage'], buckets=STAGE_LATENCY_BUCKETS)
+EVENT_LOOP_LAG_GAUGE = Gauge('drift_event_loop_lag_seconds', 'Delay of a scheduled event loop wakeup past its due time')
+
+_NULL_TIMER = nullcontext()
+_stage_observers: Dict[str, object] = {}
+
+
+class _StageTimer:
+    """Times one stage with the monotonic perf_counter clock"""
+    __slots__ = ('_observe', '_start')
+
+    def __init__(self, observe):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._observe(time.perf_counter() - self._start)
+        return False
+
+
+def _stage_observer(stage: str):
+    observe = _stage_observers.get(stage)
+    if observe is None:
+        observe = _stage_observers[stage] = STAGE_LATENCY_HISTOGRAM.labels(stage).observe
+    return observe
+
+
+def stage_timer(stage: str):
+    """Context manager recording the wrapped block into the stage latency histogram"""
+    if not INSTRUMENTATION_ENABLED:
+        return _NULL_TIMER
+    return _StageTimer(_stage_observer(stage))
+
+
+async def time_requests(request: Request, call_next):
+    """HTTP middleware timing whole requests (parsing and validation included) per route template"""
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        if INSTRUMENTATION_ENABLED:
+            # Route templates keep the label set bounded; raw paths (IDs, scanners) would not
+            route = request.scope.get("route")
+            _stage_observer(f"request:{getattr(route, 'path', 'unmatched')}")(time.perf_counter() - start)
+
+
+def require_admin(request: Request, key: Optional[str]):
+    """Reject admin calls without the admin key, or from non-loopback clients when no key is set"""
+    if ADMIN_API_KEY:
+        if key is None or not hmac.compare_digest(key.encode(), ADMIN_API_KEY.encode()):
+            raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Key")
+    elif request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Admin endpoints are restricted to localhost without ADMIN_API_KEY")
+
+
+class EventLoopLagMonitor:
+    """Periodically measures how late the event loop runs a scheduled wakeup"""
+
+    def __init__(self, interval=EVENT_LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG_GAUGE.set(max(0.0, loop.time() - due))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over all threads.
+
+    Samples ``sys._current_frames()`` at a fixed interval from its own thread
+    and aggregates stacks in collapsed format (``root;...;leaf count``), as
+    consumed by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self):
+        return self._lock.locked()
+
+    def profile(self, seconds: float, interval: float) -> StackCounter:
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            own_ident = threading.get_ident()
+            stacks = StackCounter()
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    labels.append(thread_names.get(ident, f"thread-{ident}"))
+                    stacks[';'.join(reversed(labels))] += 1
+                time.sleep(interval)
+            return stacks
+        finally:
+            self._lock.release()
+
+
+def collapse(stacks: StackCounter) -> str:
+    """Render sampled stacks as collapsed-stack text"""
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def build_admin_router(profiler: SamplingProfiler) -> APIRouter:
+    """Create the profiling admin endpoint (404 unless instrumentation is enabled)"""
+    router = APIRouter()
+
+    @router.post("/admin/profile")
+    async def profile(request: Request, seconds: float = 10.0, interval_ms: float = 5.0,
+                      x_admin_key: Optional[str] = Header(None)):
+        """Sample all threads for N seconds and return a collapsed-stack flamegraph file"""
+        if not INSTRUMENTATION_ENABLED:
+            raise HTTPException(status_code=404, detail="Instrumentation is disabled")
+        require_admin(request, x_admin_key)
+        if not 0 < seconds <= PROFILE_MAX_SECONDS or interval_ms <= 0:
+            raise HTTPException(status_code=400,
+                                detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS}] and interval_ms > 0")
+        if profiler.busy:
+            raise HTTPException(status_code=409, detail="A profile is already running")
+
+        # Sample from a worker thread so the event loop keeps serving (and is sampled)
+        loop = asyncio.get_running_loop()
+        try:
+            stacks = await loop.run_in_executor(None, profiler.profile, seconds, interval_ms / 1000.0)
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        logger.info(f"Profiled {seconds}s: {sum(stacks.values())} samples, {len(stacks)} unique stacks")
+        return PlainTextResponse(
+            collapse(stacks),
+            headers={'Content-Disposition': 'attachment; filename="drift-detector.collapsed"'}
+        )
+
+    return router
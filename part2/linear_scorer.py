@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Compiled NumPy scoring path for binary linear models (LogisticRegression).
+
+sklearn's ``predict_proba`` validates and converts its input on every call,
+which dominates the cost for single rows and small batches. The compiled
+scorer pulls ``coef_``/``intercept_`` out once and fuses the one-hot
+encoding into the dot product: a categorical level contributes its weight
+directly instead of multiplying a one-hot column.
+"""
+import os
+import sys
+import math
+import time
+import pickle
+import hashlib
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+
+from feature_encoding import CATEGORICAL_FEATURES, FEATURE_COLUMNS, NUMERICAL_FEATURES, encode_rows
+
+logger = logging.getLogger('drift_detector.linear_scorer')
+
+DEFAULT_VERIFY_ROWS = 256
+
+
+def _sigmoid(z):
+    """Numerically safe logistic function for a Python float"""
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    ez = math.exp(z)
+    return ez / (1.0 + ez)
+
+
+class CompiledLinearModel:
+    """
+    Positive-class probability scorer for a binary linear model.
+
+    Not thread-safe: batch scoring reuses preallocated buffers, so share an
+    instance only from a single thread or event loop.
+    """
+
+    def __init__(self, coef, intercept, dtype=np.float64, max_batch_size=64):
+        coef = np.asarray(coef, dtype=np.float64).ravel()
+        if coef.shape[0] != len(FEATURE_COLUMNS):
+            raise ValueError(
+                f"Model has {coef.shape[0]} coefficients, expected {len(FEATURE_COLUMNS)}"
+            )
+        self.dtype = np.dtype(dtype)
+        self.coef = coef
+        self.intercept = float(intercept)
+
+        n_numerical = len(NUMERICAL_FEATURES)
+        self.numerical_coef = np.ascontiguousarray(coef[:n_numerical], dtype=self.dtype)
+        self._numerical_coef_list = [float(w) for w in coef[:n_numerical]]
+        self.category_weights = {
+            feature: {level: float(coef[FEATURE_COLUMNS.index(f"{feature}_{level}")]) for level in levels}
+            for feature, levels in CATEGORICAL_FEATURES.items()
+        }
+
+        self._allocate(max_batch_size)
+
+    @classmethod
+    def from_estimator(cls, model, dtype=np.float64, max_batch_size=64):
+        """Extract weights from a fitted binary sklearn linear classifier"""
+        coef = getattr(model, 'coef_', None)
+        intercept = getattr(model, 'intercept_', None)
+        if coef is None or intercept is None:
+            raise TypeError(f"{type(model).__name__} is not a fitted linear model")
+        if coef.shape[0] != 1 or len(getattr(model, 'classes_', [])) != 2:
+            raise TypeError("Only binary linear classifiers can be compiled")
+        return cls(coef[0], intercept[0], dtype=dtype, max_batch_size=max_batch_size)
+
+    def _allocate(self, max_batch_size):
+        self.max_batch_size = max_batch_size
+        self._numerical_buf = np.zeros((max_batch_size, len(NUMERICAL_FEATURES)), dtype=self.dtype)
+        self._logit_buf = np.zeros(max_batch_size, dtype=self.dtype)
+
+    def score_row(self, features: Dict[str, Any]) -> float:
+        """Positive-class probability for one row, in pure Python floats"""
+        z = self.intercept
+        for name, weight in zip(NUMERICAL_FEATURES, self._numerical_coef_list):
+            value = features.get(name)
+            if value:
+                z += weight * value
+        for name, weights in self.category_weights.items():
+            z += weights.get(features.get(name), 0.0)
+        return _sigmoid(z)
+
+    def score_batch(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        """Positive-class probabilities for a batch (a view into a reused buffer)"""
+        n_rows = len(rows)
+        if n_rows > self.max_batch_size:
+            self._allocate(max(n_rows, 2 * self.max_batch_size))
+
+        numerical = self._numerical_buf[:n_rows]
+        for j, name in enumerate(NUMERICAL_FEATURES):
+            numerical[:, j] = [row.get(name) or 0 for row in rows]
+
+        logits = self._logit_buf[:n_rows]
+        np.dot(numerical, self.numerical_coef, out=logits)
+        logits += [
+            self.intercept + sum(weights.get(row.get(name), 0.0)
+                                 for name, weights in self.category_weights.items())
+            for row in rows
+        ]
+
+        # In-place sigmoid: 1 / (1 + exp(-z))
+        with np.errstate(over='ignore'):
+            np.negative(logits, out=logits)
+            np.exp(logits, out=logits)
+            logits += 1.0
+            np.reciprocal(logits, out=logits)
+        return logits
+
+    def score(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        """Score rows, using the scalar path for a single row"""
+        if len(rows) == 1:
+            return np.array([self.score_row(rows[0])], dtype=self.dtype)
+        return self.score_batch(rows).copy()
+
+
+def verify_compiled_model(compiled: CompiledLinearModel, model, rows: List[Dict[str, Any]],
+                          atol=None) -> float:
+    """Check compiled scores against sklearn's predict_proba; returns the max abs error"""
+    if atol is None:
+        atol = 1e-4 if compiled.dtype == np.float32 else 1e-9
+    expected = model.predict_proba(encode_rows(rows))[:, 1]
+    actual = compiled.score_batch(rows)
+    single = np.array([compiled.score_row(row) for row in rows])
+    max_error = float(max(np.max(np.abs(actual - expected)), np.max(np.abs(single - expected))))
+    if max_error > atol:
+        raise ValueError(f"Compiled scorer deviates from sklearn by {max_error:.2e} (tolerance {atol:.0e})")
+    return max_error
+
+
+def sample_rows(n_rows=DEFAULT_VERIFY_ROWS, seed=0) -> List[Dict[str, Any]]:
+    """Random rows covering every categorical level, for verification and benchmarks"""
+    rng = np.random.RandomState(seed)
+    rows = []
+    for _ in range(n_rows):
+        row = {
+            'age': int(rng.randint(18, 80)),
+            'tenure_months': int(rng.randint(1, 120)),
+            'monthly_charges': float(rng.uniform(20, 120)),
+            'total_charges': float(rng.uniform(100, 8000)),
+        }
+        for name, levels in CATEGORICAL_FEATURES.items():
+            row[name] = levels[rng.randint(len(levels))]
+        rows.append(row)
+    return rows
+
+
+def compile_model(model, dtype=np.float64, max_batch_size=64, verify_rows=DEFAULT_VERIFY_ROWS):
+    """Compile and verify a fitted model; raises TypeError/ValueError if it cannot be used"""
+    compiled = CompiledLinearModel.from_estimator(model, dtype=dtype, max_batch_size=max_batch_size)
+    if verify_rows:
+        max_error = verify_compiled_model(compiled, model, sample_rows(verify_rows))
+        logger.info(f"Compiled {type(model).__name__} ({compiled.dtype}), max abs error {max_error:.2e}")
+    return compiled
+
+
+def model_hash(path) -> str:
+    """Content hash tying a compiled scorer to its source pickle"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_compiled_model(path, compiled: CompiledLinearModel, source_hash: str = ''):
+    """Persist a compiled scorer (atomically) so the service can load it without importing sklearn"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, coef=compiled.coef, intercept=np.array(compiled.intercept),
+                 columns=np.array(FEATURE_COLUMNS), source_hash=np.array(source_hash))
+    os.replace(tmp_path, path)
+
+
+def load_compiled_model(path, dtype=np.float64, max_batch_size=64, expected_hash=None) -> CompiledLinearModel:
+    """Load a scorer written by save_compiled_model; the feature layout (and source hash, if given) must match"""
+    with np.load(path, allow_pickle=False) as data:
+        if list(data['columns']) != FEATURE_COLUMNS:
+            raise ValueError(f"Compiled model at {path} was built for a different feature layout")
+        if expected_hash is not None and ('source_hash' not in data.files or str(data['source_hash']) != expected_hash):
+            raise ValueError(f"Compiled model at {path} was built from a different model pickle")
+        return CompiledLinearModel(data['coef'], float(data['intercept']),
+                                   dtype=dtype, max_batch_size=max_batch_size)
+
+
+def _time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark(model_path, repeat=2000):
+    """Compare per-call latency of sklearn and the compiled scorer"""
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    compiled = compile_model(model)
+    rows = sample_rows(64, seed=1)
+
+    for batch_size in (1, 8, 64):
+        batch = rows[:batch_size]
+        sk = _time_per_call(lambda: model.predict_proba(encode_rows(batch))[:, 1], repeat)
+        fast = _time_per_call(lambda: compiled.score(batch), repeat)
+        print(f"batch={batch_size:3d}  sklearn={sk * 1e6:9.1f}us  compiled={fast * 1e6:8.1f}us  "
+              f"speedup={sk / fast:6.1f}x")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else 'model.pkl')
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Online model performance monitoring with delayed ground-truth labels.
+
+Predictions are kept in a bounded, time-expiring join index until their
+label arrives (or they expire). Joined outcomes feed streaming confusion
+matrix and calibration counters per model version and time bucket (by label
+arrival, so late labels still land in the rolling window), from which rolling
+accuracy/precision/recall are exported.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import APIRouter, Request
+from pydantic import BaseModel, Field
+from prometheus_client import Counter, Gauge
+
+from codec import BodyDecoder, encode_response, openapi_body, wire_struct
+
+logger = logging.getLogger('drift_detector.performance')
+
+# Join index and counter configuration
+LABEL_JOIN_MAX_PENDING = int(os.environ.get('LABEL_JOIN_MAX_PENDING', '1000000'))
+LABEL_JOIN_TTL_SECONDS = float(os.environ.get('LABEL_JOIN_TTL_SECONDS', str(7 * 24 * 3600)))
+PERFORMANCE_BUCKET_SECONDS = int(os.environ.get('PERFORMANCE_BUCKET_SECONDS', '300'))
+PERFORMANCE_RETENTION_BUCKETS = int(os.environ.get('PERFORMANCE_RETENTION_BUCKETS', '288'))
+PERFORMANCE_ROLLING_BUCKETS = int(os.environ.get('PERFORMANCE_ROLLING_BUCKETS', '12'))
+CALIBRATION_BINS = 10
+DECISION_THRESHOLD = 0.5
+
+# Prometheus metrics
+LABELS_JOINED_COUNTER = Counter('model_labels_joined_total', 'Ground-truth labels joined to a prediction', ['model_version'])
+LABELS_UNMATCHED_COUNTER = Counter('model_labels_unmatched_total', 'Ground-truth labels with no pending prediction')
+PENDING_EXPIRED_COUNTER = Counter('model_pending_predictions_expired_total', 'Pending predictions dropped by TTL or capacity')
+PENDING_GAUGE = Gauge('model_pending_predictions', 'Predictions waiting for a ground-truth label')
+ONLINE_METRIC_GAUGE = Gauge('model_online_performance', 'Rolling online performance from delayed labels', ['model_version', 'metric'])
+
+# Confusion matrix cell order
+TP, FP, TN, FN = range(4)
+
+
+def prediction_key(prediction_id: str) -> int:
+    """64-bit key for a prediction ID, so the index never holds the ID strings"""
+    digest = hashlib.blake2b(prediction_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+class PendingPredictionIndex:
+    """
+    Bounded FIFO join index of predictions awaiting labels.
+
+    Entries live in fixed-size columnar ring buffers; a dict maps each
+    prediction key to its slot. Entries leave when joined, when older than
+    ``ttl_seconds``, or when ``capacity`` are pending (oldest first), so
+    memory is fixed by ``capacity`` regardless of label arrival rate.
+
+    Joined entries leave dead slots behind until the tail passes them, so
+    the ring holds twice ``capacity`` slots; when it fills, the live entries
+    (at most ``capacity``) are compacted to its start, which frees at least
+    ``capacity`` slots and keeps compaction amortized O(1) per add.
+    """
+
+    def __init__(self, capacity=LABEL_JOIN_MAX_PENDING, ttl_seconds=LABEL_JOIN_TTL_SECONDS):
+        self.capacity = max(1, int(capacity))
+        self.ttl_seconds = ttl_seconds
+        self._ring = 2 * self.capacity
+        self._keys = np.zeros(self._ring, dtype=np.int64)
+        self._timestamps = np.zeros(self._ring, dtype=np.float64)
+        self._probabilities = np.zeros(self._ring, dtype=np.float32)
+        self._versions = np.zeros(self._ring, dtype=np.int32)
+        self._live = np.zeros(self._ring, dtype=bool)
+        self._slots: Dict[int, int] = {}
+        self._version_names: List[str] = []
+        self._version_ids: Dict[str, int] = {}
+        self._head = 0
+        self._tail = 0
+        self._size = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _version_id(self, model_version):
+        version_id = self._version_ids.get(model_version)
+        if version_id is None:
+            version_id = len(self._version_names)
+            self._version_names.append(model_version)
+            self._version_ids[model_version] = version_id
+        return version_id
+
+    def _drop_tail(self):
+        slot = self._tail
+        if self._live[slot]:
+            self._live[slot] = False
+            del self._slots[int(self._keys[slot])]
+            self.dropped += 1
+        self._tail = (slot + 1) % self._ring
+        self._size -= 1
+
+    def _compact(self):
+        """Move live entries, in arrival order, to the start of the ring and drop the dead slots"""
+        order = (self._tail + np.arange(self._size)) % self._ring
+        live = order[self._live[order]]
+        n_live = len(live)
+        for column in (self._keys, self._timestamps, self._probabilities, self._versions):
+            column[:n_live] = column[live]
+        self._live[:] = False
+        self._live[:n_live] = True
+        self._slots = {int(key): slot for slot, key in enumerate(self._keys[:n_live])}
+        self._tail = 0
+        self._head = n_live % self._ring
+        self._size = n_live
+
+    def expire(self, now=None) -> int:
+        """Drop entries older than the TTL; returns how many live entries were dropped"""
+        cutoff = (time.time() if now is None else now) - self.ttl_seconds
+        dropped_before = self.dropped
+        while self._size and (not self._live[self._tail] or self._timestamps[self._tail] < cutoff):
+            self._drop_tail()
+        return self.dropped - dropped_before
+
+    def add(self, prediction_id: str, model_version: str, probability: float, timestamp=None):
+        """Register a prediction; re-adding an ID replaces the earlier entry"""
+        timestamp = time.time() if timestamp is None else timestamp
+        self.expire(timestamp)
+
+        key = prediction_key(prediction_id)
+        previous = self._slots.pop(key, None)
+        if previous is not None:
+            self._live[previous] = False
+
+        # Only live entries count against capacity: evict the oldest one, skipping joined slots
+        if len(self._slots) >= self.capacity:
+            while not self._live[self._tail]:
+                self._drop_tail()
+            self._drop_tail()
+        if self._size == self._ring:
+            self._compact()
+
+        slot = self._head
+        self._keys[slot] = key
+        self._timestamps[slot] = timestamp
+        self._probabilities[slot] = probability
+        self._versions[slot] = self._version_id(model_version)
+        self._live[slot] = True
+        self._slots[key] = slot
+        self._head = (slot + 1) % self._ring
+        self._size += 1
+
+    def pop(self, prediction_id: str) -> Optional[Tuple[str, float, float]]:
+        """Remove and return (model_version, probability, timestamp) for a pending prediction"""
+        slot = self._slots.pop(prediction_key(prediction_id), None)
+        if slot is None:
+            return None
+        self._live[slot] = False
+        return (
+            self._version_names[self._versions[slot]],
+            float(self._probabilities[slot]),
+            float(self._timestamps[slot])
+        )
+
+
+class PerformanceTracker:
+    """Streaming confusion-matrix and calibration counters per model version and time bucket"""
+
+    def __init__(self, bucket_seconds=PERFORMANCE_BUCKET_SECONDS,
+                 retention_buckets=PERFORMANCE_RETENTION_BUCKETS, bins=CALIBRATION_BINS):
+        self.bucket_seconds = bucket_seconds
+        self.retention_buckets = retention_buckets
+        self.bins = bins
+        # (model_version, bucket start) -> [TP, FP, TN, FN]
+        self.confusion: Dict[Tuple[str, int], np.ndarray] = {}
+        # (model_version, bucket start) -> per-bin [count, sum of probabilities, positives]
+        self.calibration: Dict[Tuple[str, int], np.ndarray] = {}
+
+    def bucket_of(self, timestamp) -> int:
+        return int(timestamp // self.bucket_seconds) * self.bucket_seconds
+
+    def record(self, model_version: str, probability: float, label: int, timestamp: float):
+        """Add one joined outcome, bucketed by label arrival time"""
+        key = (model_version, self.bucket_of(timestamp))
+        confusion = self.confusion.get(key)
+        if confusion is None:
+            confusion = self.confusion[key] = np.zeros(4, dtype=np.int64)
+            self.calibration[key] = np.zeros((self.bins, 3), dtype=np.float64)
+            self._prune(key[1])
+
+        predicted = probability >= DECISION_THRESHOLD
+        if label:
+            confusion[TP if predicted else FN] += 1
+        else:
+            confusion[FP if predicted else TN] += 1
+
+        calibration_bin = min(int(probability * self.bins), self.bins - 1)
+        calibration = self.calibration[key][calibration_bin]
+        calibration[0] += 1
+        calibration[1] += probability
+        calibration[2] += label
+
+    def _prune(self, newest_bucket):
+        cutoff = newest_bucket - self.retention_buckets * self.bucket_seconds
+        for key in [k for k in self.confusion if k[1] < cutoff]:
+            del self.confusion[key]
+            del self.calibration[key]
+
+    def rolling(self, model_version: str, n_buckets=PERFORMANCE_ROLLING_BUCKETS, now=None) -> Dict[str, Any]:
+        """Accuracy/precision/recall and calibration error over the most recent buckets"""
+        since = self.bucket_of(time.time() if now is None else now) - (n_buckets - 1) * self.bucket_seconds
+        confusion = np.zeros(4, dtype=np.int64)
+        calibration = np.zeros((self.bins, 3), dtype=np.float64)
+        for key, counts in self.confusion.items():
+            if key[0] == model_version and key[1] >= since:
+                confusion += counts
+                calibration += self.calibration[key]
+
+        tp, fp, tn, fn = (int(c) for c in confusion)
+        total = tp + fp + tn + fn
+        binned = calibration[:, 0]
+        occupied = binned > 0
+        # Expected calibration error: count-weighted |mean probability - observed rate|
+        # Metrics without any outcomes behind them are undefined (None), not 0.0
+        ece = float(np.sum(np.abs(calibration[occupied, 1] - calibration[occupied, 2])) / total) if total else None
+        return {
+            "model_version": model_version,
+            "labeled_predictions": total,
+            "accuracy": (tp + tn) / total if total else None,
+            "precision": tp / (tp + fp) if tp + fp else None,
+            "recall": tp / (tp + fn) if tp + fn else None,
+            "expected_calibration_error": ece,
+            "confusion_matrix": {"tp": tp, "fp": fp, "tn": tn, "fn": fn}
+        }
+
+    def model_versions(self):
+        return sorted({key[0] for key in self.confusion})
+
+
+class PerformanceMonitor:
+    """
+    Joins delayed labels to pending predictions and keeps performance counters.
+
+    Thread-safe: predictions arrive from the inference batcher's worker thread.
+    """
+
+    def __init__(self, index: Optional[PendingPredictionIndex] = None,
+                 tracker: Optional[PerformanceTracker] = None):
+        self.index = index or PendingPredictionIndex()
+        self.tracker = tracker or PerformanceTracker()
+        self._lock = threading.Lock()
+
+    def record_predictions(self, model_version: str, prediction_ids: List[str],
+                           probabilities, timestamp=None):
+        """Register scored predictions so later labels can be joined to them"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            dropped_before = self.index.dropped
+            for prediction_id, probability in zip(prediction_ids, probabilities):
+                self.index.add(prediction_id, model_version, float(probability), timestamp)
+            PENDING_EXPIRED_COUNTER.inc(self.index.dropped - dropped_before)
+            PENDING_GAUGE.set(len(self.index))
+
+    def record_labels(self, labels: List[Tuple[str, int]]) -> Dict[str, int]:
+        """Join (prediction_id, label) pairs and update counters and gauges"""
+        matched = 0
+        versions = set()
+        now = time.time()
+        with self._lock:
+            for prediction_id, label in labels:
+                pending = self.index.pop(prediction_id)
+                if pending is None:
+                    continue
+                model_version, probability, _ = pending
+                self.tracker.record(model_version, probability, int(label), now)
+                LABELS_JOINED_COUNTER.labels(model_version).inc()
+                versions.add(model_version)
+                matched += 1
+
+        unmatched = len(labels) - matched
+        if unmatched:
+            LABELS_UNMATCHED_COUNTER.inc(unmatched)
+        PENDING_GAUGE.set(len(self.index))
+        for model_version in versions:
+            self.export(model_version)
+        return {"matched": matched, "unmatched": unmatched}
+
+    def export(self, model_version: str):
+        """Publish rolling metrics for one model version (NaN where no outcomes define them)"""
+        summary = self.tracker.rolling(model_version)
+        for metric in ("accuracy", "precision", "recall", "expected_calibration_error"):
+            value = summary[metric]
+            ONLINE_METRIC_GAUGE.labels(model_version, metric).set(float('nan') if value is None else value)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "pending_predictions": len(self.index),
+            "models": [self.tracker.rolling(v) for v in self.tracker.model_versions()]
+        }
+
+
+# Data models
+class LabelFeedback(BaseModel):
+    """Ground-truth label for an earlier prediction"""
+    prediction_id: str
+    label: int = Field(..., ge=0, le=1, description="Observed outcome (1 = churned)")
+
+class FeedbackRequest(BaseModel):
+    """Model for a batch of ground-truth labels"""
+    labels: List[LabelFeedback]
+
+class FeedbackResponse(BaseModel):
+    """Model for label feedback response"""
+    matched: int
+    unmatched: int
+
+# Wire-format structs generated from the models above, decoded without Pydantic on the hot path
+FeedbackStruct = wire_struct(FeedbackRequest)
+LabelStruct = wire_struct(LabelFeedback)
+
+feedback_decoder = BodyDecoder(FeedbackStruct)
+
+
+def build_feedback_router(monitor: PerformanceMonitor) -> APIRouter:
+    """Create the label feedback endpoints bound to a monitor instance"""
+    router = APIRouter()
+
+    @router.post("/monitor/feedback", response_model=FeedbackResponse,
+                 openapi_extra=openapi_body(FeedbackRequest))
+    async def feedback(http_request: Request):
+        """Join late-arriving ground truth to earlier predictions (JSON or MessagePack)"""
+        request = await feedback_decoder.decode(http_request)
+        result = monitor.record_labels([(item.prediction_id, item.label) for item in request.labels])
+        return encode_response(result, http_request)
+
+    @router.get("/monitor/performance")
+    async def performance():
+        """Rolling online performance per model version"""
+        return monitor.summary()
+
+    return router
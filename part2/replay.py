@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Offline drift replay and threshold backtesting.
+
+Streams historical observation logs through the detector's window scoring
+(the same bucketed counts and PSI / chi-square the fleet aggregator uses) and
+writes a timeline of drift scores with the severity every threshold
+configuration would have raised, so thresholds can be tuned against past
+traffic instead of weeks of production time.
+
+Each log record is a monitor request (``{"features": {...}, "model_version",
+"timestamp"}``) or a flat row with the features as top-level fields. JSONL and
+Parquet (requires ``pyarrow``) are supported. The parent parses every record
+once and splits the logs by model version into time-sorted spill runs of at
+most ``REPLAY_SPILL_ROWS`` records (MessagePack, in a temporary directory).
+Each version is replayed in its own worker process, which merges its runs
+back into one time-ordered stream, so no process holds a whole partition or
+log. All threshold configurations are evaluated in one vectorized sweep over
+the scores, so adding configurations costs no extra pass over the data.
+
+Usage:
+    python replay.py logs/*.jsonl --baseline baseline_data.json \
+        --thresholds current=0.2:0.5 --thresholds sensitive=0.1:0.3 --output timeline.jsonl
+"""
+import os
+import sys
+import json
+import heapq
+import argparse
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import msgspec
+import numpy as np
+
+from drift_scoring import CRITICAL_THRESHOLD, WARNING_THRESHOLD, BaselineScorer
+from window_state import WINDOW_BUCKET_SECONDS, WINDOW_BUCKETS, DriftWindow
+
+logger = logging.getLogger('drift_detector.replay')
+
+BASELINE_DATA_PATH = os.environ.get('BASELINE_DATA_PATH', 'baseline_data.json')
+REPLAY_SPILL_ROWS = int(os.environ.get('REPLAY_SPILL_ROWS', '100000'))
+
+SEVERITIES = ("none", "warning", "critical")
+RECORD_FIELDS = ("model_version", "timestamp")
+
+
+def parse_thresholds(spec: str) -> Dict[str, Any]:
+    """Parse a threshold configuration from "name=warning:critical" (the name is optional)"""
+    name, _, thresholds = spec.rpartition('=')
+    warning, critical = (float(value) for value in thresholds.split(':'))
+    if warning > critical:
+        raise ValueError(f"Warning threshold above critical threshold in {spec!r}")
+    return {"name": name or thresholds, "warning": warning, "critical": critical}
+
+
+def parse_timestamp(value) -> float:
+    """Epoch seconds of an ISO string, datetime or epoch number (naive times are UTC)"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    raise ValueError(f"Unsupported timestamp {value!r}")
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream raw records from a JSONL or Parquet log"""
+    if path.endswith(('.parquet', '.pq')):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError(f"Reading {path} requires pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+    decoder = msgspec.json.Decoder()
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield decoder.decode(line)
+
+
+def normalize_record(record: Dict[str, Any]) -> Tuple[str, float, Dict[str, Any]]:
+    """(model_version, timestamp, features) of a logged observation"""
+    features = record.get("features")
+    if not isinstance(features, dict):
+        features = {name: value for name, value in record.items() if name not in RECORD_FIELDS}
+    return str(record["model_version"]), parse_timestamp(record["timestamp"]), features
+
+
+def write_run(path: str, observations: List[Tuple[float, Dict[str, Any]]]):
+    """Write time-sorted observations as length-prefixed MessagePack records"""
+    encoder = msgspec.msgpack.Encoder()
+    with open(path, 'wb') as f:
+        for observation in observations:
+            data = encoder.encode(observation)
+            f.write(len(data).to_bytes(4, 'little'))
+            f.write(data)
+
+
+def read_run(path: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """Stream the observations of a spill run"""
+    decoder = msgspec.msgpack.Decoder(Tuple[float, Dict[str, Any]])
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(4)
+            if not header:
+                return
+            yield decoder.decode(f.read(int.from_bytes(header, 'little')))
+
+
+def spill_partitions(paths: List[str], spill_dir: str, spill_rows: int = REPLAY_SPILL_ROWS
+                     ) -> Tuple[Dict[str, List[str]], Dict[str, int], int]:
+    """
+    Split the logs by model version in one pass: spill run files and
+    observation count per version, and the number of unreadable records
+    """
+    buffers: Dict[str, List[Tuple[float, Dict[str, Any]]]] = {}
+    runs: Dict[str, List[str]] = {}
+    counts: Dict[str, int] = {}
+    ids: Dict[str, int] = {}
+    invalid = 0
+
+    def spill(model_version):
+        # Stable sort: equal timestamps keep log order, and runs are merged in spill order
+        observations = sorted(buffers.pop(model_version), key=lambda observation: observation[0])
+        version_runs = runs.setdefault(model_version, [])
+        path = os.path.join(spill_dir, f"{ids.setdefault(model_version, len(ids))}-{len(version_runs)}.msgpack")
+        write_run(path, observations)
+        version_runs.append(path)
+
+    for path in paths:
+        for record in read_records(path):
+            try:
+                model_version, timestamp, features = normalize_record(record)
+            except Exception as e:
+                invalid += 1
+                logger.debug(f"Skipping record in {path}: {str(e)}")
+                continue
+            counts[model_version] = counts.get(model_version, 0) + 1
+            buffer = buffers.setdefault(model_version, [])
+            buffer.append((timestamp, features))
+            if len(buffer) >= spill_rows:
+                spill(model_version)
+    for model_version in list(buffers):
+        spill(model_version)
+    return runs, counts, invalid
+
+
+# Baseline scorer of this (worker) process
+_scorer: Optional[BaselineScorer] = None
+
+
+def _init_worker(baseline: Dict[str, Any]):
+    """Score against the replayed baseline in this process"""
+    global _scorer
+    _scorer = BaselineScorer(baseline)
+
+
+def isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def replay_partition(model_version: str, runs: List[str], configs: List[Dict[str, Any]],
+                     bucket_seconds: int = WINDOW_BUCKET_SECONDS,
+                     window_buckets: int = WINDOW_BUCKETS) -> List[Dict[str, Any]]:
+    """Replay one model version's spill runs in time order and score its window after every bucket"""
+    window = DriftWindow(_scorer.cache, _scorer.categorical_features, _scorer.slicing_config,
+                         bucket_seconds, window_buckets, pod="replay")
+    observations = heapq.merge(*(read_run(run) for run in runs), key=lambda observation: observation[0])
+    timeline = []
+    for start, group in groupby(observations, key=lambda observation: window.bucket_start(observation[0])):
+        window.record(model_version, [features for _, features in group], now=start)
+        merged = window.merged(now=start)[model_version]
+        result = _scorer.score_window(merged)
+        timeline.append({
+            "model_version": model_version,
+            "bucket_start": isoformat(start),
+            "window_start": isoformat(window.window_start(start)),
+            "observations": merged.observations,
+            "drift_score": result["drift_score"],
+            "feature_scores": result["feature_scores"]
+        })
+
+    # Sweep every threshold configuration over all window scores at once
+    scores = np.array([point["drift_score"] for point in timeline])[:, None]
+    levels = ((scores >= np.array([config["warning"] for config in configs])).astype(int)
+              + (scores >= np.array([config["critical"] for config in configs])))
+    for point, row in zip(timeline, levels):
+        point["severity"] = {config["name"]: SEVERITIES[level] for config, level in zip(configs, row)}
+    return timeline
+
+
+def summarize_timeline(timeline: List[Dict[str, Any]], configs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Alert counts, episodes and first alert per configuration and model version"""
+    summary = {config["name"]: {} for config in configs}
+    for model_version, points in groupby(timeline, key=lambda point: point["model_version"]):
+        points = list(points)
+        for config in configs:
+            severities = [point["severity"][config["name"]] for point in points]
+            alerting = [severity != "none" for severity in severities]
+            first = alerting.index(True) if any(alerting) else None
+            summary[config["name"]][model_version] = {
+                "windows": len(points),
+                "warning": severities.count("warning"),
+                "critical": severities.count("critical"),
+                "alert_episodes": sum(1 for i, alert in enumerate(alerting) if alert and (i == 0 or not alerting[i - 1])),
+                "first_alert": None if first is None else points[first]["bucket_start"]
+            }
+    return summary
+
+
+def replay(paths: List[str], baseline: Dict[str, Any], configs: List[Dict[str, Any]],
+           bucket_seconds: int = WINDOW_BUCKET_SECONDS, window_buckets: int = WINDOW_BUCKETS,
+           workers: Optional[int] = None, spill_rows: int = REPLAY_SPILL_ROWS) -> List[Dict[str, Any]]:
+    """Timeline of window drift scores and per-configuration severities over the logs"""
+    with tempfile.TemporaryDirectory(prefix="replay-") as spill_dir:
+        runs, counts, invalid = spill_partitions(paths, spill_dir, spill_rows)
+        if invalid:
+            logger.warning(f"Skipped {invalid} records without model_version or a valid timestamp")
+        # Largest partitions first so one long model version does not finish last
+        order = sorted(counts, key=lambda model_version: -counts[model_version])
+        workers = min(workers or os.cpu_count() or 1, len(order))
+
+        if workers <= 1:
+            _init_worker(baseline)
+            timelines = {v: replay_partition(v, runs[v], configs, bucket_seconds, window_buckets) for v in order}
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(baseline,)) as pool:
+                futures = {v: pool.submit(replay_partition, v, runs[v], configs, bucket_seconds, window_buckets)
+                           for v in order}
+                timelines = {v: future.result() for v, future in futures.items()}
+    return [point for model_version in sorted(timelines) for point in timelines[model_version]]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Replay observation logs and backtest drift thresholds")
+    parser.add_argument('inputs', nargs='+', help="JSONL or Parquet observation logs")
+    parser.add_argument('--baseline', default=BASELINE_DATA_PATH)
+    parser.add_argument('--thresholds', action='append', type=parse_thresholds, default=[],
+                        help="Threshold configuration name=warning:critical (repeatable)")
+    parser.add_argument('--bucket-seconds', type=int, default=WINDOW_BUCKET_SECONDS)
+    parser.add_argument('--window-buckets', type=int, default=WINDOW_BUCKETS)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--output', default='-', help="Timeline JSONL file (default: stdout)")
+    parser.add_argument('--summary', default=None, help="Write the per-configuration summary JSON here")
+    args = parser.parse_args()
+
+    configs = args.thresholds or [{"name": "current", "warning": WARNING_THRESHOLD,
+                                   "critical": CRITICAL_THRESHOLD}]
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        timeline = replay(args.inputs, baseline, configs, args.bucket_seconds, args.window_buckets, args.workers)
+    except Exception as e:
+        logger.error(f"Replay failed: {str(e)}")
+        sys.exit(1)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for point in timeline:
+            output.write(json.dumps(point) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    summary = summarize_timeline(timeline, configs)
+    for name, models in summary.items():
+        for model_version, result in models.items():
+            logger.info(f"{name} {model_version}: {result['alert_episodes']} alert episodes, "
+                        f"{result['warning']} warning and {result['critical']} critical windows "
+                        f"of {result['windows']}, first alert {result['first_alert']}")
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Adaptive ingestion sampling and load shedding for drift monitoring.
+
+Monitoring must never add latency to production traffic or push the pod past
+its memory limit, so only a sample of observations gets the full detector
+work. Every kept observation carries the weight ``1 / p`` of its keep
+probability, and the drift window counts weighted observations, so drift
+statistics stay unbiased whatever the rate. The prediction counters always
+count every observation.
+
+Modes (``SAMPLING_MODE``):
+
+* ``probabilistic``: keep each observation with the model version's rate
+* ``stratified``: split each version's budget equally across the levels of
+  ``SAMPLING_STRATIFY_FEATURE``, so rare categories are kept more often
+* ``reservoir``: keep a fixed-size uniform reservoir per version and score
+  it every ``SAMPLING_RESERVOIR_SECONDS``; memory stays bounded at any rate
+
+With ``SAMPLING_ADAPTIVE=true``, rates (and reservoir sizes) are scaled down
+multiplicatively while CPU, inference queue depth, event-loop lag or memory
+exceed their targets, and recover additively once pressure subsides. CPython
+rarely hands freed memory back to the OS, so RSS over target only counts
+when it first crosses the target and then each time it has grown by
+``SAMPLING_MEMORY_GROWTH_MB`` since memory pressure last fired: a slow leak
+keeps shedding, but a flat RSS does not hold the rate at its floor.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger('drift_detector.sampling')
+
+
+def parse_rates(spec: str) -> Dict[str, float]:
+    """Parse per-model-version rates from "v1=0.5,v2=0.1" """
+    rates = {}
+    for item in spec.split(','):
+        if '=' in item:
+            model_version, rate = item.rsplit('=', 1)
+            rates[model_version.strip()] = float(rate)
+    return rates
+
+
+# Sampling configuration
+SAMPLING_MODE = os.environ.get('SAMPLING_MODE', 'probabilistic').lower()
+SAMPLING_RATE = float(os.environ.get('SAMPLING_RATE', '1.0'))
+SAMPLING_RATES = parse_rates(os.environ.get('SAMPLING_RATES', ''))
+SAMPLING_MIN_RATE = float(os.environ.get('SAMPLING_MIN_RATE', '0.01'))
+SAMPLING_STRATIFY_FEATURE = os.environ.get('SAMPLING_STRATIFY_FEATURE', 'product_category')
+SAMPLING_RESERVOIR_SIZE = int(os.environ.get('SAMPLING_RESERVOIR_SIZE', '256'))
+SAMPLING_RESERVOIR_SECONDS = float(os.environ.get('SAMPLING_RESERVOIR_SECONDS', '5'))
+
+# Load shedding configuration
+SAMPLING_ADAPTIVE = os.environ.get('SAMPLING_ADAPTIVE', 'false').lower() == 'true'
+SAMPLING_ADJUST_INTERVAL = float(os.environ.get('SAMPLING_ADJUST_INTERVAL', '1'))
+SAMPLING_CPU_TARGET = float(os.environ.get('SAMPLING_CPU_TARGET', '0.8'))
+SAMPLING_QUEUE_TARGET = int(os.environ.get('SAMPLING_QUEUE_TARGET', '256'))
+SAMPLING_LAG_TARGET_MS = float(os.environ.get('SAMPLING_LAG_TARGET_MS', '100'))
+SAMPLING_MEMORY_TARGET_MB = float(os.environ.get('SAMPLING_MEMORY_TARGET_MB', '768'))
+SAMPLING_MEMORY_GROWTH_MB = float(os.environ.get('SAMPLING_MEMORY_GROWTH_MB', '8'))
+SAMPLING_RECOVERY_STEP = float(os.environ.get('SAMPLING_RECOVERY_STEP', '0.05'))
+
+MODES = ('probabilistic', 'stratified', 'reservoir')
+
+# Prometheus metrics
+SAMPLING_RATE_GAUGE = Gauge('monitor_sampling_rate', 'Current ingestion sampling rate', ['model_version'])
+SAMPLING_SCALE_GAUGE = Gauge('monitor_sampling_scale', 'Load-shedding multiplier applied to sampling rates')
+SAMPLING_DECISIONS_COUNTER = Counter('monitor_sampling_decisions_total', 'Ingestion sampling decisions',
+                                     ['model_version', 'decision'])
+LOAD_PRESSURE_GAUGE = Gauge('monitor_load_pressure', 'Load relative to its shedding target (1.0 = at target)',
+                            ['signal'])
+
+
+def cpu_limit_cores() -> float:
+    """CPU cores available to the container (cgroup quota, else the host count)"""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return float(os.cpu_count() or 1)
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process (0 where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class LoadMonitor:
+    """Measures CPU, queue depth, event-loop lag and memory relative to their shedding targets"""
+
+    def __init__(self, queue_depth: Optional[Callable[[], int]] = None, cpu_target=SAMPLING_CPU_TARGET,
+                 queue_target=SAMPLING_QUEUE_TARGET, lag_target_ms=SAMPLING_LAG_TARGET_MS,
+                 memory_target_mb=SAMPLING_MEMORY_TARGET_MB, memory_growth_mb=SAMPLING_MEMORY_GROWTH_MB,
+                 rss: Callable[[], int] = rss_bytes):
+        self.queue_depth = queue_depth
+        self.cpu_target = cpu_target
+        self.queue_target = max(1, queue_target)
+        self.lag_target = max(1e-3, lag_target_ms / 1000.0)
+        self.memory_target = memory_target_mb * 2 ** 20
+        self.memory_growth = memory_growth_mb * 2 ** 20
+        self.rss = rss
+        self.cpu_limit = cpu_limit_cores()
+        self.loop_lag = 0.0
+        self._last = (time.monotonic(), time.process_time())
+        # RSS when memory pressure last fired (0 while RSS is under target)
+        self._rss_reference = 0
+
+    def record_loop_lag(self, seconds: float):
+        """Record how late the sampler's periodic wake-up ran"""
+        self.loop_lag = max(0.0, seconds)
+
+    def pressure(self) -> Dict[str, float]:
+        """Shedding signals; RSS over target only counts once it has grown since memory pressure last fired"""
+        now, cpu = time.monotonic(), time.process_time()
+        last_now, last_cpu = self._last
+        self._last = (now, cpu)
+        elapsed = now - last_now
+        rss = self.rss()
+        if rss <= self.memory_target:
+            self._rss_reference = 0
+        growing = rss > self._rss_reference + self.memory_growth
+        if growing and rss > self.memory_target:
+            self._rss_reference = rss
+        signals = {
+            'cpu': (cpu - last_cpu) / elapsed / self.cpu_limit / self.cpu_target if elapsed > 0 else 0.0,
+            'queue': (self.queue_depth() if self.queue_depth else 0) / self.queue_target,
+            'loop_lag': self.loop_lag / self.lag_target,
+            'memory': rss / self.memory_target
+        }
+        for signal, value in signals.items():
+            LOAD_PRESSURE_GAUGE.labels(signal).set(value)
+        if not growing:
+            signals['memory'] = min(signals['memory'], 1.0)
+        return signals
+
+
+class _Reservoir:
+    """Uniform fixed-size sample of a stream (Algorithm R)"""
+    __slots__ = ('capacity', 'seen', 'items')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.seen = 0
+        self.items = []
+
+    def offer(self, item, rng):
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+            return True
+        index = rng.randrange(self.seen)
+        if index < self.capacity:
+            self.items[index] = item
+            return True
+        return False
+
+
+class IngestionSampler:
+    """
+    Decides which observations get full drift processing, and their weights.
+
+    Thread-safe: inference batches are sampled from the batcher's worker
+    thread while the monitor endpoint samples on the event loop.
+    """
+
+    def __init__(self, mode=SAMPLING_MODE, rate=SAMPLING_RATE, rates: Optional[Dict[str, float]] = None,
+                 min_rate=SAMPLING_MIN_RATE, stratify_feature=SAMPLING_STRATIFY_FEATURE,
+                 reservoir_size=SAMPLING_RESERVOIR_SIZE, reservoir_seconds=SAMPLING_RESERVOIR_SECONDS,
+                 adaptive=SAMPLING_ADAPTIVE, load: Optional[LoadMonitor] = None,
+                 recovery_step=SAMPLING_RECOVERY_STEP, rng: Optional[random.Random] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown sampling mode {mode!r}, expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.default_rate = rate
+        self.rates = dict(SAMPLING_RATES if rates is None else rates)
+        self.min_rate = min_rate
+        self.stratify_feature = stratify_feature
+        self.reservoir_size = reservoir_size
+        self.reservoir_seconds = reservoir_seconds
+        self.adaptive = adaptive
+        self.load = load or LoadMonitor()
+        self.recovery_step = recovery_step
+        self.rng = rng or random.Random()
+        self.scale = 1.0
+        self._arrivals: Dict[str, Dict[Any, float]] = {}
+        self._stratum_factors: Dict[str, Dict[Any, float]] = {}
+        self._reservoirs: Dict[str, _Reservoir] = {}
+        self._decisions = {}
+        self._lock = threading.Lock()
+        self._task = None
+
+    @property
+    def deferred(self) -> bool:
+        """Whether kept observations are scored later rather than inline"""
+        return self.mode == 'reservoir'
+
+    def rate(self, model_version: str) -> float:
+        """Keep probability for a version after load shedding (never below min_rate unless configured so)"""
+        base = self.rates.get(model_version, self.default_rate)
+        return max(base * self.scale, min(base, self.min_rate))
+
+    def _count(self, model_version, decision, count=1):
+        counter = self._decisions.get((model_version, decision))
+        if counter is None:
+            counter = self._decisions[(model_version, decision)] = \
+                SAMPLING_DECISIONS_COUNTER.labels(model_version, decision)
+        counter.inc(count)
+
+    def _keep_probability(self, model_version: str, row: Dict[str, Any]) -> float:
+        rate = self.rate(model_version)
+        if self.mode != 'stratified':
+            return rate
+        stratum = row.get(self.stratify_feature)
+        arrivals = self._arrivals.setdefault(model_version, {})
+        arrivals[stratum] = arrivals.get(stratum, 0.0) + 1.0
+        factor = self._stratum_factors.get(model_version, {}).get(stratum, 1.0)
+        return min(1.0, rate * factor)
+
+    def sample(self, model_version: str, row: Dict[str, Any]) -> float:
+        """Weight of the observation if it is scored inline now, else 0.0 (skipped or deferred)"""
+        with self._lock:
+            return self._sample(model_version, row)
+
+    def _sample(self, model_version: str, row: Dict[str, Any]) -> float:
+        if self.mode == 'reservoir':
+            reservoir = self._reservoirs.get(model_version)
+            if reservoir is None:
+                reservoir = self._reservoirs[model_version] = _Reservoir(self._reservoir_capacity())
+            reservoir.offer(row, self.rng)
+            self._count(model_version, 'deferred')
+            return 0.0
+
+        probability = self._keep_probability(model_version, row)
+        if probability >= 1.0 or self.rng.random() < probability:
+            self._count(model_version, 'sampled')
+            return 1.0 / probability
+        self._count(model_version, 'skipped')
+        return 0.0
+
+    def sample_batch(self, model_version: str,
+                     rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[float]]:
+        """Kept rows of a batch and their weights"""
+        if self.mode == 'probabilistic' and self.rate(model_version) >= 1.0:
+            self._count(model_version, 'sampled', len(rows))
+            return rows, [1.0] * len(rows)
+        kept, weights = [], []
+        with self._lock:
+            for row in rows:
+                weight = self._sample(model_version, row)
+                if weight:
+                    kept.append(row)
+                    weights.append(weight)
+        return kept, weights
+
+    def _reservoir_capacity(self):
+        return max(1, int(self.reservoir_size * self.scale))
+
+    def drain(self) -> List[Tuple[str, List[Dict[str, Any]], List[float]]]:
+        """Take every reservoir as (model_version, rows, weights) and start new ones"""
+        drained = []
+        with self._lock:
+            reservoirs, self._reservoirs = self._reservoirs, {}
+        for model_version, reservoir in reservoirs.items():
+            if reservoir.items:
+                weight = reservoir.seen / len(reservoir.items)
+                drained.append((model_version, reservoir.items, [weight] * len(reservoir.items)))
+                SAMPLING_RATE_GAUGE.labels(model_version).set(1.0 / weight)
+        return drained
+
+    def refresh_strata(self):
+        """Give every stratum an equal share of its version's budget, from recent arrivals"""
+        with self._lock:
+            for model_version, arrivals in self._arrivals.items():
+                total = sum(arrivals.values())
+                if total <= 0:
+                    continue
+                share = total / len(arrivals)
+                self._stratum_factors[model_version] = {stratum: share / count for stratum, count in arrivals.items()}
+                # Decay so the allocation follows the recent category mix
+                self._arrivals[model_version] = {s: c / 2 for s, c in arrivals.items() if c >= 1.0}
+
+    def adjust(self) -> Dict[str, float]:
+        """Scale rates down under pressure (multiplicative) and back up when idle (additive)"""
+        signals = self.load.pressure()
+        pressure = max(signals.values())
+        if pressure > 1.0:
+            self.scale = max(self.min_rate, self.scale * max(0.5, 1.0 / pressure))
+            logger.warning(f"Monitoring under pressure {signals}, sampling scale {self.scale:.3f}")
+        else:
+            self.scale = min(1.0, self.scale + self.recovery_step)
+        SAMPLING_SCALE_GAUGE.set(self.scale)
+        if not self.deferred:
+            for model_version in set(self.rates) | set(self._arrivals):
+                SAMPLING_RATE_GAUGE.labels(model_version).set(self.rate(model_version))
+        return signals
+
+    async def _run(self, flush, adjust_interval):
+        loop = asyncio.get_running_loop()
+        next_flush = loop.time() + self.reservoir_seconds
+        while True:
+            due = loop.time() + adjust_interval
+            await asyncio.sleep(adjust_interval)
+            try:
+                self.load.record_loop_lag(loop.time() - due)
+                if self.adaptive:
+                    self.adjust()
+                if self.mode == 'stratified':
+                    self.refresh_strata()
+                if self.deferred and loop.time() >= next_flush:
+                    next_flush = loop.time() + self.reservoir_seconds
+                    for model_version, rows, weights in self.drain():
+                        flush(model_version, rows, weights)
+            except Exception as e:
+                logger.error(f"Error in ingestion sampler loop: {str(e)}")
+
+    def start(self, flush: Callable[[str, List[Dict[str, Any]], List[float]], Any],
+              adjust_interval=SAMPLING_ADJUST_INTERVAL):
+        """Run load shedding, stratum refresh and reservoir flushes on the event loop"""
+        if not (self.adaptive or self.mode != 'probabilistic'):
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(
+                self._run(flush, min(adjust_interval, self.reservoir_seconds))
+            )
+
+    async def stop(self, flush: Optional[Callable[[str, List[Dict[str, Any]], List[float]], Any]] = None):
+        """Stop the loop and score whatever the reservoirs still hold"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if flush is not None:
+            for model_version, rows, weights in self.drain():
+                flush(model_version, rows, weights)
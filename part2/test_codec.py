@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fast JSON / MessagePack monitor endpoint codecs
+"""
+import msgspec
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+import drift_detector
+import performance_monitor
+from codec import MSGPACK_CONTENT_TYPE, is_msgpack, wire_struct
+from drift_detector import app
+
+client = TestClient(app)
+
+SAMPLE_REQUEST = {
+    "features": {"age": 35, "income": 75000.0, "tenure_months": 24, "product_category": "premium"},
+    "model_version": "v1.0.0",
+    "timestamp": "2023-05-01T12:00:00Z"
+}
+
+@pytest.fixture(autouse=True)
+def baseline(monkeypatch):
+    monkeypatch.setattr(drift_detector, "baseline_data", {"features": {
+        "age": {"values": [25, 35, 45, 55]},
+        "product_category": {"distribution": {"basic": 50, "premium": 50}}
+    }})
+
+PARITY_CASES = [
+    (drift_detector.PredictionRequest, SAMPLE_REQUEST),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "features": {}}),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "features": {"age": "35", "income": "1e5"}}),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "features": {"age": None, "product_category": None}}),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "features": {"age": "old"}}),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "features": {"product_category": ["basic"]}}),
+    (drift_detector.PredictionRequest, {"features": {"age": 35}, "model_version": "v1"}),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "features": "age=35"}),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "model_version": 1}),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "model_version": 1.5, "timestamp": True}),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "features": {"product_category": 5}}),
+    (drift_detector.PredictionRequest, {**SAMPLE_REQUEST, "model_version": ["v1"]}),
+    (performance_monitor.FeedbackRequest, {"labels": [{"prediction_id": 123, "label": 1}]}),
+    (performance_monitor.FeedbackRequest, {"labels": [{"prediction_id": "p1", "label": 1}]}),
+    (performance_monitor.FeedbackRequest, {"labels": [{"prediction_id": "p1", "label": "0"}]}),
+    (performance_monitor.FeedbackRequest, {"labels": [{"prediction_id": "p1", "label": 2}]}),
+    (performance_monitor.FeedbackRequest, {"labels": [{"prediction_id": "p1", "label": -1}]}),
+    (performance_monitor.FeedbackRequest, {"labels": [{"label": 1}]}),
+    (performance_monitor.FeedbackRequest, {"labels": {"prediction_id": "p1", "label": 1}}),
+]
+
+def test_structs_are_generated_from_models():
+    """Test that every wire struct is derived from (not copied from) its model"""
+    pairs = [
+        (drift_detector.FeatureStruct, drift_detector.FeatureData),
+        (drift_detector.PredictionStruct, drift_detector.PredictionRequest),
+        (performance_monitor.LabelStruct, performance_monitor.LabelFeedback),
+        (performance_monitor.FeedbackStruct, performance_monitor.FeedbackRequest),
+    ]
+    for struct, model in pairs:
+        assert struct is wire_struct(model)
+        assert struct.__struct_fields__ == tuple(model.__fields__), struct.__name__
+
+@pytest.mark.parametrize("model, payload", PARITY_CASES)
+def test_structs_validate_like_models(model, payload):
+    """Test that types, defaults and constraints accept and reject the same payloads"""
+    try:
+        expected = model.parse_obj(payload).dict()
+    except ValidationError:
+        expected = None
+    try:
+        decoded = msgspec.to_builtins(msgspec.convert(payload, wire_struct(model), strict=False))
+    except msgspec.ValidationError:
+        decoded = None
+    assert decoded == expected
+
+def test_json_request_and_response():
+    """Test that JSON requests get the same response shape as before"""
+    response = client.post("/monitor/predict", json=SAMPLE_REQUEST)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    data = response.json()
+    assert set(data) == {"drift_detected", "drift_score", "severity", "feature_scores", "timestamp",
+                         "sampled", "sample_weight"}
+    assert set(data["feature_scores"]) == {"age", "product_category"}
+    assert isinstance(data["timestamp"], str)
+
+def test_msgpack_request_and_response():
+    """Test that MessagePack bodies are decoded and answered in MessagePack"""
+    response = client.post("/monitor/predict", content=msgspec.msgpack.encode(SAMPLE_REQUEST),
+                           headers={"Content-Type": MSGPACK_CONTENT_TYPE})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == MSGPACK_CONTENT_TYPE
+    expected = client.post("/monitor/predict", json=SAMPLE_REQUEST).json()
+    data = msgspec.msgpack.decode(response.content)
+    assert data["feature_scores"] == pytest.approx(expected["feature_scores"])
+
+def test_accept_header_negotiation():
+    """Test that Accept overrides the request content type"""
+    response = client.post("/monitor/predict", json=SAMPLE_REQUEST, headers={"Accept": MSGPACK_CONTENT_TYPE})
+    assert response.headers["content-type"] == MSGPACK_CONTENT_TYPE
+
+    response = client.post("/monitor/predict", content=msgspec.msgpack.encode(SAMPLE_REQUEST),
+                           headers={"Content-Type": MSGPACK_CONTENT_TYPE, "Accept": "application/json"})
+    assert response.json()["severity"] in ("none", "warning", "critical")
+
+def test_invalid_requests_are_rejected():
+    """Test that malformed and invalid bodies return 422 rather than 500"""
+    response = client.post("/monitor/predict", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+
+    response = client.post("/monitor/predict", json={"features": {"age": "old"}, "model_version": "v1",
+                                                     "timestamp": "t"})
+    assert response.status_code == 422
+    assert "age" in response.json()["detail"][0]["msg"]
+
+    response = client.post("/monitor/predict", json={"features": {}})
+    assert response.status_code == 422
+
+def test_lax_coercion_matches_pydantic():
+    """Test that numeric strings are coerced as the Pydantic models did"""
+    request = {**SAMPLE_REQUEST, "features": {**SAMPLE_REQUEST["features"], "age": "35"}}
+    response = client.post("/monitor/predict", json=request)
+    assert response.status_code == 200
+    assert "age" in response.json()["feature_scores"]
+
+def test_numbers_in_str_fields_are_stringified():
+    """Test that numeric model versions and categories are accepted as strings, as Pydantic v1 did"""
+    request = {**SAMPLE_REQUEST, "model_version": 2, "features": {"age": 35, "product_category": 5}}
+    response = client.post("/monitor/predict", json=request)
+    assert response.status_code == 200
+    decoded = msgspec.json.decode(msgspec.json.encode(request), type=drift_detector.PredictionStruct,
+                                  strict=False)
+    assert (decoded.model_version, decoded.features.product_category) == ("2", "5")
+
+@pytest.mark.parametrize("age", [35.5, True])
+def test_int_fields_reject_lossy_values_unlike_pydantic(age):
+    """Test the documented difference: Pydantic v1 truncates 35.5 and converts True, the codec returns 422"""
+    request = {**SAMPLE_REQUEST, "features": {**SAMPLE_REQUEST["features"], "age": age}}
+    assert drift_detector.PredictionRequest.parse_obj(request).features.age == int(age)
+    response = client.post("/monitor/predict", json=request)
+    assert response.status_code == 422
+    assert "age" in response.json()["detail"][0]["msg"]
+
+def test_feedback_msgpack():
+    """Test label feedback over MessagePack"""
+    response = client.post("/monitor/feedback",
+                           content=msgspec.msgpack.encode({"labels": [{"prediction_id": "missing", "label": 1}]}),
+                           headers={"Content-Type": MSGPACK_CONTENT_TYPE})
+    assert response.status_code == 200
+    assert msgspec.msgpack.decode(response.content) == {"matched": 0, "unmatched": 1}
+
+def test_openapi_documents_request_bodies():
+    """Test that raw-body routes still document their request schema"""
+    spec = client.get("/openapi.json").json()
+    body = spec["paths"]["/monitor/predict"]["post"]["requestBody"]["content"]
+    assert set(body) == {"application/json", MSGPACK_CONTENT_TYPE}
+    schema = body["application/json"]["schema"]
+    assert "age" in schema["properties"]["features"]["properties"]
+
+def test_is_msgpack():
+    """Test content type matching"""
+    assert is_msgpack("application/msgpack")
+    assert is_msgpack("application/x-msgpack; charset=binary")
+    assert not is_msgpack("application/json")
+    assert not is_msgpack(None)
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
@@ -4,11 +4,14 @@ Unit tests for drift detector service
 """
 import json
 import os
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
 
 # Import the app from drift_detector.py
+import drift_detector
 from drift_detector import app, calculate_psi, calculate_chi_square, detect_drift
+from baseline_compiler import load_compiled, save_compiled, source_hash
 
 # Create test client
 client = TestClient(app)
@@ -132,5 +135,63 @@ def test_detect_drift():
     assert "drift_score" in result
     assert "severity" in result
 
+def test_liveness_and_readiness_endpoints():
+    """Test that readiness flips only after warm start while liveness always answers"""
+    drift_detector.service_state["ready"] = False
+    response = client.get("/monitor/ready")
+    assert response.status_code == 503
+    assert client.get("/monitor/live").status_code == 200
+
+    with TestClient(app) as warm_client:
+        response = warm_client.get("/monitor/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+
+def test_warm_start_retries_then_gives_up(monkeypatch):
+    """Test that a failing warm start is retried and raises once retries run out"""
+    monkeypatch.setattr(drift_detector, "WARM_START_RETRIES", 2)
+    monkeypatch.setattr(drift_detector, "WARM_START_RETRY_SECONDS", 0)
+    attempts = []
+
+    def flaky_warm_up():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("baseline volume not mounted yet")
+
+    monkeypatch.setattr(drift_detector, "warm_up_drift", flaky_warm_up)
+    monkeypatch.setattr(drift_detector.inference_service, "start", lambda: asyncio.sleep(0))
+    drift_detector.service_state["ready"] = False
+    asyncio.run(drift_detector.warm_start())
+    assert len(attempts) == 3 and drift_detector.service_state["ready"]
+
+    attempts.clear()
+    drift_detector.service_state["ready"] = False
+    monkeypatch.setattr(drift_detector, "WARM_START_RETRIES", 1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(drift_detector.warm_start())
+    assert len(attempts) == 2 and not drift_detector.service_state["ready"]
+    drift_detector.service_state["ready"] = True
+
+def test_compiled_baseline_roundtrip(tmp_path):
+    """Test that a compiled baseline reloads and matches the uncached PSI"""
+    raw = json.dumps(SAMPLE_BASELINE).encode()
+    path = tmp_path / "baseline.npz"
+    save_compiled(path, raw)
+
+    baseline, cache = load_compiled(path, source_hash(raw))
+    assert baseline == SAMPLE_BASELINE
+    assert set(cache) == {"age"}
+    assert load_compiled(path, source_hash(b"{}")) is None
+
+    original = drift_detector.baseline_data
+    try:
+        drift_detector.baseline_data = SAMPLE_BASELINE
+        actual = [31, 44, 58, 90]
+        assert drift_detector.psi_against_baseline("age", actual) == pytest.approx(
+            calculate_psi(SAMPLE_BASELINE["features"]["age"]["values"], actual)
+        )
+    finally:
+        drift_detector.baseline_data = original
+
 if __name__ == "__main__":
     pytest.main(["-xvs", __file__])
\ No newline at end of file
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the micro-batched inference service
+"""
+import json
+import asyncio
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sklearn.linear_model import LogisticRegression
+
+import drift_detector
+from drift_detector import app
+from feature_encoding import CATEGORICAL_FEATURES, FEATURE_COLUMNS, encode_rows
+from inference import InferenceService, MicroBatcher
+from sampling import IngestionSampler
+
+SAMPLE_FEATURES = {
+    "age": 42,
+    "tenure_months": 7,
+    "monthly_charges": 95.5,
+    "total_charges": 640.0,
+    "contract_length": "month-to-month",
+    "payment_method": "electronic_check",
+    "internet_service": "fiber_optic",
+    "tech_support": "no",
+    "online_security": "no",
+    "paperless_billing": "yes"
+}
+
+@pytest.fixture
+def model_path(tmp_path):
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, len(FEATURE_COLUMNS))
+    y = (X[:, 0] - X[:, 1] > 0).astype(int)
+    model = LogisticRegression().fit(X, y)
+    path = tmp_path / "model.pkl"
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+    return str(path)
+
+def test_encode_rows_matches_get_dummies():
+    """Test that encoding matches the pd.get_dummies layout used for training data"""
+    rng = np.random.RandomState(1)
+    raw = pd.DataFrame({
+        "age": rng.randint(18, 80, 50),
+        "tenure_months": rng.randint(1, 120, 50),
+        "monthly_charges": rng.uniform(20, 120, 50),
+        "total_charges": rng.uniform(100, 8000, 50),
+        **{feature: rng.choice(levels, 50) for feature, levels in CATEGORICAL_FEATURES.items()}
+    })
+    expected = pd.get_dummies(raw, columns=list(CATEGORICAL_FEATURES))
+    # Every level must be present for get_dummies to emit the full layout
+    expected = expected.reindex(columns=FEATURE_COLUMNS, fill_value=0)
+
+    encoded = encode_rows(raw.to_dict(orient='records'))
+    np.testing.assert_allclose(encoded, expected.values.astype(float))
+
+def test_encode_rows_unseen_category():
+    """Test that unseen categories encode as an all-zero group"""
+    encoded = encode_rows([{**SAMPLE_FEATURES, "contract_length": "lifetime"}])
+    start = FEATURE_COLUMNS.index("contract_length_month-to-month")
+    assert encoded[0, start:start + 3].sum() == 0
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    """Test that concurrent submissions are scored in shared batches"""
+    batch_sizes = []
+
+    def process(items):
+        batch_sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    async def run():
+        batcher = MicroBatcher(process, max_batch_size=8, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(20)))
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert results == [i * 2 for i in range(20)]
+    assert batch_sizes == [8, 8, 4]
+
+def test_micro_batcher_propagates_errors():
+    """Test that a failing batch fails its callers without stopping the loop"""
+    def process(items):
+        if 0 in items:
+            raise ValueError("bad batch")
+        return items
+
+    async def run():
+        batcher = MicroBatcher(process, max_batch_size=1, max_wait_ms=0)
+        with pytest.raises(ValueError):
+            await batcher.submit(0)
+        result = await batcher.submit(5)
+        await batcher.stop()
+        return result
+
+    assert asyncio.run(run()) == 5
+
+def test_micro_batcher_scores_off_the_event_loop():
+    """Test that batches are processed in a worker thread, not on the event loop"""
+    threads = []
+
+    def process(items):
+        threads.append(threading.get_ident())
+        return items
+
+    async def run():
+        batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=0)
+        await batcher.submit(1)
+        await batcher.stop()
+
+    asyncio.run(run())
+    assert threads and threads[0] != threading.get_ident()
+
+def test_micro_batcher_bounds_after_batch_backlog():
+    """Test that batches skip after_batch while too many are waiting for it"""
+    release = threading.Event()
+    seen = []
+
+    def after(items):
+        release.wait(5)
+        seen.append(items)
+
+    async def run():
+        batcher = MicroBatcher(lambda items: items, max_batch_size=1, max_wait_ms=0,
+                               after_batch=after, max_pending_after=2)
+        for i in range(4):
+            await batcher.submit(i)
+        backlog = batcher.after_backlog
+        release.set()
+        await batcher.stop()
+        return batcher, backlog
+
+    batcher, backlog = asyncio.run(run())
+    assert backlog == 2
+    assert batcher.after_skipped == 2
+    assert seen == [[0], [1]]
+
+def test_inference_batch_monitors_every_model_feature(monkeypatch):
+    """Test that the shipped baseline covers every churn model input and alerts count per row"""
+    with open("baseline_data.json") as f:
+        monkeypatch.setattr(drift_detector, "baseline_data", json.load(f))
+    monkeypatch.setattr(drift_detector, "ingestion_sampler", IngestionSampler(rate=1.0, adaptive=False))
+    alerts = lambda: sum(REGISTRY.get_sample_value("model_drift_alerts_total",
+                                                   {"model_version": "v-churn", "severity": severity}) or 0.0
+                         for severity in ("warning", "critical"))
+    before = alerts()
+
+    rows = [{**SAMPLE_FEATURES, "age": 70 + i % 10, "monthly_charges": 118.0} for i in range(20)]
+    result = drift_detector.monitor_batch("v-churn", rows)
+    assert set(result["feature_scores"]) == set(SAMPLE_FEATURES)
+    assert result["drift_detected"]
+    assert alerts() == before + len(rows)
+
+def test_inference_service_scores_and_monitors_batch(model_path):
+    """Test that batch scores match sklearn and the batch reaches drift monitoring"""
+    monitored = []
+    service = InferenceService(model_path=model_path, model_version="v-test", compiled_model_path=None,
+                               on_batch=lambda version, rows: monitored.append((version, len(rows))),
+                               max_batch_size=16, max_wait_ms=20)
+    assert service.load_model()
+
+    async def run():
+        results = await asyncio.gather(*(
+            service.predict({**SAMPLE_FEATURES, "age": 20 + i}, f"p-{i}") for i in range(10)
+        ))
+        await service.stop()
+        return results
+
+    results = asyncio.run(run())
+    expected = service.model.predict_proba(
+        encode_rows([{**SAMPLE_FEATURES, "age": 20 + i} for i in range(10)])
+    )[:, 1]
+    np.testing.assert_allclose([r["churn_probability"] for r in results], expected)
+    assert [r["prediction_id"] for r in results] == [f"p-{i}" for i in range(10)]
+    assert monitored == [("v-test", 10)]
+
+def test_inference_results_do_not_wait_for_drift_monitoring(model_path):
+    """Test that callers get their scores while drift monitoring of their batch is still running"""
+    release = threading.Event()
+    monitored = []
+
+    def on_batch(version, rows):
+        release.wait(5)
+        monitored.append(len(rows))
+
+    service = InferenceService(model_path=model_path, model_version="v-test", compiled_model_path=None,
+                               on_batch=on_batch, max_batch_size=16, max_wait_ms=20)
+    assert service.load_model()
+
+    async def run():
+        results = await asyncio.wait_for(asyncio.gather(*(
+            service.predict({**SAMPLE_FEATURES, "age": 20 + i}, f"p-{i}") for i in range(5)
+        )), timeout=2)
+        pending = service.batcher.after_backlog
+        release.set()
+        await service.stop()
+        return results, pending
+
+    results, pending = asyncio.run(run())
+    assert len(results) == 5
+    assert pending == 5
+    assert monitored == [5]
+
+def test_model_predict_endpoint(model_path, monkeypatch, tmp_path):
+    """Test the inference endpoint end to end"""
+    monkeypatch.setattr(drift_detector.inference_service, "model_path", model_path)
+    monkeypatch.setattr(drift_detector.inference_service, "compiled_model_path", str(tmp_path / "compiled.npz"))
+    with TestClient(app) as client:
+        response = client.post("/model/predict", json={"features": SAMPLE_FEATURES,
+                                                       "prediction_id": "abc"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["prediction_id"] == "abc"
+    assert 0.0 <= data["churn_probability"] <= 1.0
+    assert data["prediction"] in (0, 1)
+
+def test_compiled_model_is_written_and_tied_to_its_pickle(model_path, tmp_path):
+    """Test that the first load compiles the pickle and a replaced pickle invalidates it"""
+    compiled_path = str(tmp_path / "model_compiled.npz")
+    service = InferenceService(model_path=model_path, compiled_model_path=compiled_path)
+    assert service.load_model() and service.model is not None
+    expected = service.scorer.score([SAMPLE_FEATURES])
+
+    restarted = InferenceService(model_path=model_path, compiled_model_path=compiled_path)
+    assert restarted.load_model()
+    assert restarted.model is None
+    np.testing.assert_allclose(restarted.scorer.score([SAMPLE_FEATURES]), expected)
+
+    rng = np.random.RandomState(1)
+    X = rng.randn(200, len(FEATURE_COLUMNS))
+    with open(model_path, 'wb') as f:
+        pickle.dump(LogisticRegression().fit(X, (X[:, 2] > 0).astype(int)), f)
+    redeployed = InferenceService(model_path=model_path, compiled_model_path=compiled_path)
+    assert redeployed.load_model()
+    assert redeployed.model is not None
+    np.testing.assert_allclose(redeployed.scorer.score([SAMPLE_FEATURES]),
+                               redeployed.model.predict_proba(encode_rows([SAMPLE_FEATURES]))[:, 1])
+
+def test_model_predict_without_model(monkeypatch, tmp_path):
+    """Test that the endpoint reports 503 when no model is deployed"""
+    monkeypatch.setattr(drift_detector.inference_service, "model", None)
+    monkeypatch.setattr(drift_detector.inference_service, "model_path", str(tmp_path / "missing.pkl"))
+    monkeypatch.setattr(drift_detector.inference_service, "compiled_model_path", str(tmp_path / "missing.npz"))
+    with TestClient(app) as client:
+        response = client.post("/model/predict", json={"features": SAMPLE_FEATURES})
+    assert response.status_code == 503
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
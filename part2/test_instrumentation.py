@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Unit tests for opt-in instrumentation and profiling
+"""
+import time
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import drift_detector
+import instrumentation
+from drift_detector import app
+from instrumentation import EventLoopLagMonitor, SamplingProfiler, collapse, stage_timer, time_requests
+
+client = TestClient(app)
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(instrumentation, "INSTRUMENTATION_ENABLED", True)
+
+def stage_count(stage):
+    return REGISTRY.get_sample_value("drift_stage_latency_seconds_count", {"stage": stage}) or 0.0
+
+def test_stage_timer_is_noop_when_disabled(monkeypatch):
+    """Test that disabled timers record nothing"""
+    monkeypatch.setattr(instrumentation, "INSTRUMENTATION_ENABLED", False)
+    before = stage_count("test_disabled")
+    with stage_timer("test_disabled"):
+        pass
+    assert stage_count("test_disabled") == before
+
+def test_stage_timer_records_latency(enabled):
+    """Test that enabled timers observe the block duration"""
+    with stage_timer("test_enabled"):
+        time.sleep(0.01)
+    assert stage_count("test_enabled") == 1
+    total = REGISTRY.get_sample_value("drift_stage_latency_seconds_sum", {"stage": "test_enabled"})
+    assert total >= 0.01
+
+def test_predict_records_pipeline_stages(enabled, monkeypatch):
+    """Test that the drift endpoint times parsing, detection, statistics and metrics"""
+    monkeypatch.setattr(drift_detector, "baseline_data", {"features": {
+        "age": {"values": [25, 35, 45, 55]},
+        "product_category": {"distribution": {"basic": 50, "premium": 50}}
+    }})
+    stages = ["parse", "detect_drift", "psi", "chi_square", "metrics"]
+    before = {stage: stage_count(stage) for stage in stages}
+    response = client.post("/monitor/predict", json={
+        "features": {"age": 35, "income": 75000.0, "tenure_months": 24, "product_category": "premium"},
+        "model_version": "v1.0.0",
+        "timestamp": "2023-05-01T12:00:00Z"
+    })
+    assert response.status_code == 200
+    for stage in stages:
+        assert stage_count(stage) > before[stage], stage
+
+def test_profiler_collapses_stacks():
+    """Test that the sampler captures a busy thread's stack in collapsed format"""
+    stop = threading.Event()
+
+    def busy_loop_for_profiling():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_loop_for_profiling, name="busy-worker")
+    worker.start()
+    try:
+        stacks = SamplingProfiler().profile(seconds=0.2, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    text = collapse(stacks)
+    busy = [line for line in text.splitlines() if line.startswith("busy-worker;")]
+    assert busy and any("busy_loop_for_profiling" in line for line in busy)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in text.splitlines())
+
+def test_profiler_rejects_concurrent_runs():
+    """Test that only one profile runs at a time"""
+    profiler = SamplingProfiler()
+    thread = threading.Thread(target=profiler.profile, args=(0.3, 0.01))
+    thread.start()
+    time.sleep(0.05)
+    try:
+        assert profiler.busy
+        with pytest.raises(RuntimeError):
+            profiler.profile(0.01, 0.01)
+    finally:
+        thread.join()
+
+def test_profile_endpoint_disabled_by_default(monkeypatch):
+    """Test that the admin endpoint is hidden unless instrumentation is enabled"""
+    monkeypatch.setattr(instrumentation, "INSTRUMENTATION_ENABLED", False)
+    assert client.post("/admin/profile?seconds=0.1").status_code == 404
+
+def test_profile_endpoint_requires_admin(enabled, monkeypatch):
+    """Test that profiling needs the admin key, or a loopback client when no key is set"""
+    monkeypatch.setattr(instrumentation, "ADMIN_API_KEY", "")
+    assert client.post("/admin/profile?seconds=0.1").status_code == 403
+    # TestClient connects as host "testclient"; treat it as local
+    monkeypatch.setattr(instrumentation, "LOOPBACK_HOSTS", {"testclient"})
+    assert client.post("/admin/profile?seconds=0").status_code == 400
+
+    monkeypatch.setattr(instrumentation, "ADMIN_API_KEY", "s3cret")
+    assert client.post("/admin/profile?seconds=0.1").status_code == 401
+    assert client.post("/admin/profile?seconds=0.1", headers={"X-Admin-Key": "wrong"}).status_code == 401
+
+def test_profile_endpoint(enabled, monkeypatch):
+    """Test that the admin endpoint returns a collapsed-stack attachment"""
+    monkeypatch.setattr(instrumentation, "ADMIN_API_KEY", "s3cret")
+    headers = {"X-Admin-Key": "s3cret"}
+    assert client.post("/admin/profile?seconds=0", headers=headers).status_code == 400
+
+    response = client.post("/admin/profile?seconds=0.1&interval_ms=5", headers=headers)
+    assert response.status_code == 200
+    assert "attachment" in response.headers["content-disposition"]
+    assert response.text.strip()
+
+def test_request_timing_is_labelled_by_route_template(enabled):
+    """Test that request latency labels use route templates, not raw paths"""
+    timed = FastAPI()
+    timed.middleware("http")(time_requests)
+
+    @timed.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"item_id": item_id}
+
+    before = stage_count("request:/items/{item_id}"), stage_count("request:unmatched")
+    timed_client = TestClient(timed)
+    for path in ("/items/1", "/items/2", "/no/such/path"):
+        timed_client.get(path)
+    assert stage_count("request:/items/{item_id}") == before[0] + 2
+    assert stage_count("request:unmatched") == before[1] + 1
+    assert stage_count("request:/items/1") == 0
+
+def test_event_loop_lag_monitor():
+    """Test that a blocked event loop shows up as lag"""
+    async def scenario():
+        monitor = EventLoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0)
+        time.sleep(0.1)  # block the loop past the scheduled wakeup
+        await asyncio.sleep(0.005)  # let the overdue wakeup run, but not the next one
+        lag = REGISTRY.get_sample_value("drift_event_loop_lag_seconds")
+        await monitor.stop()
+        return lag
+
+    assert asyncio.run(scenario()) >= 0.05
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the compiled linear scoring path
+"""
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from feature_encoding import FEATURE_COLUMNS, encode_rows
+from linear_scorer import CompiledLinearModel, compile_model, sample_rows, verify_compiled_model
+
+@pytest.fixture
+def model():
+    rows = sample_rows(300, seed=3)
+    X = encode_rows(rows)
+    y = (X[:, 0] / 80 + X[:, FEATURE_COLUMNS.index("tech_support_no")] > 1.0).astype(int)
+    return LogisticRegression(max_iter=1000).fit(X, y)
+
+def test_compiled_scores_match_sklearn(model):
+    """Test that batch and single-row scores agree with predict_proba"""
+    compiled = compile_model(model)
+    rows = sample_rows(100, seed=4)
+    expected = model.predict_proba(encode_rows(rows))[:, 1]
+
+    np.testing.assert_allclose(compiled.score_batch(rows), expected, atol=1e-12)
+    np.testing.assert_allclose([compiled.score_row(row) for row in rows], expected, atol=1e-12)
+
+def test_float32_scorer_within_tolerance(model):
+    """Test the float32 path against sklearn at a looser tolerance"""
+    compiled = compile_model(model, dtype=np.float32)
+    assert compiled.score_batch(sample_rows(10)).dtype == np.float32
+    assert verify_compiled_model(compiled, model, sample_rows(200, seed=5)) < 1e-4
+
+def test_batch_buffer_grows(model):
+    """Test that batches larger than the preallocated buffer are scored"""
+    compiled = compile_model(model, max_batch_size=4)
+    rows = sample_rows(10, seed=6)
+    expected = model.predict_proba(encode_rows(rows))[:, 1]
+    np.testing.assert_allclose(compiled.score(rows), expected, atol=1e-12)
+    assert compiled.max_batch_size >= 10
+
+def test_missing_and_unseen_values(model):
+    """Test that missing values and unseen categories score like the one-hot encoding"""
+    rows = [{"age": 30, "contract_length": "lifetime"}, {}]
+    expected = model.predict_proba(encode_rows(rows))[:, 1]
+    compiled = compile_model(model)
+    np.testing.assert_allclose(compiled.score(rows), expected, atol=1e-12)
+
+def test_rejects_non_linear_models():
+    """Test that models without linear weights are not compiled"""
+    X = encode_rows(sample_rows(50))
+    tree = DecisionTreeClassifier().fit(X, np.arange(50) % 2)
+    with pytest.raises(TypeError):
+        CompiledLinearModel.from_estimator(tree)
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Unit tests for delayed-label performance monitoring
+"""
+import math
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import drift_detector
+from drift_detector import app
+from performance_monitor import PendingPredictionIndex, PerformanceMonitor, PerformanceTracker
+
+def test_index_join_and_expiry():
+    """Test that entries join once and expire after the TTL"""
+    index = PendingPredictionIndex(capacity=10, ttl_seconds=60)
+    index.add("a", "v1", 0.9, timestamp=1000)
+    index.add("b", "v1", 0.2, timestamp=1030)
+
+    assert index.pop("a") == ("v1", pytest.approx(0.9), 1000.0)
+    assert index.pop("a") is None
+
+    assert index.expire(now=1100) == 1
+    assert index.pop("b") is None
+    assert len(index) == 0
+
+def test_index_is_bounded():
+    """Test that the oldest pending entries are dropped at capacity"""
+    index = PendingPredictionIndex(capacity=3, ttl_seconds=1e9)
+    for i in range(5):
+        index.add(f"p{i}", "v1", 0.5, timestamp=i)
+
+    assert len(index) == 3
+    assert index.dropped == 2
+    assert index.pop("p0") is None
+    assert index.pop("p4") is not None
+
+def test_index_reuses_slots_after_join():
+    """Test that joined entries free their slots as the ring wraps"""
+    index = PendingPredictionIndex(capacity=2, ttl_seconds=1e9)
+    for i in range(10):
+        index.add(f"p{i}", "v1", 0.5, timestamp=i)
+        assert index.pop(f"p{i}") is not None
+    assert index.dropped == 0
+
+def test_index_joined_slots_do_not_evict_live_entries():
+    """Test that interleaved joins at capacity never evict while fewer than capacity are pending"""
+    index = PendingPredictionIndex(capacity=4, ttl_seconds=1e9)
+    for i in range(4):
+        index.add(f"p{i}", "v1", 0.5, timestamp=i)
+
+    # Keep the oldest entry pending while joins and adds churn the slots behind it
+    for i in range(4, 40):
+        assert index.pop(f"p{i - 3}") is not None
+        index.add(f"p{i}", "v1", 0.5, timestamp=i)
+        assert len(index) == 4
+    assert index.dropped == 0
+    assert index.pop("p0") == ("v1", pytest.approx(0.5), 0.0)
+    for i in range(37, 40):
+        assert index.pop(f"p{i}") is not None
+
+    # Once capacity entries are pending, the oldest live one goes
+    for i in range(40, 45):
+        index.add(f"p{i}", "v1", 0.5, timestamp=i)
+    assert len(index) == 4
+    assert index.dropped == 1
+    assert index.pop("p40") is None
+    assert index.pop("p44") is not None
+
+def test_tracker_rolling_metrics():
+    """Test confusion-matrix metrics over the rolling window"""
+    tracker = PerformanceTracker(bucket_seconds=60, retention_buckets=10)
+    now = 6000
+    outcomes = [(0.9, 1), (0.8, 1), (0.7, 0), (0.2, 1), (0.1, 0)]
+    for probability, label in outcomes:
+        tracker.record("v1", probability, label, now)
+    # Outside the rolling window
+    tracker.record("v1", 0.9, 0, now - 3600)
+
+    summary = tracker.rolling("v1", n_buckets=5, now=now)
+    assert summary["confusion_matrix"] == {"tp": 2, "fp": 1, "tn": 1, "fn": 1}
+    assert summary["accuracy"] == pytest.approx(0.6)
+    assert summary["precision"] == pytest.approx(2 / 3)
+    assert summary["recall"] == pytest.approx(2 / 3)
+    assert 0.0 <= summary["expected_calibration_error"] <= 1.0
+
+def test_tracker_prunes_old_buckets():
+    """Test that buckets beyond retention are discarded"""
+    tracker = PerformanceTracker(bucket_seconds=60, retention_buckets=2)
+    tracker.record("v1", 0.9, 1, 0)
+    tracker.record("v1", 0.9, 1, 600)
+    assert len(tracker.confusion) == 1
+
+def test_monitor_joins_labels():
+    """Test the prediction -> label join path"""
+    monitor = PerformanceMonitor(index=PendingPredictionIndex(capacity=100))
+    monitor.record_predictions("v1", ["a", "b", "c"], [0.9, 0.1, 0.6])
+    result = monitor.record_labels([("a", 1), ("b", 0), ("zzz", 1)])
+
+    assert result == {"matched": 2, "unmatched": 1}
+    assert len(monitor.index) == 1
+    assert monitor.summary()["models"][0]["accuracy"] == 1.0
+
+def test_late_labels_count_in_rolling_window():
+    """Test that outcomes are bucketed by label arrival, not prediction time"""
+    monitor = PerformanceMonitor(index=PendingPredictionIndex(capacity=100),
+                                 tracker=PerformanceTracker(bucket_seconds=60, retention_buckets=10))
+    monitor.record_predictions("v-late", ["old"], [0.9], timestamp=time.time() - 3 * 24 * 3600)
+    monitor.record_labels([("old", 1)])
+
+    summary = monitor.tracker.rolling("v-late", n_buckets=1)
+    assert summary["labeled_predictions"] == 1
+    assert summary["accuracy"] == 1.0
+    assert len(monitor.tracker.confusion) == 1
+
+def test_undefined_metrics_are_not_exported_as_zero():
+    """Test that metrics without outcomes are None in summaries and NaN in Prometheus"""
+    monitor = PerformanceMonitor(index=PendingPredictionIndex(capacity=100))
+    summary = monitor.tracker.rolling("v-empty")
+    assert summary["labeled_predictions"] == 0
+    assert summary["accuracy"] is None and summary["precision"] is None and summary["recall"] is None
+
+    monitor.export("v-empty")
+    for metric in ("accuracy", "precision", "recall"):
+        value = REGISTRY.get_sample_value("model_online_performance", {"model_version": "v-empty", "metric": metric})
+        assert math.isnan(value)
+
+    # Only negative predictions: precision is undefined, recall is 0 of 1 positive
+    monitor.record_predictions("v-neg", ["a", "b"], [0.1, 0.2])
+    monitor.record_labels([("a", 0), ("b", 1)])
+    summary = monitor.tracker.rolling("v-neg")
+    assert summary["precision"] is None and summary["recall"] == 0.0 and summary["accuracy"] == 0.5
+
+def test_feedback_endpoint(monkeypatch):
+    """Test the feedback and performance endpoints"""
+    monitor = PerformanceMonitor(index=PendingPredictionIndex(capacity=100))
+    monkeypatch.setattr(drift_detector.performance_monitor, "index", monitor.index)
+    monkeypatch.setattr(drift_detector.performance_monitor, "tracker", monitor.tracker)
+    monitor.record_predictions("v-test", ["p1"], [0.8])
+
+    client = TestClient(app)
+    response = client.post("/monitor/feedback", json={"labels": [
+        {"prediction_id": "p1", "label": 1},
+        {"prediction_id": "p2", "label": 0}
+    ]})
+    assert response.status_code == 200
+    assert response.json() == {"matched": 1, "unmatched": 1}
+
+    data = client.get("/monitor/performance").json()
+    assert data["models"][0]["model_version"] == "v-test"
+    assert data["models"][0]["recall"] == 1.0
+
+    response = client.post("/monitor/feedback", json={"labels": [{"prediction_id": "p3", "label": 2}]})
+    assert response.status_code == 422
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Unit tests for offline drift replay and threshold backtesting
+"""
+import os
+import sys
+import json
+import subprocess
+
+import numpy as np
+import pytest
+
+import drift_detector
+from drift_detector import detect_drift_batch
+from replay import (parse_thresholds, parse_timestamp, read_run, replay, spill_partitions,
+                    summarize_timeline)
+
+SAMPLE_BASELINE = {"features": {
+    "age": {"values": np.linspace(25, 65, 401).tolist()},
+    "product_category": {"distribution": {"basic": 0.3, "standard": 0.4, "premium": 0.2, "enterprise": 0.1}}
+}}
+CONFIGS = [parse_thresholds("lenient=0.5:1.0"), parse_thresholds("sensitive=0.2:0.4")]
+START = 1_700_000_040.0
+
+@pytest.fixture(autouse=True)
+def baseline(monkeypatch):
+    monkeypatch.setattr(drift_detector, "baseline_data", SAMPLE_BASELINE)
+
+def make_records(model_version, minutes, shift_after, seed):
+    """One record every 2 seconds; ages drift upwards after shift_after minutes"""
+    rng = np.random.RandomState(seed)
+    records = []
+    for i in range(minutes * 30):
+        age = rng.uniform(25, 65) + (15 if i >= shift_after * 30 else 0)
+        records.append({"features": {"age": round(age, 1)},
+                        "model_version": model_version,
+                        "timestamp": START + 2 * i})
+    return records
+
+def write_jsonl(path, records):
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return str(path)
+
+def test_parse_thresholds_and_timestamps():
+    """Test threshold configuration and timestamp parsing"""
+    assert parse_thresholds("strict=0.1:0.3") == {"name": "strict", "warning": 0.1, "critical": 0.3}
+    assert parse_thresholds("0.2:0.5")["name"] == "0.2:0.5"
+    with pytest.raises(ValueError):
+        parse_thresholds("0.5:0.2")
+    assert parse_timestamp("2023-05-01T12:00:00Z") == parse_timestamp("2023-05-01T12:00:00") == 1682942400.0
+    assert parse_timestamp(1682942400) == 1682942400.0
+
+def test_replay_timeline_matches_window_scoring(tmp_path):
+    """Test that every timeline point scores the rows of its window, per model version"""
+    records = make_records("v1", 10, 5, seed=0) + make_records("v2", 4, 99, seed=1)
+    path = write_jsonl(tmp_path / "log.jsonl", records[::-1])
+    timeline = replay([path], SAMPLE_BASELINE, CONFIGS, bucket_seconds=60, window_buckets=3, workers=1)
+
+    v1 = [point for point in timeline if point["model_version"] == "v1"]
+    assert len(v1) == 10 and len(timeline) == 14
+    window_rows = [r["features"] for r in records if r["model_version"] == "v1"][7 * 30:10 * 30]
+    assert v1[-1]["observations"] == len(window_rows)
+    assert v1[-1]["feature_scores"] == pytest.approx(detect_drift_batch(window_rows)["feature_scores"])
+
+def test_threshold_sweep_and_summary(tmp_path):
+    """Test that all configurations are classified in one pass and summarized"""
+    path = write_jsonl(tmp_path / "log.jsonl", make_records("v1", 12, 6, seed=2))
+    timeline = replay([path], SAMPLE_BASELINE, CONFIGS, bucket_seconds=60, window_buckets=3, workers=1)
+    for point in timeline:
+        assert set(point["severity"]) == {"lenient", "sensitive"}
+
+    summary = summarize_timeline(timeline, CONFIGS)
+    sensitive, lenient = summary["sensitive"]["v1"], summary["lenient"]["v1"]
+    assert sensitive["windows"] == 12
+    assert sensitive["warning"] + sensitive["critical"] >= lenient["warning"] + lenient["critical"]
+    assert sensitive["alert_episodes"] >= lenient["alert_episodes"] >= 1
+    # Past the first (small) window, nothing alerts until the shift fills the window
+    assert all(point["severity"]["lenient"] == "none" for point in timeline[1:6])
+    assert all(point["severity"] == {"lenient": "critical", "sensitive": "critical"} for point in timeline[8:])
+
+def test_process_pool_matches_inline(tmp_path):
+    """Test that partitioned replay across worker processes gives the same timeline"""
+    records = make_records("v1", 6, 3, seed=3) + make_records("v2", 6, 99, seed=4)
+    path = write_jsonl(tmp_path / "log.jsonl", records)
+    inline = replay([path], SAMPLE_BASELINE, CONFIGS, bucket_seconds=60, window_buckets=3, workers=1)
+    pooled = replay([path], SAMPLE_BASELINE, CONFIGS, bucket_seconds=60, window_buckets=3, workers=2)
+    assert pooled == inline
+
+def test_partitions_are_spilled_in_one_pass_and_merged_in_time_order(tmp_path):
+    """Test that versions are split into sorted spill runs and replay matches across files and workers"""
+    v1, v2 = make_records("v1", 4, 2, seed=7), make_records("v2", 4, 99, seed=8)
+    paths = [write_jsonl(tmp_path / "a.jsonl", v1[60:][::-1] + [{"features": {"age": 30}}]),
+             write_jsonl(tmp_path / "b.jsonl", v2),
+             write_jsonl(tmp_path / "c.jsonl", v1[:60])]
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    runs, counts, invalid = spill_partitions(paths, str(spill_dir), spill_rows=25)
+    assert counts == {"v1": 120, "v2": 120} and invalid == 1
+    assert len(runs["v1"]) == len(runs["v2"]) == 5
+    for run in runs["v1"]:
+        timestamps = [timestamp for timestamp, _ in read_run(run)]
+        assert timestamps == sorted(timestamps)
+
+    combined = write_jsonl(tmp_path / "all.jsonl", v1 + v2)
+    expected = replay([combined], SAMPLE_BASELINE, CONFIGS, bucket_seconds=60, window_buckets=3, workers=1)
+    assert replay(paths, SAMPLE_BASELINE, CONFIGS, bucket_seconds=60, window_buckets=3, workers=2,
+                  spill_rows=25) == expected
+
+def test_replay_does_not_import_the_service():
+    """Test that replay workers only load the scoring and window modules"""
+    code = "import sys, replay; print('drift_detector' in sys.modules, 'inference' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert output.split() == ["False", "False"]
+
+def test_parquet_and_flat_records(tmp_path):
+    """Test Parquet logs with features as top-level columns"""
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    records = make_records("v1", 3, 99, seed=5)
+    flat = [{**r["features"], "model_version": r["model_version"], "timestamp": r["timestamp"]} for r in records]
+    pq.write_table(pa.Table.from_pylist(flat), str(tmp_path / "log.parquet"))
+
+    expected = replay([write_jsonl(tmp_path / "log.jsonl", records)], SAMPLE_BASELINE, CONFIGS,
+                      bucket_seconds=60, window_buckets=3, workers=1)
+    assert replay([str(tmp_path / "log.parquet")], SAMPLE_BASELINE, CONFIGS,
+                  bucket_seconds=60, window_buckets=3, workers=1) == expected
+
+def test_invalid_records_are_skipped(tmp_path):
+    """Test that records without a model version or timestamp do not stop the replay"""
+    records = make_records("v1", 2, 99, seed=6) + [{"features": {"age": 30}}, {"model_version": "v1",
+                                                                                "timestamp": "yesterday"}]
+    timeline = replay([write_jsonl(tmp_path / "log.jsonl", records)], SAMPLE_BASELINE, CONFIGS,
+                      bucket_seconds=60, window_buckets=3, workers=1)
+    assert [point["observations"] for point in timeline] == [30, 60]
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Unit tests for adaptive ingestion sampling
+"""
+import random
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import drift_detector
+from drift_detector import app
+from sampling import IngestionSampler, LoadMonitor, parse_rates
+from window_state import WindowAccumulator
+
+class FixedLoad:
+    """Load monitor stub reporting a settable pressure"""
+    def __init__(self, pressure=0.0):
+        self.value = pressure
+
+    def pressure(self):
+        return {"cpu": self.value, "queue": 0.0, "loop_lag": 0.0, "memory": 0.0}
+
+    def record_loop_lag(self, seconds):
+        pass
+
+def make_sampler(**kwargs):
+    kwargs.setdefault("rates", {})
+    return IngestionSampler(load=FixedLoad(), rng=random.Random(0), **kwargs)
+
+def category_stream(n, seed=1):
+    rng = random.Random(seed)
+    return [{"product_category": "enterprise" if rng.random() < 0.05 else "basic", "age": 40}
+            for _ in range(n)]
+
+def test_parse_rates():
+    """Test per-model-version rate parsing"""
+    assert parse_rates("v1=0.5, v2.0=0.1") == {"v1": 0.5, "v2.0": 0.1}
+    assert parse_rates("") == {}
+
+def test_probabilistic_sampling_is_unbiased():
+    """Test that kept weights estimate the full count, per model version"""
+    sampler = make_sampler(mode="probabilistic", rate=1.0, rates={"v-low": 0.1})
+    weights = [sampler.sample("v-low", {}) for _ in range(20000)]
+    kept = [w for w in weights if w]
+    assert len(kept) == pytest.approx(2000, rel=0.1)
+    assert all(w == pytest.approx(10.0) for w in kept)
+    assert sum(kept) == pytest.approx(20000, rel=0.1)
+    assert all(sampler.sample("v-full", {}) == 1.0 for _ in range(100))
+
+def test_stratified_sampling_keeps_rare_categories():
+    """Test that rare strata are oversampled while weighted counts stay unbiased"""
+    sampler = make_sampler(mode="stratified", rate=0.1)
+    rows = category_stream(40000)
+    for row in rows[:2000]:
+        sampler.sample("v1", row)
+    sampler.refresh_strata()
+
+    kept, weighted = Counter(), Counter()
+    for row in rows[2000:]:
+        weight = sampler.sample("v1", row)
+        if weight:
+            kept[row["product_category"]] += 1
+            weighted[row["product_category"]] += weight
+
+    truth = Counter(row["product_category"] for row in rows[2000:])
+    assert kept["enterprise"] / truth["enterprise"] > 5 * kept["basic"] / truth["basic"]
+    for category in truth:
+        assert weighted[category] == pytest.approx(truth[category], rel=0.15)
+
+def test_reservoir_is_bounded_and_weighted():
+    """Test that reservoirs keep at most their capacity and weights sum to the stream size"""
+    sampler = make_sampler(mode="reservoir", reservoir_size=50)
+    for i in range(1000):
+        assert sampler.sample("v1", {"age": i}) == 0.0
+
+    [(model_version, rows, weights)] = sampler.drain()
+    assert model_version == "v1" and len(rows) == 50
+    assert sum(weights) == pytest.approx(1000)
+    assert sampler.drain() == []
+
+def test_adaptive_shedding_and_recovery():
+    """Test multiplicative decrease under pressure and additive recovery"""
+    sampler = make_sampler(mode="probabilistic", rate=0.5, min_rate=0.01, recovery_step=0.25)
+    sampler.load.value = 4.0
+    sampler.adjust()
+    assert sampler.scale == pytest.approx(0.5)
+    assert sampler.rate("v1") == pytest.approx(0.25)
+
+    for _ in range(20):
+        sampler.adjust()
+    assert sampler.rate("v1") == pytest.approx(0.01)
+
+    sampler.load.value = 0.5
+    sampler.adjust()
+    assert sampler.scale == pytest.approx(0.26)  # recovers from the min_rate floor
+    for _ in range(10):
+        sampler.adjust()
+    assert sampler.scale == 1.0
+
+def test_flat_rss_over_target_lets_rates_recover():
+    """Test that memory sheds only while RSS grows, so a plateau does not pin the floor"""
+    rss = [200 * 2 ** 20]
+    load = LoadMonitor(cpu_target=1e9, memory_target_mb=100, memory_growth_mb=8, rss=lambda: rss[0])
+    sampler = IngestionSampler(rates={}, rate=1.0, min_rate=0.01, recovery_step=0.25, load=load,
+                               rng=random.Random(0))
+    assert sampler.adjust()["memory"] == pytest.approx(2.0)
+    assert sampler.scale == pytest.approx(0.5)
+
+    for _ in range(2):
+        sampler.adjust()
+    assert sampler.scale == 1.0
+
+    rss[0] = 240 * 2 ** 20
+    sampler.adjust()
+    assert sampler.scale == pytest.approx(0.5)
+
+def test_slow_rss_growth_past_target_keeps_shedding():
+    """Test that a leak growing less than the growth step per interval still reports pressure"""
+    rss = [90 * 2 ** 20]
+    load = LoadMonitor(cpu_target=1e9, memory_target_mb=100, memory_growth_mb=8, rss=lambda: rss[0])
+    pressured = []
+    for _ in range(40):
+        rss[0] += 2 ** 20
+        pressured.append(load.pressure()["memory"] > 1.0)
+    # Fires when crossing the target, then whenever RSS has grown by more than 8MB since it last fired
+    assert [i for i, fired in enumerate(pressured) if fired] == [10, 19, 28, 37]
+
+def test_event_loop_lag_is_a_shedding_signal():
+    """Test that a late sampler wake-up counts as pressure relative to its target"""
+    load = LoadMonitor(lag_target_ms=100, rss=lambda: 0)
+    load.record_loop_lag(0.3)
+    assert load.pressure()["loop_lag"] == pytest.approx(3.0)
+    load.record_loop_lag(-0.01)
+    assert load.pressure()["loop_lag"] == 0.0
+
+def test_weighted_window_estimates_full_traffic():
+    """Test that a sampled drift window estimates the unsampled window"""
+    sampler = make_sampler(mode="stratified", rate=0.2)
+    full, sampled = WindowAccumulator(), WindowAccumulator()
+    rows = category_stream(20000, seed=2)
+    for row in rows[:1000]:
+        sampler.sample("v1", row)
+    sampler.refresh_strata()
+    for row in rows:
+        full.add_categories("product_category", [row["product_category"]])
+        weight = sampler.sample("v1", row)
+        if weight:
+            sampled.add_categories("product_category", [row["product_category"]], [weight])
+
+    for category, count in full.categories["product_category"].items():
+        assert sampled.categories["product_category"][category] == pytest.approx(count, rel=0.15)
+
+def test_skipped_requests_are_still_counted(monkeypatch):
+    """Test that shed observations skip scoring but keep counters exact"""
+    monkeypatch.setattr(drift_detector, "ingestion_sampler", make_sampler(rate=0.0, min_rate=0.0))
+    counter = lambda: REGISTRY.get_sample_value("model_predictions_total", {"model_version": "v-shed"}) or 0.0
+    before = counter()
+
+    response = TestClient(app).post("/monitor/predict", json={
+        "features": {"age": 35, "product_category": "premium"},
+        "model_version": "v-shed",
+        "timestamp": "2023-05-01T12:00:00Z"
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sampled"] is False and data["severity"] == "skipped"
+    assert counter() == before + 1
+
+    result = drift_detector.monitor_batch("v-shed", [{"age": 35}] * 4)
+    assert result["sampled"] is False
+    assert counter() == before + 5
+
+def test_sampled_batch_alerts_carry_sample_weights(monkeypatch):
+    """Test that a sampled inference batch counts alerts by its summed sample weights"""
+    monkeypatch.setattr(drift_detector, "baseline_data", {"features": {"age": {"values": [25, 35, 45, 55]}}})
+    sampler = make_sampler(rate=0.25)
+    kept = []
+    sample_batch = sampler.sample_batch
+    monkeypatch.setattr(sampler, "sample_batch", lambda *args: kept.append(sample_batch(*args)) or kept[-1])
+    monkeypatch.setattr(drift_detector, "ingestion_sampler", sampler)
+    alerts = lambda: sum(REGISTRY.get_sample_value("model_drift_alerts_total",
+                                                   {"model_version": "v-weighted", "severity": severity}) or 0.0
+                         for severity in ("warning", "critical"))
+    before = alerts()
+
+    result = drift_detector.monitor_batch("v-weighted", [{"age": 90}] * 200)
+    [(rows, weights)] = kept
+    assert result["drift_detected"] and 0 < len(rows) < 200
+    assert alerts() - before == pytest.approx(sum(weights))
+    assert sum(weights) == pytest.approx(len(rows) * 4)
+
+def test_reservoir_flush_scores_deferred_rows(monkeypatch):
+    """Test that drained reservoirs are scored with their weights"""
+    monkeypatch.setattr(drift_detector, "baseline_data", {"features": {"age": {"values": [25, 35, 45, 55]}}})
+    sampler = make_sampler(mode="reservoir", reservoir_size=10)
+    for i in range(100):
+        sampler.sample("v-reservoir", {"age": 20 + i % 40})
+
+    for model_version, rows, weights in sampler.drain():
+        result = drift_detector.process_observations(model_version, rows, weights)
+        assert "age" in result["feature_scores"]
+
+    window = drift_detector.drift_window
+    buckets = window.state["v-reservoir"]
+    assert sum(b.moments["age"][0] for b in buckets.values()) == pytest.approx(100)
+
+def test_unknown_mode_is_rejected():
+    """Test that configuration errors surface at construction"""
+    with pytest.raises(ValueError):
+        make_sampler(mode="systematic")
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Unit tests for mergeable window state, fleet drift aggregation, slices and data quality
+"""
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import drift_detector
+from baseline_compiler import build_cache
+from drift_detector import app, detect_drift_batch, score_quality, score_slices, score_window
+from drift_scoring import calculate_psi_counts, calculate_psi_matrix
+from window_state import (OTHER_CATEGORY, DriftWindow, SnapshotAggregator, bin_counts,
+                          build_window_router, decode_snapshot, merge_snapshots)
+
+SAMPLE_BASELINE = {"features": {
+    "age": {"values": [25, 30, 35, 40, 45, 50, 55, 60, 65]},
+    "income": {"values": [30000, 40000, 50000, 60000, 70000, 80000, 90000, 100000]},
+    "product_category": {"distribution": {"basic": 0.3, "standard": 0.4, "premium": 0.2, "enterprise": 0.1}}
+}}
+SLICED_BASELINE = {**SAMPLE_BASELINE, "slices": {"dimensions": ["product_category"], "min_observations": 10}}
+NOW = 1_700_000_000.0
+
+@pytest.fixture(autouse=True)
+def baseline(monkeypatch):
+    monkeypatch.setattr(drift_detector, "baseline_data", SAMPLE_BASELINE)
+
+def make_window(pod="pod", baseline=None, slicing=None):
+    cache = build_cache(baseline or SAMPLE_BASELINE)
+    return DriftWindow(lambda: cache, lambda: ["product_category"], lambda: slicing or {},
+                       bucket_seconds=60, buckets=5, pod=pod)
+
+def sample_rows(n, seed):
+    rng = np.random.RandomState(seed)
+    categories = ["basic", "standard", "premium", "enterprise", "unknown"]
+    return [{
+        "age": int(rng.randint(15, 80)),
+        "income": float(rng.uniform(20000, 120000)),
+        "product_category": categories[rng.randint(len(categories))]
+    } for _ in range(n)]
+
+def test_bin_counts_matches_histogram():
+    """Test that binning matches np.histogram, including edges and out-of-range values"""
+    edges = np.histogram_bin_edges([25, 30, 65], bins=10)
+    values = np.array([10.0, 25.0, 29.0, 65.0, 64.9, 70.0, 45.0])
+    np.testing.assert_array_equal(bin_counts(edges, values), np.histogram(values, bins=edges)[0])
+
+def test_scalar_and_batch_paths_agree():
+    """Test that single-row recording builds the same state as batch recording"""
+    rows = sample_rows(50, seed=0)
+    scalar, batch = make_window(), make_window()
+    for row in rows:
+        scalar.record("v1", [row], now=NOW)
+    batch.record("v1", rows, now=NOW)
+
+    a, b = scalar.state["v1"][scalar.bucket_start(NOW)], batch.state["v1"][batch.bucket_start(NOW)]
+    for name in a.counts:
+        np.testing.assert_array_equal(a.counts[name], b.counts[name])
+        np.testing.assert_allclose(a.moments[name], b.moments[name])
+    assert a.categories == b.categories
+
+def test_fleet_merge_equals_single_pod():
+    """Test that merging several pods' snapshots equals one pod that saw all traffic"""
+    rows = sample_rows(300, seed=1)
+    pods = [make_window(f"pod-{i}") for i in range(3)]
+    for i, row in enumerate(rows):
+        pods[i % 3].record("v1", [row], now=NOW + i % 120)
+
+    snapshots = [decode_snapshot(pod.snapshot(now=NOW + 120)) for pod in pods]
+    merged = merge_snapshots(snapshots, pods[0].window_start(NOW + 120))
+
+    assert merged["v1"].observations == len(rows)
+    fleet = score_window(merged["v1"])
+    expected = detect_drift_batch(rows)
+    assert fleet["feature_scores"] == pytest.approx(expected["feature_scores"])
+    assert fleet["severity"] == expected["severity"]
+
+def test_snapshot_versioning():
+    """Test that snapshots carry a format marker and version"""
+    data = make_window().snapshot(now=NOW)
+    assert decode_snapshot(data).models == {}
+    with pytest.raises(ValueError):
+        decode_snapshot(b"XYZ" + data[3:])
+    with pytest.raises(ValueError):
+        decode_snapshot(data[:3] + bytes([99]) + data[4:])
+
+def test_old_buckets_are_evicted():
+    """Test that buckets older than the window are dropped"""
+    window = make_window()
+    window.record("v1", sample_rows(5, seed=2), now=NOW)
+    window.record("v1", sample_rows(5, seed=3), now=NOW + 10 * 60)
+    assert list(window.state["v1"]) == [window.bucket_start(NOW + 10 * 60)]
+
+def test_window_resets_on_baseline_change():
+    """Test that counts binned against an old baseline are discarded"""
+    caches = [build_cache(SAMPLE_BASELINE)]
+    window = DriftWindow(lambda: caches[0], lambda: [], bucket_seconds=60, buckets=5)
+    window.record("v1", sample_rows(5, seed=4), now=NOW)
+    fingerprint = window.fingerprint
+
+    caches[0] = build_cache({"features": {"age": {"values": [1, 2, 3]}}})
+    window.record("v2", sample_rows(5, seed=5), now=NOW)
+    assert window.fingerprint != fingerprint
+    assert list(window.state) == ["v2"]
+
+def test_aggregator_pulls_several_instances():
+    """Test fleet aggregation over HTTP across several local instances"""
+    rows = sample_rows(90, seed=6)
+    pods = [make_window(f"pod-{i}") for i in range(3)]
+    for i, row in enumerate(rows):
+        pods[i % 3].record("v1", [row])
+
+    other_baseline = {"features": {"age": {"values": [1, 2, 3]}}}
+    incompatible = make_window("pod-old", baseline=other_baseline)
+    incompatible.record("v1", sample_rows(5, seed=7))
+
+    mounts = {}
+    for window in pods + [incompatible]:
+        instance = FastAPI()
+        instance.include_router(build_window_router(window, None, score_window))
+        mounts[f"http://{window.pod}"] = httpx.ASGITransport(app=instance)
+    peers = list(mounts) + ["http://pod-down"]
+    mounts["http://pod-down"] = httpx.MockTransport(lambda request: httpx.Response(503))
+
+    async def scenario():
+        client = httpx.AsyncClient(mounts=mounts)
+        aggregator = SnapshotAggregator(make_window("aggregator"), peers=peers, client=client)
+        try:
+            return await aggregator.aggregate(score_window)
+        finally:
+            await aggregator.close()
+
+    result = asyncio.run(scenario())
+    assert sorted(result["pods"]) == ["pod-0", "pod-1", "pod-2"]
+    assert [item["pod"] for item in result["skipped"]] == ["pod-old"]
+    assert [item["peer"] for item in result["failed"]] == ["http://pod-down"]
+    assert result["models"]["v1"]["observations"] == len(rows)
+    assert result["models"]["v1"]["feature_scores"] == pytest.approx(detect_drift_batch(rows)["feature_scores"])
+
+def test_service_snapshot_endpoint():
+    """Test that monitored requests land in the service snapshot"""
+    client = TestClient(app)
+    response = client.post("/monitor/predict", json={
+        "features": {"age": 35, "income": 75000.0, "product_category": "premium"},
+        "model_version": "v-window",
+        "timestamp": "2023-05-01T12:00:00Z"
+    })
+    assert response.status_code == 200
+
+    response = client.get("/monitor/window/snapshot")
+    assert response.status_code == 200
+    snapshot = decode_snapshot(response.content)
+    assert snapshot.baseline == drift_detector.drift_window.fingerprint
+    merged = merge_snapshots([snapshot], 0)
+    assert merged["v-window"].categories["product_category"]["premium"] >= 1
+
+    assert client.get("/monitor/fleet/drift").status_code == 404
+
+def test_psi_matrix_matches_rowwise_psi():
+    """Test that the vectorized (slices x bins) PSI equals per-slice PSI"""
+    rng = np.random.RandomState(8)
+    expected = rng.dirichlet(np.ones(10))
+    counts = rng.randint(0, 50, size=(6, 10)).astype(float)
+    totals = counts.sum(axis=1) + np.array([0, 3, 0, 1, 0, 0])
+    counts[4] = totals[4] = 0
+    psi = calculate_psi_matrix(expected, counts, totals)
+    assert psi == pytest.approx([calculate_psi_counts(expected, c, t) for c, t in zip(counts, totals)])
+
+def test_slices_match_filtered_batches(monkeypatch):
+    """Test that per-slice window drift equals drift of each slice's rows, on both record paths"""
+    monkeypatch.setattr(drift_detector, "baseline_data", SLICED_BASELINE)
+    rows = sample_rows(400, seed=9)
+    scalar = make_window(slicing={"dimensions": ["product_category"]})
+    batch = make_window(slicing={"dimensions": ["product_category"]})
+    for row in rows:
+        scalar.record("v1", [row], now=NOW)
+    batch.record("v1", rows, now=NOW)
+
+    for window in (scalar, batch):
+        slices = score_slices(window.merged(now=NOW)["v1"])["product_category"]
+        assert set(slices) == {"basic", "standard", "premium", "enterprise", "unknown"}
+        for label, result in slices.items():
+            subset = [row for row in rows if row["product_category"] == label]
+            expected = detect_drift_batch([{k: v for k, v in row.items() if k != "product_category"}
+                                           for row in subset])
+            assert result["observations"] == len(subset)
+            assert result["feature_scores"] == pytest.approx(expected["feature_scores"])
+
+def test_slice_cardinality_cap():
+    """Test that slice values beyond the cap share the overflow row"""
+    window = make_window(slicing={"dimensions": ["region"], "max_values": 3})
+    rows = [{"age": 30, "region": f"r{i % 10}"} for i in range(100)]
+    window.record("v1", rows, now=NOW)
+    window.record("v1", [{"age": 30, "region": "r-new"}], now=NOW)
+    slices = window.merged(now=NOW)["v1"].slices["region"]
+    assert slices.labels == ["r0", "r1", "r2", OTHER_CATEGORY]
+    counts, totals = slices.view("age")
+    assert totals.tolist() == [10, 10, 10, 71]
+    assert counts.shape == (4, 10)
+
+def test_slices_survive_snapshot_merge():
+    """Test that fleet merging keeps slices, even when pods saw values in different orders"""
+    slicing = {"dimensions": ["product_category"]}
+    rows = sample_rows(300, seed=10)
+    pods = [make_window(f"pod-{i}", slicing=slicing) for i in range(3)]
+    single = make_window(slicing=slicing)
+    for i, row in enumerate(rows):
+        pods[i % 3].record("v1", [row], now=NOW)
+    single.record("v1", rows, now=NOW)
+
+    snapshots = [decode_snapshot(pod.snapshot(now=NOW)) for pod in pods]
+    merged = merge_snapshots(snapshots, pods[0].window_start(NOW))["v1"].slices["product_category"]
+    expected = single.merged(now=NOW)["v1"].slices["product_category"]
+    for label in expected.labels:
+        for name in ("age", "income"):
+            np.testing.assert_allclose(merged.view(name)[0][merged.index[label]],
+                                       expected.view(name)[0][expected.index[label]])
+
+def test_slice_baseline_overrides_and_minimum(monkeypatch):
+    """Test per-slice baselines and that small slices are not scored"""
+    baseline = {
+        "features": {"age": {"values": list(range(20, 70))}},
+        "slices": {"dimensions": ["segment"], "min_observations": 20,
+                   "baselines": {"segment": {"senior": {"age": {"values": list(range(60, 70))}}}}}
+    }
+    monkeypatch.setattr(drift_detector, "baseline_data", baseline)
+    window = make_window(baseline=baseline, slicing={"dimensions": ["segment"]})
+    rows = ([{"age": 60 + i % 10, "segment": "senior"} for i in range(100)]
+            + [{"age": 60 + i % 10, "segment": "general"} for i in range(100)]
+            + [{"age": 30, "segment": "tiny"} for _ in range(5)])
+    window.record("v1", rows, now=NOW)
+
+    slices = score_slices(window.merged(now=NOW)["v1"])["segment"]
+    assert set(slices) == {"senior", "general"}
+    assert slices["senior"]["severity"] == "none"
+    assert slices["general"]["severity"] == "critical"
+
+def test_service_slices_endpoint(monkeypatch):
+    """Test per-slice drift of the service window"""
+    monkeypatch.setattr(drift_detector, "baseline_data", {**SLICED_BASELINE, "slices": {
+        "dimensions": ["product_category"], "min_observations": 1}})
+    client = TestClient(app)
+    response = client.post("/monitor/predict", json={
+        "features": {"age": 35, "income": 75000.0, "product_category": "premium"},
+        "model_version": "v-slices",
+        "timestamp": "2023-05-01T12:00:00Z"
+    })
+    assert response.status_code == 200
+
+    data = client.get("/monitor/slices").json()
+    assert data["dimensions"] == ["product_category"]
+    assert "age" in data["models"]["v-slices"]["product_category"]["premium"]["feature_scores"]
+
+QUALITY_ROWS = [
+    {"age": 30, "income": 50000.0, "product_category": "basic"},
+    {"age": None, "income": 150000.0, "product_category": "unknown"},
+    {"income": float("nan"), "product_category": None},
+    {"age": "old", "income": 10000, "product_category": 3},
+    {"age": 90, "income": 60000.0, "product_category": "premium"},
+]
+
+def test_quality_counters_on_both_paths(monkeypatch):
+    """Test null, out-of-range, unseen-category and type-violation rates from scalar and batch recording"""
+    scalar, batch = make_window(), make_window()
+    for row in QUALITY_ROWS:
+        scalar.record("v1", [row], now=NOW)
+    batch.record("v1", QUALITY_ROWS, now=NOW)
+
+    for window in (scalar, batch):
+        quality = score_quality(window.merged(now=NOW)["v1"])
+        # The third row does not carry age at all, so it is not one of age's rows
+        assert quality["age"] == {"rows": 4, "rates": pytest.approx(
+            {"null": 0.25, "out_of_range": 0.25, "unseen_category": 0.0, "type_violation": 0.25})}
+        assert quality["income"]["rates"] == pytest.approx(
+            {"null": 0.2, "out_of_range": 0.4, "unseen_category": 0.0, "type_violation": 0.0})
+        assert quality["product_category"]["rates"] == pytest.approx(
+            {"null": 0.2, "out_of_range": 0.0, "unseen_category": 0.2, "type_violation": 0.2})
+    assert scalar.merged(now=NOW)["v1"].moments["income"][0] == 4
+
+def test_quality_uses_baseline_range_and_weights():
+    """Test explicit baseline min/max and sampling weights, across a snapshot merge"""
+    baseline = {"features": {"age": {"values": [25, 35, 45, 55], "min": 18, "max": 99}}}
+    window = make_window(baseline=baseline)
+    window.record("v1", [{"age": 20}, {"age": 100}, {"age": None}], now=NOW, weights=[1.0, 3.0, 4.0])
+    merged = merge_snapshots([decode_snapshot(window.snapshot(now=NOW))], window.window_start(NOW))["v1"]
+    rates = score_quality(merged)["age"]["rates"]
+    assert rates["out_of_range"] == pytest.approx(3 / 8)
+    assert rates["null"] == pytest.approx(4 / 8)
+
+def test_quality_only_counts_features_the_row_carries():
+    """Test that rows of another schema sharing the version's window do not count as missing"""
+    churn_rows = [{"age": 40, "tenure_months": 12, "monthly_charges": 70.0}] * 3
+    monitor_row = {"age": 30, "income": 50000.0, "product_category": "basic"}
+    scalar, batch = make_window(), make_window()
+    for row in churn_rows + [monitor_row]:
+        scalar.record("v1", [row], now=NOW)
+    batch.record("v1", churn_rows, now=NOW)
+    batch.record("v1", [monitor_row], now=NOW)
+
+    for window in (scalar, batch):
+        quality = score_quality(window.merged(now=NOW)["v1"])
+        assert quality["age"]["rows"] == 4
+        assert quality["income"] == {"rows": 1, "rates": pytest.approx(
+            {"null": 0.0, "out_of_range": 0.0, "unseen_category": 0.0, "type_violation": 0.0})}
+        assert quality["product_category"]["rows"] == 1
+
+def test_rejected_values_count_as_type_violations(monkeypatch):
+    """Test that 422s from the monitor and inference endpoints reach the quality counters"""
+    monkeypatch.setattr(drift_detector.inference_service, "model_version", "v-rejected-inference")
+    client = TestClient(app)
+    request = {"features": {"age": 35}, "model_version": "v-rejected", "timestamp": "2023-05-01T12:00:00Z"}
+    assert client.post("/monitor/predict", json=request).status_code == 200
+    response = client.post("/monitor/predict", json={**request, "features": {"age": "old"}})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "features", "age"]
+    assert client.post("/model/predict", json={"features": {"age": [40]}}).status_code == 422
+
+    models = client.get("/monitor/quality").json()["models"]
+    assert models["v-rejected"]["age"]["rows"] == 2
+    assert models["v-rejected"]["age"]["rates"]["type_violation"] == 0.5
+    assert models["v-rejected-inference"]["age"]["rates"]["type_violation"] == 1.0
+
+def test_service_quality_endpoint_and_metrics():
+    """Test that data quality is served and exported from the service window"""
+    client = TestClient(app)
+    response = client.post("/monitor/predict", json={
+        "features": {"age": 35, "product_category": "premium"},
+        "model_version": "v-quality",
+        "timestamp": "2023-05-01T12:00:00Z"
+    })
+    assert response.status_code == 200
+
+    quality = client.get("/monitor/quality").json()["models"]["v-quality"]
+    assert quality["income"]["rates"]["null"] == 1.0
+    client.get("/monitor/metrics")
+    assert REGISTRY.get_sample_value("model_data_quality_rate", {
+        "model_version": "v-quality", "feature": "income", "check": "null"}) == 1.0
+
+if __name__ == "__main__":
+    pytest.main(["-xvs", __file__])
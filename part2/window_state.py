@@ -0,0 +1,713 @@
+#!/usr/bin/env python3
+"""
+Mergeable per-pod drift window state and fleet-level aggregation.
+
+Each pod only sees its share of traffic behind the Service, so its drift
+scores are noisy. Every pod therefore keeps its recent observations as
+counts that add across pods: per-bin histogram counts over the baseline PSI
+edges and moments for numerical features, and category counts for
+categorical features. Counts live in time buckets per model version.
+
+``GET /monitor/window/snapshot`` serves this state as a compact, versioned
+binary snapshot. A pod in aggregator mode pulls the snapshots of all peers,
+sums them bucket by bucket and scores drift on the merged counts. Merged
+PSI equals the PSI of one pod that saw all of the traffic.
+
+Counts are weighted: an observation kept by the ingestion sampler with
+probability p counts 1 / p, so sampled windows estimate the full traffic.
+
+Slicing dimensions configured in the baseline (``"slices"``) additionally
+keep a (slices x bins) count array per numerical feature, so drift can be
+scored per segment, e.g. per ``product_category``. Slice values beyond
+``max_values`` share the ``__other__`` row.
+
+Data quality is counted in the same pass: per feature, the weighted number of
+rows, missing values (None or NaN), numerical values outside the baseline
+``min``/``max`` and type violations. Only rows whose schema carries a feature
+(the key is present, even as None) count towards it, so inference and monitor
+rows can share a model version's window. Unseen categories need no extra
+counter, they are read off the category counts when scoring.
+"""
+import os
+import time
+import socket
+import asyncio
+import threading
+import bisect
+import hashlib
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import msgspec
+import numpy as np
+from fastapi import APIRouter, HTTPException, Response
+from prometheus_client import Gauge
+
+logger = logging.getLogger('drift_detector.window_state')
+
+# Window configuration (all pods of a fleet must agree on the bucket size)
+WINDOW_BUCKET_SECONDS = int(os.environ.get('DRIFT_WINDOW_BUCKET_SECONDS', '60'))
+WINDOW_BUCKETS = int(os.environ.get('DRIFT_WINDOW_BUCKETS', '15'))
+WINDOW_MAX_CATEGORIES = int(os.environ.get('DRIFT_WINDOW_MAX_CATEGORIES', '1000'))
+OTHER_CATEGORY = "__other__"
+DEFAULT_SLICE_MAX_VALUES = 20
+
+# Aggregator configuration: explicit peer URLs and/or a headless Service "host:port"
+AGGREGATOR_MODE = os.environ.get('AGGREGATOR_MODE', 'false').lower() == 'true'
+AGGREGATOR_PEERS = [peer.strip() for peer in os.environ.get('AGGREGATOR_PEERS', '').split(',') if peer.strip()]
+AGGREGATOR_PEER_SERVICE = os.environ.get('AGGREGATOR_PEER_SERVICE', '')
+AGGREGATOR_TIMEOUT_SECONDS = float(os.environ.get('AGGREGATOR_TIMEOUT_SECONDS', '2'))
+AGGREGATOR_INTERVAL_SECONDS = float(os.environ.get('AGGREGATOR_INTERVAL_SECONDS', '30'))
+
+POD_NAME = os.environ.get('POD_NAME', socket.gethostname())
+
+SNAPSHOT_MAGIC = b"DWS"
+SNAPSHOT_VERSION = 4
+SNAPSHOT_CONTENT_TYPE = "application/vnd.drift-window"
+SNAPSHOT_PATH = "/monitor/window/snapshot"
+
+# Moment slots: weighted observation count (including values outside the baseline range), sum, sum of squares, min, max
+_COUNT, _SUM, _SUM_SQUARES, _MIN, _MAX = range(5)
+
+# Data quality slots: weighted rows, missing values, values outside the baseline range, wrong types
+QUALITY_ROWS, QUALITY_NULL, QUALITY_OUT_OF_RANGE, QUALITY_TYPE_VIOLATION = range(4)
+# Marks a feature the row's schema does not carry (as opposed to a None value)
+_ABSENT = object()
+
+# Prometheus metrics
+FLEET_DRIFT_SCORE_GAUGE = Gauge('model_fleet_drift_score', 'Fleet-wide drift score over merged pod windows',
+                                ['model_version', 'feature'])
+FLEET_SLICE_DRIFT_SCORE_GAUGE = Gauge('model_fleet_slice_drift_score', 'Fleet-wide drift score of a segment',
+                                      ['model_version', 'dimension', 'slice', 'feature'])
+FLEET_DATA_QUALITY_GAUGE = Gauge('model_fleet_data_quality_rate', 'Fleet-wide share of observations failing a check',
+                                 ['model_version', 'feature', 'check'])
+FLEET_OBSERVATIONS_GAUGE = Gauge('model_fleet_window_observations', 'Observations in the merged fleet window',
+                                 ['model_version'])
+FLEET_PODS_GAUGE = Gauge('drift_fleet_pods', 'Pods contributing to the last fleet aggregation', ['status'])
+
+
+# Snapshot wire format: MAGIC + version byte + MessagePack of WindowSnapshot
+class NumericalWindow(msgspec.Struct, array_like=True):
+    """Counts and moments of one numerical feature in one bucket"""
+    counts: bytes  # little-endian float64 weighted count per baseline PSI bin
+    moments: Tuple[float, float, float, float, float]
+
+class SliceWindow(msgspec.Struct, array_like=True):
+    """Per-slice counts of numerical features for one slicing dimension"""
+    max_values: int
+    values: List[str]
+    counts: Dict[str, bytes]  # little-endian float64 (len(values) x bins), row-major
+    totals: Dict[str, bytes]  # little-endian float64 per slice, including out-of-range values
+
+class BucketWindow(msgspec.Struct, array_like=True):
+    """State of one model version in one time bucket"""
+    start: int
+    numerical: Dict[str, NumericalWindow]
+    categorical: Dict[str, Dict[str, float]]
+    slices: Dict[str, SliceWindow] = {}
+    quality: Dict[str, Tuple[float, float, float, float]] = {}
+
+class WindowSnapshot(msgspec.Struct, array_like=True):
+    """Window state of one pod"""
+    pod: str
+    baseline: str
+    bucket_seconds: int
+    created: float
+    models: Dict[str, List[BucketWindow]]
+
+_snapshot_encoder = msgspec.msgpack.Encoder()
+_snapshot_decoder = msgspec.msgpack.Decoder(WindowSnapshot)
+
+
+def baseline_fingerprint(cache: Dict[str, Dict[str, np.ndarray]], categorical: List[str],
+                         slice_dimensions: List[str] = ()) -> str:
+    """Identify the binning a window was built with; only identical binnings merge"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(cache):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(cache[name]["edges"], dtype='<f8').tobytes())
+        digest.update(np.ascontiguousarray(baseline_bounds(cache[name]), dtype='<f8').tobytes())
+    for name in sorted(categorical):
+        digest.update(b"\0" + name.encode())
+    for name in sorted(slice_dimensions):
+        digest.update(b"\1" + name.encode())
+    return digest.hexdigest()
+
+
+def baseline_bounds(entry: Dict[str, np.ndarray]) -> Tuple[float, float]:
+    """Valid range of a numerical feature: the baseline min/max, else the outer bin edges"""
+    bounds = entry.get("bounds")
+    if bounds is None:
+        bounds = entry["edges"][[0, -1]]
+    return float(bounds[0]), float(bounds[1])
+
+
+def bin_indices(edges: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Bin of each value with np.histogram semantics (last bin closed); -1 if out of range"""
+    n_bins = len(edges) - 1
+    index = np.searchsorted(edges, values, side='right') - 1
+    index[values == edges[-1]] = n_bins - 1
+    index[index >= n_bins] = -1
+    return index
+
+
+def bin_index(edges: List[float], value: float) -> int:
+    """Scalar bin_indices"""
+    if not edges[0] <= value <= edges[-1]:
+        return -1
+    return min(bisect.bisect_right(edges, value), len(edges) - 1) - 1
+
+
+def bin_counts(edges: np.ndarray, values: np.ndarray, weights: Optional[np.ndarray] = None,
+               index: Optional[np.ndarray] = None) -> np.ndarray:
+    """Weighted counts per bin with np.histogram semantics (out-of-range values dropped)"""
+    if index is None:
+        index = bin_indices(edges, values)
+    inside = index >= 0
+    return np.bincount(index[inside], weights=None if weights is None else weights[inside],
+                       minlength=len(edges) - 1).astype(np.float64)
+
+
+class SliceCounts:
+    """Weighted (slices x bins) counts of numerical features for one slicing dimension"""
+
+    def __init__(self, max_values: int, n_bins: Dict[str, int]):
+        self.max_values = max_values
+        self.labels: List[str] = []
+        self.index: Dict[str, int] = {}
+        # One row per slice value plus one for OTHER_CATEGORY once the cap is reached
+        self.counts = {name: np.zeros((max_values + 1, bins)) for name, bins in n_bins.items()}
+        self.totals = {name: np.zeros(max_values + 1) for name in n_bins}
+
+    def row(self, value: str) -> int:
+        """Row of a slice value, assigning a new one (or the overflow row) on first sight"""
+        row = self.index.get(value)
+        if row is None:
+            if len(self.labels) >= self.max_values:
+                value = OTHER_CATEGORY
+                row = self.index.get(value)
+                if row is not None:
+                    return row
+            row = self.index[value] = len(self.labels)
+            self.labels.append(value)
+        return row
+
+    def add(self, name: str, rows: np.ndarray, bins: np.ndarray, weights: np.ndarray):
+        np.add.at(self.totals[name], rows, weights)
+        inside = bins >= 0
+        np.add.at(self.counts[name], (rows[inside], bins[inside]), weights[inside])
+
+    def add_one(self, name: str, row: int, bin: int, weight: float):
+        self.totals[name][row] += weight
+        if bin >= 0:
+            self.counts[name][row, bin] += weight
+
+    def view(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(counts, totals) of the slices seen so far"""
+        n = len(self.labels)
+        return self.counts[name][:n], self.totals[name][:n]
+
+    def merge(self, other: "SliceCounts"):
+        rows = np.array([self.row(label) for label in other.labels], dtype=np.intp)
+        for name in self.counts:
+            if name in other.counts:
+                counts, totals = other.view(name)
+                np.add.at(self.counts[name], rows, counts)
+                np.add.at(self.totals[name], rows, totals)
+
+    def to_wire(self) -> SliceWindow:
+        return SliceWindow(
+            max_values=self.max_values,
+            values=list(self.labels),
+            counts={name: np.ascontiguousarray(self.view(name)[0], dtype='<f8').tobytes() for name in self.counts},
+            totals={name: np.ascontiguousarray(self.view(name)[1], dtype='<f8').tobytes() for name in self.counts}
+        )
+
+    @classmethod
+    def from_wire(cls, window: SliceWindow) -> "SliceCounts":
+        n = len(window.values)
+        n_bins = {name: (len(data) // 8 // n if n else 0) for name, data in window.counts.items()}
+        slices = cls(max(window.max_values, n), n_bins)
+        slices.labels = list(window.values)
+        slices.index = {label: row for row, label in enumerate(slices.labels)}
+        for name, data in window.counts.items():
+            if n:
+                slices.counts[name][:n] = np.frombuffer(data, dtype='<f8').reshape(n, -1)
+                slices.totals[name][:n] = np.frombuffer(window.totals[name], dtype='<f8')
+        return slices
+
+
+class WindowAccumulator:
+    """Additive drift counts for one model version over one or more buckets"""
+
+    def __init__(self):
+        self.counts: Dict[str, np.ndarray] = {}
+        self.moments: Dict[str, np.ndarray] = {}
+        self.categories: Dict[str, Dict[str, float]] = {}
+        self.slices: Dict[str, SliceCounts] = {}
+        self.quality: Dict[str, List[float]] = {}
+
+    def quality_counts(self, name: str) -> List[float]:
+        quality = self.quality.get(name)
+        if quality is None:
+            quality = self.quality[name] = [0.0, 0.0, 0.0, 0.0]
+        return quality
+
+    def slice_counts(self, dimension: str, max_values: int, n_bins: Dict[str, int]) -> SliceCounts:
+        slices = self.slices.get(dimension)
+        if slices is None:
+            slices = self.slices[dimension] = SliceCounts(max_values, n_bins)
+        return slices
+
+    @property
+    def observations(self) -> int:
+        """Estimated observation count (weighted)"""
+        counts = [m[_COUNT] for m in self.moments.values()] + [sum(c.values()) for c in self.categories.values()]
+        return int(round(max(counts, default=0)))
+
+    def add_values(self, name: str, edges: np.ndarray, values: np.ndarray, weights: Optional[np.ndarray] = None,
+                   index: Optional[np.ndarray] = None):
+        counts = bin_counts(edges, values, weights, index)
+        if weights is None:
+            weights = np.ones_like(values)
+        weighted = weights * values
+        self._add_numerical(name, counts, np.array([
+            weights.sum(), weighted.sum(), np.dot(weighted, values), values.min(), values.max()
+        ]))
+
+    def add_value(self, name: str, edges: List[float], value: float, weight: float = 1.0) -> int:
+        """Scalar add_values for single observations, avoiding NumPy call overhead; returns the bin"""
+        counts = self.counts.get(name)
+        if counts is None:
+            counts = self.counts[name] = np.zeros(len(edges) - 1, dtype=np.float64)
+            self.moments[name] = np.array([0.0, 0.0, 0.0, np.inf, -np.inf])
+        bin = bin_index(edges, value)
+        if bin >= 0:
+            counts[bin] += weight
+        moments = self.moments[name]
+        moments[_COUNT] += weight
+        moments[_SUM] += weight * value
+        moments[_SUM_SQUARES] += weight * value * value
+        if value < moments[_MIN]:
+            moments[_MIN] = value
+        if value > moments[_MAX]:
+            moments[_MAX] = value
+        return bin
+
+    def add_categories(self, name: str, values, weights=None):
+        categories = self.categories.setdefault(name, {})
+        for value, weight in zip(values, weights or [1.0] * len(values)):
+            if value not in categories and len(categories) >= WINDOW_MAX_CATEGORIES:
+                value = OTHER_CATEGORY
+            categories[value] = categories.get(value, 0.0) + weight
+
+    def _add_numerical(self, name, counts, moments):
+        existing = self.counts.get(name)
+        if existing is None:
+            self.counts[name] = counts.astype(np.float64)
+            self.moments[name] = moments.astype(np.float64)
+            return
+        existing += counts
+        current = self.moments[name]
+        current[_COUNT:_MIN] += moments[_COUNT:_MIN]
+        current[_MIN] = min(current[_MIN], moments[_MIN])
+        current[_MAX] = max(current[_MAX], moments[_MAX])
+
+    def merge(self, other: "WindowAccumulator"):
+        for name, counts in other.counts.items():
+            self._add_numerical(name, counts, other.moments[name])
+        for name, categories in other.categories.items():
+            merged = self.categories.setdefault(name, {})
+            for value, count in categories.items():
+                merged[value] = merged.get(value, 0.0) + count
+        for dimension, slices in other.slices.items():
+            n_bins = {name: counts.shape[1] for name, counts in slices.counts.items()}
+            self.slice_counts(dimension, slices.max_values, n_bins).merge(slices)
+        for name, quality in other.quality.items():
+            merged = self.quality_counts(name)
+            for slot, count in enumerate(quality):
+                merged[slot] += count
+
+    def to_wire(self, start: int) -> BucketWindow:
+        return BucketWindow(
+            start=start,
+            numerical={
+                name: NumericalWindow(counts.astype('<f8').tobytes(), tuple(float(m) for m in self.moments[name]))
+                for name, counts in self.counts.items()
+            },
+            categorical={name: dict(categories) for name, categories in self.categories.items()},
+            slices={dimension: slices.to_wire() for dimension, slices in self.slices.items()},
+            quality={name: tuple(quality) for name, quality in self.quality.items()}
+        )
+
+    @classmethod
+    def from_wire(cls, bucket: BucketWindow) -> "WindowAccumulator":
+        accumulator = cls()
+        for name, window in bucket.numerical.items():
+            accumulator.counts[name] = np.frombuffer(window.counts, dtype='<f8').astype(np.float64)
+            accumulator.moments[name] = np.array(window.moments, dtype=np.float64)
+        accumulator.categories = {name: dict(categories) for name, categories in bucket.categorical.items()}
+        accumulator.slices = {dimension: SliceCounts.from_wire(window) for dimension, window in bucket.slices.items()}
+        accumulator.quality = {name: [float(count) for count in quality] for name, quality in bucket.quality.items()}
+        return accumulator
+
+
+class DriftWindow:
+    """
+    Time-bucketed drift counts of this pod, per model version.
+
+    ``cache_provider`` returns the baseline PSI cache, ``categorical_provider``
+    the categorical feature names and ``slicing_provider`` the slicing config
+    (``{"dimensions": [...], "max_values": N}``); the window resets when the
+    baseline changes.
+    Thread-safe: the inference batcher records from its worker thread while
+    the monitor endpoints record and snapshot on the event loop.
+    """
+
+    def __init__(self, cache_provider: Callable[[], Dict[str, Dict[str, np.ndarray]]],
+                 categorical_provider: Callable[[], List[str]],
+                 slicing_provider: Optional[Callable[[], Dict[str, Any]]] = None,
+                 bucket_seconds=WINDOW_BUCKET_SECONDS, buckets=WINDOW_BUCKETS, pod=POD_NAME):
+        self.cache_provider = cache_provider
+        self.categorical_provider = categorical_provider
+        self.slicing_provider = slicing_provider or (lambda: {})
+        self.bucket_seconds = int(bucket_seconds)
+        self.buckets = int(buckets)
+        self.pod = pod
+        self._cache = None
+        self._edge_lists: Dict[str, List[float]] = {}
+        self.categorical: List[str] = []
+        self.slice_dimensions: List[str] = []
+        self.slice_max_values = DEFAULT_SLICE_MAX_VALUES
+        self._n_bins: Dict[str, int] = {}
+        self._bounds: Dict[str, Tuple[float, float]] = {}
+        self.fingerprint = ""
+        self.state: Dict[str, Dict[int, WindowAccumulator]] = {}
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """Reset the window if the baseline binning changed"""
+        cache = self.cache_provider()
+        if cache is not self._cache:
+            self._cache = cache
+            self._edge_lists = {name: entry["edges"].tolist() for name, entry in cache.items()}
+            self._n_bins = {name: len(edges) - 1 for name, edges in self._edge_lists.items()}
+            self._bounds = {name: baseline_bounds(entry) for name, entry in cache.items()}
+            self.categorical = list(self.categorical_provider())
+            slicing = self.slicing_provider()
+            self.slice_dimensions = list(slicing.get("dimensions", []))
+            self.slice_max_values = int(slicing.get("max_values", DEFAULT_SLICE_MAX_VALUES))
+            self.fingerprint = baseline_fingerprint(cache, self.categorical, self.slice_dimensions)
+            self.state = {}
+        return cache
+
+    def bucket_start(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds) * self.bucket_seconds
+
+    def window_start(self, now: float) -> int:
+        return self.bucket_start(now) - (self.buckets - 1) * self.bucket_seconds
+
+    def record(self, model_version: str, rows: List[Dict[str, Any]], now: Optional[float] = None,
+               weights: Optional[List[float]] = None):
+        """Add a batch of observed feature rows (optionally with sampling weights) to the current bucket"""
+        with self._lock:
+            self._record(model_version, rows, now, weights)
+
+    def record_type_violations(self, model_version: str, features: List[str], weight: float = 1.0,
+                               now: Optional[float] = None):
+        """Count values rejected at validation (which never reach record) as type violations"""
+        with self._lock:
+            self.sync()
+            bucket = self._bucket(model_version, now)
+            for name in features:
+                if name in self._bounds or name in self.categorical:
+                    quality = bucket.quality_counts(name)
+                    quality[QUALITY_ROWS] += weight
+                    quality[QUALITY_TYPE_VIOLATION] += weight
+
+    def _bucket(self, model_version: str, now: Optional[float]) -> WindowAccumulator:
+        now = time.time() if now is None else now
+        buckets = self.state.setdefault(model_version, {})
+        start = self.bucket_start(now)
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = buckets[start] = WindowAccumulator()
+            self._evict(now)
+        return bucket
+
+    def _record(self, model_version: str, rows: List[Dict[str, Any]], now: Optional[float],
+                weights: Optional[List[float]]):
+        cache = self.sync()
+        bucket = self._bucket(model_version, now)
+
+        if len(rows) == 1:
+            self._record_row(bucket, rows[0], 1.0 if weights is None else weights[0])
+            return
+        if weights is None:
+            weights = [1.0] * len(rows)
+        weights = np.asarray(weights, dtype=float)
+        # Slice row of every observation per dimension, -1 where the dimension is missing
+        slice_rows = {}
+        for dimension in self.slice_dimensions:
+            slices = bucket.slice_counts(dimension, self.slice_max_values, self._n_bins)
+            slice_rows[dimension] = (slices, np.array(
+                [slices.row(v) if isinstance(v, str) else -1 for v in (row.get(dimension) for row in rows)],
+                dtype=np.intp))
+        weight_list = weights.tolist()
+        for name, entry in cache.items():
+            column = [row.get(name, _ABSENT) for row in rows]
+            total = sum(w for v, w in zip(column, weight_list) if v is not _ABSENT)
+            if total == 0:
+                continue
+            null = sum(w for v, w in zip(column, weight_list) if v is None)
+            present = np.array([i for i, v in enumerate(column)
+                                if isinstance(v, (int, float)) and not isinstance(v, bool)], dtype=np.intp)
+            values = np.array([column[i] for i in present], dtype=float)
+            value_weights = weights[present]
+            quality = bucket.quality_counts(name)
+            quality[QUALITY_ROWS] += total
+            quality[QUALITY_TYPE_VIOLATION] += total - null - float(value_weights.sum())
+            missing = np.isnan(values)
+            if missing.any():
+                null += float(value_weights[missing].sum())
+                present, values, value_weights = present[~missing], values[~missing], value_weights[~missing]
+            quality[QUALITY_NULL] += null
+            if present.size:
+                low, high = self._bounds[name]
+                quality[QUALITY_OUT_OF_RANGE] += float(value_weights[(values < low) | (values > high)].sum())
+                index = bin_indices(entry["edges"], values)
+                bucket.add_values(name, entry["edges"], values, value_weights, index)
+                for slices, rows_of in slice_rows.values():
+                    rows_of = rows_of[present]
+                    sliced = rows_of >= 0
+                    slices.add(name, rows_of[sliced], index[sliced], value_weights[sliced])
+        for name in self.categorical:
+            column = [row.get(name, _ABSENT) for row in rows]
+            total = sum(w for v, w in zip(column, weight_list) if v is not _ABSENT)
+            if total == 0:
+                continue
+            pairs = [(v, w) for v, w in zip(column, weight_list) if isinstance(v, str)]
+            quality = bucket.quality_counts(name)
+            null = sum(w for v, w in zip(column, weight_list) if v is None)
+            quality[QUALITY_ROWS] += total
+            quality[QUALITY_NULL] += null
+            quality[QUALITY_TYPE_VIOLATION] += total - null - sum(w for _, w in pairs)
+            if pairs:
+                values, value_weights = zip(*pairs)
+                bucket.add_categories(name, values, list(value_weights))
+
+    def _record_row(self, bucket: WindowAccumulator, row: Dict[str, Any], weight: float):
+        sliced = []
+        for dimension in self.slice_dimensions:
+            value = row.get(dimension)
+            if isinstance(value, str):
+                slices = bucket.slice_counts(dimension, self.slice_max_values, self._n_bins)
+                sliced.append((slices, slices.row(value)))
+        for name, edges in self._edge_lists.items():
+            value = row.get(name, _ABSENT)
+            if value is _ABSENT:
+                continue
+            quality = bucket.quality_counts(name)
+            quality[QUALITY_ROWS] += weight
+            if value is None or value != value:
+                quality[QUALITY_NULL] += weight
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                low, high = self._bounds[name]
+                if not low <= value <= high:
+                    quality[QUALITY_OUT_OF_RANGE] += weight
+                bin = bucket.add_value(name, edges, float(value), weight)
+                for slices, slice_row in sliced:
+                    slices.add_one(name, slice_row, bin, weight)
+            else:
+                quality[QUALITY_TYPE_VIOLATION] += weight
+        for name in self.categorical:
+            value = row.get(name, _ABSENT)
+            if value is _ABSENT:
+                continue
+            quality = bucket.quality_counts(name)
+            quality[QUALITY_ROWS] += weight
+            if isinstance(value, str):
+                bucket.add_categories(name, (value,), [weight])
+            elif value is None:
+                quality[QUALITY_NULL] += weight
+            else:
+                quality[QUALITY_TYPE_VIOLATION] += weight
+
+    def _evict(self, now: float):
+        oldest = self.window_start(now)
+        for model_version in list(self.state):
+            buckets = self.state[model_version]
+            for start in [s for s in buckets if s < oldest]:
+                del buckets[start]
+            if not buckets:
+                del self.state[model_version]
+
+    def merged(self, now: Optional[float] = None) -> Dict[str, WindowAccumulator]:
+        """This pod's live buckets merged per model version"""
+        with self._lock:
+            self.sync()
+            self._evict(time.time() if now is None else now)
+            merged = {}
+            for model_version, buckets in self.state.items():
+                accumulator = merged[model_version] = WindowAccumulator()
+                for bucket in buckets.values():
+                    accumulator.merge(bucket)
+            return merged
+
+    def snapshot(self, now: Optional[float] = None) -> bytes:
+        """Serialize the live buckets as a versioned binary snapshot"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self.sync()
+            self._evict(now)
+            snapshot = WindowSnapshot(
+                pod=self.pod,
+                baseline=self.fingerprint,
+                bucket_seconds=self.bucket_seconds,
+                created=now,
+                models={
+                    model_version: [bucket.to_wire(start) for start, bucket in sorted(buckets.items())]
+                    for model_version, buckets in self.state.items()
+                }
+            )
+        return encode_snapshot(snapshot)
+
+
+def encode_snapshot(snapshot: WindowSnapshot) -> bytes:
+    return SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION]) + _snapshot_encoder.encode(snapshot)
+
+
+def decode_snapshot(data: bytes) -> WindowSnapshot:
+    """Parse a snapshot, rejecting unknown formats and versions"""
+    if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError("Not a drift window snapshot")
+    version = data[len(SNAPSHOT_MAGIC)] if len(data) > len(SNAPSHOT_MAGIC) else None
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    return _snapshot_decoder.decode(data[len(SNAPSHOT_MAGIC) + 1:])
+
+
+def merge_snapshots(snapshots: List[WindowSnapshot], window_start: int) -> Dict[str, WindowAccumulator]:
+    """Sum snapshot buckets at or after window_start into one accumulator per model version"""
+    merged: Dict[str, WindowAccumulator] = {}
+    for snapshot in snapshots:
+        for model_version, buckets in snapshot.models.items():
+            for bucket in buckets:
+                if bucket.start >= window_start:
+                    merged.setdefault(model_version, WindowAccumulator()).merge(WindowAccumulator.from_wire(bucket))
+    return merged
+
+
+class SnapshotAggregator:
+    """Pulls and merges window snapshots from every pod of the fleet"""
+
+    def __init__(self, window: DriftWindow, peers=None, peer_service=AGGREGATOR_PEER_SERVICE,
+                 timeout=AGGREGATOR_TIMEOUT_SECONDS, client: Optional[httpx.AsyncClient] = None):
+        self.window = window
+        self.peers = list(AGGREGATOR_PEERS if peers is None else peers)
+        self.peer_service = peer_service
+        self.timeout = timeout
+        self._client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def resolve_peers(self) -> List[str]:
+        """Configured peer URLs plus every address behind the headless peer Service"""
+        peers = list(self.peers)
+        if self.peer_service:
+            host, _, port = self.peer_service.rpartition(':')
+            loop = asyncio.get_running_loop()
+            try:
+                infos = await loop.getaddrinfo(host, int(port), type=socket.SOCK_STREAM)
+                for address in sorted({info[4][0] for info in infos}):
+                    host_part = f"[{address}]" if ':' in address else address
+                    peers.append(f"http://{host_part}:{port}")
+            except Exception as e:
+                logger.error(f"Error resolving peer service {self.peer_service}: {str(e)}")
+        return peers
+
+    async def _fetch(self, peer: str) -> WindowSnapshot:
+        response = await self.client.get(f"{peer.rstrip('/')}{SNAPSHOT_PATH}")
+        response.raise_for_status()
+        return decode_snapshot(response.content)
+
+    async def aggregate(self, score: Callable[[WindowAccumulator], Dict[str, Any]],
+                        now: Optional[float] = None) -> Dict[str, Any]:
+        """Pull all snapshots concurrently, merge compatible ones and score fleet drift"""
+        self.window.sync()
+        now = time.time() if now is None else now
+        peers = await self.resolve_peers()
+        results = await asyncio.gather(*(self._fetch(peer) for peer in peers), return_exceptions=True)
+
+        snapshots, pods, failed, skipped = [], [], [], []
+        for peer, result in zip(peers, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Error pulling window snapshot from {peer}: {str(result)}")
+                failed.append({"peer": peer, "error": str(result)})
+            elif result.baseline != self.window.fingerprint or result.bucket_seconds != self.window.bucket_seconds:
+                skipped.append({"peer": peer, "pod": result.pod, "reason": "incompatible baseline or bucket size"})
+            else:
+                snapshots.append(result)
+                pods.append(result.pod)
+
+        merged = merge_snapshots(snapshots, self.window.window_start(now))
+        models = {}
+        for model_version, accumulator in merged.items():
+            result = score(accumulator)
+            observations = accumulator.observations
+            models[model_version] = {**result, "observations": observations}
+            for feature, value in result["feature_scores"].items():
+                FLEET_DRIFT_SCORE_GAUGE.labels(model_version, feature).set(value)
+            for dimension, slices in result.get("slices", {}).items():
+                for label, slice_result in slices.items():
+                    for feature, value in slice_result["feature_scores"].items():
+                        FLEET_SLICE_DRIFT_SCORE_GAUGE.labels(model_version, dimension, label, feature).set(value)
+            for feature, quality in result.get("quality", {}).items():
+                for check, rate in quality["rates"].items():
+                    FLEET_DATA_QUALITY_GAUGE.labels(model_version, feature, check).set(rate)
+            FLEET_OBSERVATIONS_GAUGE.labels(model_version).set(observations)
+
+        FLEET_PODS_GAUGE.labels("merged").set(len(pods))
+        FLEET_PODS_GAUGE.labels("failed").set(len(failed))
+        FLEET_PODS_GAUGE.labels("skipped").set(len(skipped))
+        return {"pods": pods, "failed": failed, "skipped": skipped, "models": models}
+
+    async def run(self, score: Callable[[WindowAccumulator], Dict[str, Any]],
+                  interval=AGGREGATOR_INTERVAL_SECONDS):
+        """Refresh the fleet drift gauges periodically"""
+        while True:
+            try:
+                await self.aggregate(score)
+            except Exception as e:
+                logger.error(f"Error aggregating fleet drift: {str(e)}")
+            await asyncio.sleep(interval)
+
+
+def build_window_router(window: DriftWindow, aggregator: Optional[SnapshotAggregator],
+                        score: Callable[[WindowAccumulator], Dict[str, Any]]) -> APIRouter:
+    """Create the snapshot endpoint, and the fleet drift endpoint when aggregating"""
+    router = APIRouter()
+
+    @router.get(SNAPSHOT_PATH)
+    async def snapshot():
+        """Binary snapshot of this pod's mergeable drift window"""
+        return Response(window.snapshot(), media_type=SNAPSHOT_CONTENT_TYPE)
+
+    @router.get("/monitor/fleet/drift")
+    async def fleet_drift():
+        """Fleet-wide drift over the merged windows of all peers"""
+        if aggregator is None:
+            raise HTTPException(status_code=404, detail="Aggregator mode is disabled")
+        return await aggregator.aggregate(score)
+
+    return router